@@ -0,0 +1,77 @@
+#
+# Synthetic networks for the benchmarks, as edge arrays
+# of node ids that QFNetwork and QFCompactNetwork accept
+#
+import numpy as np
+
+
+def scale_free_edges(nodes, edges_per_node=2, seed=0):
+    #
+    # preferential attachment: each new node links to edges_per_node
+    # earlier nodes, picked with probability proportional to degree
+    #
+    rng = np.random.default_rng(seed)
+    sources = []
+    targets = []
+    # endpoints of all edges so far, sampling it samples by degree
+    endpoints = [0]
+    for node in range(1, nodes):
+        picks = set(endpoints[i] for i in rng.integers(0, len(endpoints),
+                                                         size=min(edges_per_node, node)))
+        for target in picks:
+            sources.append(node)
+            targets.append(target)
+            endpoints.extend((node, target))
+    return np.column_stack((sources, targets))
+
+
+def erdos_renyi_edges(nodes, mean_degree=4, seed=0):
+    # G(n, m) with m = nodes * mean_degree / 2 distinct edges, no self loops
+    rng = np.random.default_rng(seed)
+    wanted = nodes * mean_degree // 2
+    edges = np.zeros((0, 2), dtype=np.int64)
+    while len(edges) < wanted and nodes > 1:
+        pairs = rng.integers(0, nodes, size=(2 * (wanted - len(edges)), 2))
+        pairs = np.sort(pairs[pairs[:, 0] != pairs[:, 1]], axis=1)
+        edges = np.unique(np.concatenate((edges, pairs)), axis=0)
+        if len(edges) > wanted:
+            edges = edges[rng.permutation(len(edges))[:wanted]]
+    return edges
+
+
+def grid_edges(nodes, seed=0):
+    # a square grid of about nodes nodes, seed is unused
+    side = max(1, int(round(np.sqrt(nodes))))
+    ids = np.arange(side * side).reshape(side, side)
+    horizontal = np.column_stack((ids[:, :-1].ravel(), ids[:, 1:].ravel()))
+    vertical = np.column_stack((ids[:-1].ravel(), ids[1:].ravel()))
+    return np.concatenate((horizontal, vertical))
+
+
+def multi_component_edges(nodes, components=None, seed=0):
+    #
+    # scale-free components of decreasing size, component k has
+    # about nodes / (2 ** (k + 1)) nodes, the remainder are pairs
+    #
+    if components is None:
+        components = max(1, int(np.log2(max(nodes, 2))) - 2)
+    parts = []
+    offset = 0
+    size = nodes // 2
+    for component in range(components):
+        if size < 2:
+            break
+        parts.append(scale_free_edges(size, seed=seed + component) + offset)
+        offset += size
+        size //= 2
+    pairs = np.arange(offset, nodes - (nodes - offset) % 2).reshape(-1, 2)
+    parts.append(pairs)
+    return np.concatenate(parts)
+
+
+GENERATORS = {
+    "scale_free": scale_free_edges,
+    "erdos_renyi": erdos_renyi_edges,
+    "grid": grid_edges,
+    "multi_component": multi_component_edges,
+}
@@ -0,0 +1,82 @@
+#
+# How closely does the pyramid search match the exact argmin?
+#
+# Lays out the same networks with search="global" and search="pyramid".
+# During the pyramid layout every destination is compared with the
+# np.argmin of the same g_field: the value must always be the minimum,
+# the cell may differ when several cells share the minimum value.
+# The final layouts are compared as well, since a different tie changes
+# everything that follows.
+#
+#   python -m benchmarks.pyramid_accuracy --nodes 500 2000 --rounds 5
+#
+# The pyramid pays for updating its blocks on every move and saves the
+# scan of the whole g_field, so it gains on large g_fields, see --sparsity.
+#
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from cdqforcelayout.qfnetwork import QFCompactNetwork
+from cdqforcelayout.qflayout import QFLayout
+from benchmarks.networks import scale_free_edges
+
+
+class _CheckedPyramidLayout(QFLayout):
+    # a pyramid layout that checks each destination against np.argmin
+    def __init__(self, *args, **kwargs):
+        self.moves = 0
+        self.same_cell = 0
+        self.same_value = 0
+        super().__init__(*args, **kwargs)
+
+    def _find_minimum(self, window=None):
+        x, y = super()._find_minimum(window)
+        exact = np.unravel_index(np.argmin(self.gameboard, axis=None), self.gameboard.shape)
+        self.moves += 1
+        self.same_cell += (x, y) == exact
+        self.same_value += self.gameboard[x, y] == self.gameboard[exact]
+        return x, y
+
+
+def _timed_layout(layout_class, edges, rounds, search, sparsity):
+    network = QFCompactNetwork.from_edge_array(edges)
+    start = time.perf_counter()
+    layout = layout_class(network, search=search, sparsity=sparsity)
+    layout.do_layout(rounds=rounds)
+    return layout, time.perf_counter() - start
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--nodes', type=int, nargs='+', default=[500, 2000])
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--sparsity', type=int, default=30,
+                        help='larger values give larger g_fields for the same network')
+    theargs = parser.parse_args(args)
+
+    print("nodes\tmoves\tsame_value\tsame_cell\tsame_final\tmean_shift\tglobal_s\tpyramid_s")
+    for nodes in theargs.nodes:
+        edges = scale_free_edges(nodes, seed=theargs.seed)
+        exact, exact_time = _timed_layout(QFLayout, edges, theargs.rounds, "global",
+                                          theargs.sparsity)
+        checked, _ = _timed_layout(_CheckedPyramidLayout, edges, theargs.rounds, "pyramid",
+                                     theargs.sparsity)
+        # the check itself costs a full argmin per move, time a plain run
+        pyramid, pyramid_time = _timed_layout(QFLayout, edges, theargs.rounds, "pyramid",
+                                              theargs.sparsity)
+        same_final = (exact.graph.x == pyramid.graph.x) & (exact.graph.y == pyramid.graph.y)
+        shift = np.hypot(exact.graph.x - pyramid.graph.x.astype(np.float64),
+                         exact.graph.y - pyramid.graph.y.astype(np.float64))
+        print("%d\t%d\t%.4f\t%.4f\t%.4f\t%.2f\t%.3f\t%.3f" % (
+            nodes, checked.moves, checked.same_value / checked.moves,
+            checked.same_cell / checked.moves, same_final.mean(), shift.mean(),
+            exact_time, pyramid_time))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
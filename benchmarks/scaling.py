@@ -0,0 +1,170 @@
+#
+# How does the layout scale with the size of the network?
+#
+# Times the phases of a layout separately on synthetic networks of
+# increasing size: building the QFNetwork and the QFCompactNetwork from
+# the edge array, QFLayout.__init__, each round of do_layout and
+# get_cx_layout. A second, untimed pass records the peak memory of each
+# phase with tracemalloc, which slows down what it traces.
+#
+#   python -m benchmarks.scaling --graphs scale_free grid --nodes 100 1000 10000 \
+#       --output results.json
+#   python -m benchmarks.scaling --baseline results.json
+#
+# With --baseline the times are compared with those of the same graph
+# and size in an earlier --output file, and the exit code is 1 when a
+# phase got slower by more than --threshold.
+#
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from cdqforcelayout.qfnetwork import QFNetwork, QFCompactNetwork
+from cdqforcelayout.qflayout import QFLayout
+from benchmarks.networks import GENERATORS
+
+
+PHASES = ("qfnetwork", "compact_network", "init", "round", "cx_layout")
+
+
+class _PhaseTimer:
+    # the run time of each phase, or its peak memory with trace_memory
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.results = {}
+
+    def run(self, phase, function, *args, **kwargs):
+        if self.trace_memory:
+            tracemalloc.start()
+            try:
+                value = function(*args, **kwargs)
+                self.results[phase] = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            return value
+        start = time.perf_counter()
+        value = function(*args, **kwargs)
+        self.results[phase] = time.perf_counter() - start
+        return value
+
+
+def _run_case(edges, rounds, layout_kwargs, trace_memory, skip_qfnetwork):
+    timer = _PhaseTimer(trace_memory)
+    if not skip_qfnetwork:
+        timer.run("qfnetwork", QFNetwork, edges)
+    network = timer.run("compact_network", QFCompactNetwork.from_edge_array, edges)
+    layout = timer.run("init", QFLayout, network, **layout_kwargs)
+    # the rounds are timed by do_layout itself, see QFLayout.round_stats
+    timer.run("rounds", layout.do_layout, rounds=rounds)
+    timer.run("cx_layout", network.get_cx_layout)
+    return timer.results, layout
+
+
+def run_benchmark(graph, nodes, rounds=3, seed=0, trace_memory=True,
+                  skip_qfnetwork=False, **layout_kwargs):
+    #
+    # return the results of one graph and size as a dict,
+    # times are in seconds and memory in bytes
+    #
+    edges = GENERATORS[graph](nodes, seed=seed)
+    seconds, layout = _run_case(edges, rounds, layout_kwargs, False, skip_qfnetwork)
+    result = {"graph": graph,
+              "nodes": layout.graph.get_nodecount(),
+              "edges": int(len(layout.graph.out_indices)),
+              "g_field": layout.gameboard.shape[0],
+              "seconds": seconds,
+              "round_seconds": [stats["seconds"] for stats in layout.round_stats]}
+    # the mean round is what regressions are checked on
+    seconds["round"] = float(np.mean(result["round_seconds"])) if rounds > 0 else 0.0
+    del seconds["rounds"]
+    if trace_memory:
+        peak_bytes = _run_case(edges, rounds, layout_kwargs, True, skip_qfnetwork)[0]
+        peak_bytes["round"] = peak_bytes.pop("rounds")
+        result["peak_bytes"] = peak_bytes
+    return result
+
+
+def compare_with_baseline(results, baseline, threshold):
+    #
+    # return (graph, nodes, phase, baseline seconds, seconds) for every
+    # phase that is slower than in the baseline by more than the fraction
+    # threshold, cases and phases missing from the baseline are skipped
+    #
+    before = dict(((case["graph"], case["nodes"]), case["seconds"]) for case in baseline["results"])
+    regressions = []
+    for case in results:
+        old = before.get((case["graph"], case["nodes"]))
+        if old is None:
+            continue
+        for phase in PHASES:
+            if phase in old and phase in case["seconds"] and \
+                    case["seconds"][phase] > old[phase] * (1 + threshold):
+                regressions.append((case["graph"], case["nodes"], phase,
+                                    old[phase], case["seconds"][phase]))
+    return regressions
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--graphs', nargs='+', choices=sorted(GENERATORS),
+                        default=sorted(GENERATORS))
+    parser.add_argument('--nodes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--sparsity', type=int, default=30)
+    parser.add_argument('--search', default='global',
+                        choices=['global', 'neighbors', 'pyramid'],
+                        help='neighbors is the only practical choice at 100k nodes')
+    parser.add_argument('--no_memory', action='store_true',
+                        help='skip the tracemalloc pass')
+    parser.add_argument('--skip_qfnetwork', action='store_true',
+                        help='do not time the dict based QFNetwork, slow on large networks')
+    parser.add_argument('--output', default=None, help='write the results as JSON to this file')
+    parser.add_argument('--baseline', default=None, help='results JSON to compare with')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='slowdown of a phase, as a fraction, that counts as a regression')
+    theargs = parser.parse_args(args)
+
+    results = []
+    print("graph\tnodes\tedges\t" + "\t".join(phase + "_s" for phase in PHASES) + "\tpeak_mb")
+    for graph in theargs.graphs:
+        for nodes in theargs.nodes:
+            result = run_benchmark(graph, nodes, rounds=theargs.rounds, seed=theargs.seed,
+                                   trace_memory=not theargs.no_memory,
+                                   skip_qfnetwork=theargs.skip_qfnetwork,
+                                   sparsity=theargs.sparsity, search=theargs.search)
+            results.append(result)
+            peak = max(result["peak_bytes"].values()) / 2**20 if "peak_bytes" in result else 0
+            print("%s\t%d\t%d\t%s\t%.1f" % (
+                graph, result["nodes"], result["edges"],
+                "\t".join("%.4f" % result["seconds"].get(phase, float("nan")) for phase in PHASES),
+                peak))
+            sys.stdout.flush()
+
+    if theargs.output is not None:
+        with open(theargs.output, 'w') as f:
+            json.dump({"python": platform.python_version(),
+                       "numpy": np.__version__,
+                       "machine": platform.machine(),
+                       "rounds": theargs.rounds,
+                       "search": theargs.search,
+                       "sparsity": theargs.sparsity,
+                       "results": results}, f, indent=1)
+
+    if theargs.baseline is not None:
+        with open(theargs.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, theargs.threshold)
+        for graph, nodes, phase, old, new in regressions:
+            print("regression: %s %d %s %.4fs -> %.4fs" % (graph, nodes, phase, old, new))
+        return 1 if len(regressions) > 0 else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
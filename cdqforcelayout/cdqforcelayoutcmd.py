@@ -3,13 +3,19 @@
 import os
 import sys
 import argparse
+import glob
+import time
 import traceback
 import json
 import logging
+from concurrent.futures import ProcessPoolExecutor
 from contextlib import redirect_stdout
 
-import ndex2
+from cdqforcelayout import qfnetwork
 from cdqforcelayout import qflayout
+from cdqforcelayout import qfmultilevel
+from cdqforcelayout import qfcomponents
+from cdqforcelayout import qfsharded
 
 
 logger = logging.getLogger('cdqforcelayout.cdqforcelayoutcmd')
@@ -39,7 +45,19 @@ def _parse_arguments(desc, args):
     parser = argparse.ArgumentParser(description=desc,
                                      formatter_class=Formatter)
     parser.add_argument('input',
-                        help='CX file')
+                        help='CX file, optionally gzip compressed, '
+                             '- reads it from standard input. With --batch '
+                             'a directory, a manifest file listing one CX '
+                             'file per line or a glob pattern')
+    parser.add_argument('--format', default='auto',
+                        choices=['auto', 'cx', 'edgelist', 'npz'],
+                        help='Format of the input. edgelist is a text file '
+                             'with the source and target of an edge per '
+                             'line, separated by tabs for .tsv, commas for '
+                             '.csv and white space otherwise. npz is a NumPy '
+                             '.npy or .npz edge array or a sparse adjacency '
+                             'matrix saved by scipy.sparse.save_npz. auto '
+                             'goes by the file extension and defaults to cx')
     parser.add_argument('--layout', default='auto',
                         choices=['auto'],
                         help='Layout algorithm to use. '
@@ -61,9 +79,113 @@ def _parse_arguments(desc, args):
                         help='TODO, please fill out')
     parser.add_argument('--center_attractor_scale', default=0.02, type=float,
                         help='TODO, please fill out')
-    parser.add_argument('--initialize_coordinates', choices=['center', 'random', 'spiral'],
+    parser.add_argument('--initialize_coordinates', choices=['center', 'random', 'spiral',
+                                                             'layout'],
                         default='spiral',
-                        help='TODO, please fill out')
+                        help='Initial positions of the nodes. layout starts '
+                             'from the cartesianLayout aspect of the CX '
+                             'input, scaled by --node_size, so that a few '
+                             '--rounds refine it. Nodes without a position '
+                             'start near their neighbors')
+    parser.add_argument('--search', choices=['global', 'neighbors',
+                                             'radius', 'pyramid'],
+                        default='global',
+                        help='Where to look for the new position of a node. '
+                             'global searches the whole field, neighbors '
+                             'only the neighborhood of the node\'s '
+                             'neighbors, which is much faster on large '
+                             'networks, radius only --search_radius cells '
+                             'around the node. pyramid searches the whole '
+                             'field through a pyramid of block minima, '
+                             'which is faster on large fields')
+    parser.add_argument('--search_radius', default=None, type=int,
+                        help='Half the side of the square searched around '
+                             'a node by --search radius, which requires it')
+    parser.add_argument('--search_margin', default=None, type=int,
+                        help='Cells added around the neighborhood of the '
+                             'node\'s neighbors by --search neighbors, '
+                             'default is the repulsion radius')
+    parser.add_argument('--workers', default=1, type=int,
+                        help='Number of threads that move nodes in parallel. '
+                             'Values above 1 require --search neighbors '
+                             'or radius')
+    parser.add_argument('--dtype', choices=['auto', 'int16', 'int32', 'int64'],
+                        default='auto',
+                        help='Integer type of the layout field. auto picks '
+                             'the narrowest type that cannot overflow for '
+                             'the degrees of the network, -vvv logs the '
+                             'choice and the reason')
+    parser.add_argument('--backend', choices=['auto', 'numpy', 'numba'],
+                        default='auto',
+                        help='How nodes are moved: numba compiles the '
+                             'rounds and needs Numba installed, numpy does '
+                             'not, both give the same layout. auto uses '
+                             'numba when it is installed')
+    parser.add_argument('--attraction', choices=['steps', 'inverse_sqrt', 'inverse'],
+                        default='steps',
+                        help='How the attraction of a node falls with its '
+                             'degree: steps is 10 times a_scale for degree 1 '
+                             'and 5 times below degree 5, inverse_sqrt and '
+                             'inverse fall smoothly from 10 times a_scale')
+    parser.add_argument('--field_dir', default=None,
+                        help='Keep the layout field in memory-mapped '
+                             'files in this directory instead of in '
+                             'memory, for networks whose field does not '
+                             'fit in memory. Requires --search neighbors, '
+                             'radius or pyramid')
+    parser.add_argument('--multilevel', action='store_true',
+                        help='Lay out a coarsened version of the network '
+                             'first, with --rounds rounds, then refine it '
+                             'level by level with --refine_rounds rounds '
+                             'each. Much faster on large networks')
+    parser.add_argument('--refine_rounds', default=3, type=int,
+                        help='Number of layout iterations on each level '
+                             'finer than the coarsest with --multilevel')
+    parser.add_argument('--components', action='store_true',
+                        help='Lay out each connected component on its own '
+                             'field, in parallel processes, and pack the '
+                             'results side by side')
+    parser.add_argument('--shards', default=None, type=int,
+                        help='Split the field into this many tiles, each '
+                             'laid out by its own worker process, for '
+                             'networks too large for one process. '
+                             'Requires --search neighbors, radius or '
+                             'pyramid')
+    parser.add_argument('--processes', default=None, type=int,
+                        help='Number of worker processes for --components '
+                             'or --batch, default is the number of CPUs')
+    parser.add_argument('--batch', action='store_true',
+                        help='Lay out every CX file given by input in '
+                             'worker processes, writing the '
+                             'cartesianLayout aspect of each to '
+                             '--output_dir and a JSON summary of the time '
+                             'and failures of each file to standard out')
+    parser.add_argument('--output_dir', default=None,
+                        help='Directory for the outputs of --batch')
+    parser.add_argument('--tolerance', default=None, type=float,
+                        help='Stop before --rounds rounds when the energy '
+                             'of the layout has not improved by more than '
+                             'this fraction for --patience rounds in a row. '
+                             'By default all rounds are run')
+    parser.add_argument('--patience', default=3, type=int,
+                        help='Number of rounds without improvement that '
+                             'stop the layout, see --tolerance')
+    parser.add_argument('--checkpoint', default=None,
+                        help='Save the layout to this file every '
+                             '--checkpoint_every rounds. If the file '
+                             'exists the layout resumes from it and runs '
+                             'the rounds of --rounds it has not done yet, '
+                             'with the parameters it was saved with. Not '
+                             'used with --multilevel, --components, '
+                             '--shards or --batch')
+    parser.add_argument('--checkpoint_every', default=1, type=int,
+                        help='Number of rounds between saves of '
+                             '--checkpoint')
+    parser.add_argument('--round_stats', default=None,
+                        help='Write the statistics of each round, nodes '
+                             'moved, displacement, energy and run time, '
+                             'as JSON to this file, - writes them to '
+                             'standard error')
     parser.add_argument('--verbose', '-v', action='count', default=0,
                         help='Increases verbosity of logger to standard '
                              'error for log messages in this module and '
@@ -105,6 +227,321 @@ def _setup_logging(args):
                               disable_existing_loggers=False)
 
 
+def _get_layout_kwargs(theargs):
+    """
+    Gets the :py:class:`~cdqforcelayout.qflayout.QFLayout` parameters
+    from the parsed command line arguments
+
+    :param theargs: Holds attributes from argparse
+    :type theargs: `:py:class:`argparse.Namespace`
+    :return: keyword arguments for QFLayout
+    :rtype: dict
+    """
+    return {'initialize_coordinates': theargs.initialize_coordinates,
+            'sparsity': theargs.sparsity,
+            'a_radius': theargs.a_radius,
+            'r_scale': theargs.r_scale,
+            'a_scale': theargs.a_scale,
+            'center_attractor_scale': theargs.center_attractor_scale,
+            'search': theargs.search,
+            'search_radius': theargs.search_radius,
+            'search_margin': theargs.search_margin,
+            'workers': theargs.workers,
+            'dtype': theargs.dtype,
+            'attraction': theargs.attraction,
+            'backend': theargs.backend,
+            'field_dir': theargs.field_dir}
+
+
+def _get_stopping_kwargs(theargs):
+    """
+    Gets the early stopping arguments of do_layout from
+    the command line arguments
+
+    :param theargs: Holds attributes from argparse
+    :type theargs: `:py:class:`argparse.Namespace`
+    :return: keyword arguments for do_layout
+    :rtype: dict
+    """
+    return {'tolerance': theargs.tolerance,
+            'patience': theargs.patience}
+
+
+def _write_round_stats(round_stats, path, err_stream):
+    """
+    Writes the round statistics of a layout as JSON
+
+    :param round_stats: statistics of each round of the layout
+    :type round_stats: list
+    :param path: file to write to, ``-`` for err_stream,
+                 ``None`` writes nothing
+    :type path: str
+    :param err_stream: stream for standard error output
+    :type err_stream: file like object
+    :return: None
+    """
+    if path is None:
+        return
+    if path == '-':
+        json.dump(round_stats, err_stream)
+        err_stream.write('\n')
+        return
+    with open(path, 'w') as f:
+        json.dump(round_stats, f)
+
+
+EDGE_LIST_EXTENSIONS = ('.tsv', '.csv', '.txt', '.edges', '.edgelist')
+
+
+def _get_input_format(path, input_format):
+    """
+    Gets the format of an input file
+
+    :param path: input file
+    :type path: str
+    :param input_format: format given on the command line
+    :type input_format: str
+    :return: ``cx``, ``edgelist`` or ``npz``
+    :rtype: str
+    """
+    if input_format != 'auto':
+        return input_format
+    name = path.lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    if name.endswith('.npz') or name.endswith('.npy'):
+        return 'npz'
+    if name.endswith(EDGE_LIST_EXTENSIONS):
+        return 'edgelist'
+    return 'cx'
+
+
+def _read_network(path, input_format='auto'):
+    """
+    Reads the network of an input file. CX files are streamed,
+    see :py:mod:`~cdqforcelayout.cxreader`, none of the formats
+    needs ndex2
+
+    :param path: input file, ``-`` for CX on standard input
+    :type path: str
+    :param input_format: ``auto``, ``cx``, ``edgelist`` or ``npz``
+    :type input_format: str
+    :return: the network
+    :rtype: :py:class:`~cdqforcelayout.qfnetwork.QFCompactNetwork`
+    """
+    input_format = _get_input_format(path, input_format)
+    if input_format == 'edgelist':
+        return qfnetwork.QFCompactNetwork.from_edge_list(path)
+    if input_format == 'npz':
+        return qfnetwork.QFCompactNetwork.from_npz(path)
+    return qfnetwork.QFCompactNetwork.from_cx(path)
+
+
+def _layout_network(net, theargs, processes=None):
+    """
+    Lays out a network with the layout chosen by the command line
+    arguments
+
+    :param net: network to lay out
+    :type net: :py:class:`~cdqforcelayout.qfnetwork.QFCompactNetwork`
+    :param theargs: Holds attributes from argparse
+    :type theargs: `:py:class:`argparse.Namespace`
+    :param processes: worker processes for --components, ``None``
+                      uses ``theargs.processes``
+    :type processes: int
+    :return: the layout object and the cartesianLayout aspect
+    :rtype: tuple
+    """
+    if theargs.checkpoint is not None and (theargs.multilevel or theargs.components
+                                           or theargs.shards or theargs.batch):
+        raise ValueError('--checkpoint is not supported with --multilevel, '
+                         '--components, --shards or --batch')
+    layout_kwargs = _get_layout_kwargs(theargs)
+    if theargs.initialize_coordinates == 'layout':
+        # start from the cartesianLayout aspect of the input
+        layout_kwargs.update(cx_layout=net.cx_layout,
+                             cx_node_size=theargs.node_size)
+    if theargs.multilevel:
+        qfl = qfmultilevel.QFMultilevelLayout(net,
+                                              coarse_rounds=theargs.rounds,
+                                              refine_rounds=theargs.refine_rounds,
+                                              **layout_kwargs)
+        new_layout = qfl.do_layout(node_size=theargs.node_size,
+                                   **_get_stopping_kwargs(theargs))
+    elif theargs.shards:
+        # the shards are the worker processes, the threads, the
+        # field on disk and the backend are for a single field
+        layout_kwargs.pop('workers')
+        layout_kwargs.pop('field_dir')
+        layout_kwargs.pop('backend')
+        qfl = qfsharded.QFShardedLayout(net, shards=theargs.shards,
+                                        **layout_kwargs)
+        new_layout = qfl.do_layout(rounds=theargs.rounds, node_size=theargs.node_size,
+                                   **_get_stopping_kwargs(theargs))
+    elif theargs.components:
+        if processes is None:
+            processes = theargs.processes
+        qfl = qfcomponents.QFComponentLayout(net, processes=processes,
+                                             **layout_kwargs)
+        new_layout = qfl.do_layout(rounds=theargs.rounds, node_size=theargs.node_size,
+                                   **_get_stopping_kwargs(theargs))
+    elif theargs.checkpoint is not None and os.path.isfile(theargs.checkpoint):
+        qfl = qflayout.QFLayout.load(theargs.checkpoint, workers=theargs.workers)
+        logger.info('resuming after ' + str(qfl.rounds_done) + ' rounds')
+        new_layout = qfl.do_layout(rounds=max(theargs.rounds - qfl.rounds_done, 0),
+                                   node_size=theargs.node_size,
+                                   checkpoint=theargs.checkpoint,
+                                   checkpoint_every=theargs.checkpoint_every,
+                                   **_get_stopping_kwargs(theargs))
+    else:
+        qfl = qflayout.QFLayout(net, **layout_kwargs)
+        new_layout = qfl.do_layout(rounds=theargs.rounds, node_size=theargs.node_size,
+                                   checkpoint=theargs.checkpoint,
+                                   checkpoint_every=theargs.checkpoint_every,
+                                   **_get_stopping_kwargs(theargs))
+    return qfl, new_layout
+
+
+def _get_batch_inputs(source):
+    """
+    Gets the CX files of a batch
+
+    :param source: a directory, whose files are taken in name order,
+                   a manifest file listing one path per line, relative
+                   paths are relative to the manifest, blank lines and
+                   lines starting with ``#`` are skipped, or a glob pattern
+    :type source: str
+    :return: paths of the CX files
+    :rtype: list
+    """
+    if os.path.isdir(source):
+        return [os.path.join(source, name) for name in sorted(os.listdir(source))
+                if os.path.isfile(os.path.join(source, name))]
+    if os.path.isfile(source):
+        with open(source) as f:
+            lines = [line.strip() for line in f]
+        return [os.path.join(os.path.dirname(source), line) for line in lines
+                if len(line) > 0 and not line.startswith('#')]
+    return sorted(glob.glob(source))
+
+
+def _get_batch_output(path, output_dir):
+    """
+    Gets the output file for a CX file of a batch, the name of the
+    CX file without ``.gz`` and ``.cx`` extensions plus ``.json``
+
+    :param path: CX file
+    :type path: str
+    :param output_dir: directory of the outputs
+    :type output_dir: str
+    :return: path of the output file
+    :rtype: str
+    """
+    name = os.path.basename(path)
+    for extension in ('.gz', '.cx'):
+        if name.endswith(extension):
+            name = name[:-len(extension)]
+    return os.path.join(output_dir, name + '.json')
+
+
+def _warm_kernels(theargs):
+    """
+    Builds the kernels of the layout in a batch worker process
+    so that they are in its kernel cache for every file
+
+    :param theargs: Holds attributes from argparse
+    :type theargs: `:py:class:`argparse.Namespace`
+    :return: None
+    """
+    layout_kwargs = _get_layout_kwargs(theargs)
+    # the kernels don't depend on the initial positions
+    layout_kwargs['initialize_coordinates'] = 'spiral'
+    qflayout.QFLayout(qfnetwork.QFCompactNetwork.from_edge_array([[0, 1]]),
+                      **layout_kwargs)
+
+
+def _run_batch_file(theargs, path, output_path):
+    """
+    Lays out one CX file of a batch and writes its cartesianLayout
+    aspect to output_path. Failures are reported, not raised.
+
+    :param theargs: Holds attributes from argparse
+    :type theargs: `:py:class:`argparse.Namespace`
+    :param path: CX file
+    :type path: str
+    :param output_path: file for the cartesianLayout aspect
+    :type output_path: str
+    :return: summary of the file: input, output, status and, on
+             success, nodes, rounds and seconds, on failure error
+    :rtype: dict
+    """
+    summary = {'input': path, 'output': output_path}
+    start = time.perf_counter()
+    try:
+        net = _read_network(path, theargs.format)
+        # the batch runs the files in parallel, not the components
+        qfl, new_layout = _layout_network(net, theargs, processes=1)
+        with open(output_path, 'w') as f:
+            json.dump(new_layout, f)
+        summary.update(status='ok', nodes=net.get_nodecount(),
+                       rounds=len(qfl.round_stats))
+    except Exception as e:
+        logger.exception('layout of ' + path + ' failed')
+        summary.update(status='failed', error=str(e))
+    summary['seconds'] = time.perf_counter() - start
+    return summary
+
+
+def run_batch(theargs, out_stream=sys.stdout,
+              err_stream=sys.stderr):
+    """
+    Runs the QForce layout on every CX file of a batch in a pool of
+    worker processes, each of which keeps its kernels between files.
+    Writes a JSON summary with the timing and the failures of each file
+    to out_stream, a file that fails does not stop the batch.
+
+    :param theargs: Holds attributes from argparse
+    :type theargs: `:py:class:`argparse.Namespace`
+    :param out_stream: stream for standard output
+    :type out_stream: file like object
+    :param err_stream: stream for standard error output
+    :type err_stream: file like object
+    :return: 0 if every file was laid out, 5 if some failed,
+             otherwise error
+    :rtype: int
+    """
+    if theargs.output_dir is None:
+        err_stream.write('--batch requires --output_dir')
+        return 3
+    inputs = _get_batch_inputs(theargs.input)
+    if len(inputs) == 0:
+        err_stream.write(str(theargs.input) + ' matches no files')
+        return 3
+    os.makedirs(theargs.output_dir, exist_ok=True)
+    outputs = [_get_batch_output(path, theargs.output_dir) for path in inputs]
+    try:
+        if theargs.processes == 1 or len(inputs) == 1:
+            summaries = [_run_batch_file(theargs, path, output_path)
+                         for path, output_path in zip(inputs, outputs)]
+        else:
+            with ProcessPoolExecutor(max_workers=theargs.processes,
+                                     initializer=_warm_kernels,
+                                     initargs=(theargs,)) as executor:
+                futures = [executor.submit(_run_batch_file, theargs, path, output_path)
+                           for path, output_path in zip(inputs, outputs)]
+                summaries = [future.result() for future in futures]
+        failed = [summary for summary in summaries if summary['status'] != 'ok']
+        json.dump({'files': len(summaries), 'failed': len(failed),
+                   'results': summaries}, out_stream)
+        out_stream.write('\n')
+        for summary in failed:
+            err_stream.write(summary['input'] + ' failed: ' + summary['error'] + '\n')
+        return 5 if len(failed) > 0 else 0
+    finally:
+        err_stream.flush()
+        out_stream.flush()
+
+
 def run_layout(theargs, out_stream=sys.stdout,
                err_stream=sys.stderr):
     """
@@ -119,26 +556,24 @@ def run_layout(theargs, out_stream=sys.stdout,
     :return: 0 upon success otherwise error
     :rtype: int
     """
+    if theargs.batch:
+        return run_batch(theargs, out_stream=out_stream,
+                         err_stream=err_stream)
 
-    if theargs.input is None or not os.path.isfile(theargs.input):
-        err_stream.write(str(theargs.input) + ' is not a file')
-        return 3
+    if theargs.input != '-':
+        if theargs.input is None or not os.path.isfile(theargs.input):
+            err_stream.write(str(theargs.input) + ' is not a file')
+            return 3
 
-    if os.path.getsize(theargs.input) == 0:
-        err_stream.write(str(theargs.input) + ' is an empty file')
-        return 4
+        if os.path.getsize(theargs.input) == 0:
+            err_stream.write(str(theargs.input) + ' is an empty file')
+            return 4
 
     try:
         with redirect_stdout(sys.stderr):
-            net = ndex2.create_nice_cx_from_file(theargs.input)
-            qfl = qflayout.QFLayout.from_nicecx(net,
-                                                initialize_coordinates=theargs.initialize_coordinates,
-                                                sparsity=theargs.sparsity,
-                                                a_radius=theargs.a_radius,
-                                                r_scale=theargs.r_scale,
-                                                a_scale=theargs.a_scale,
-                                                center_attractor_scale=theargs.center_attractor_scale)
-            new_layout = qfl.do_layout(rounds=theargs.rounds, node_size=theargs.node_size)
+            net = _read_network(theargs.input, theargs.format)
+            qfl, new_layout = _layout_network(net, theargs)
+            _write_round_stats(qfl.round_stats, theargs.round_stats, err_stream)
             # write value of cartesianLayout aspect to output stream
             logger.debug(str(new_layout))
             json.dump(new_layout, out_stream)
@@ -0,0 +1,465 @@
+#!/usr/bin/env python
+
+import io
+import sys
+import gzip
+import argparse
+import traceback
+import json
+import inspect
+import logging
+import threading
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qs
+
+import ijson
+
+from cdqforcelayout import qfnetwork
+from cdqforcelayout import qflayout
+
+
+logger = logging.getLogger('cdqforcelayout.cdqforcelayoutservice')
+
+
+LOG_FORMAT = "%(asctime)-15s %(levelname)s %(relativeCreated)dms " \
+             "%(filename)s::%(funcName)s():%(lineno)d %(message)s"
+
+#
+# QFLayout parameters a request can set in its query string,
+# with the type their values are converted to
+#
+LAYOUT_PARAMETERS = {'sparsity': int, 'a_radius': int, 'r_radius': int,
+                     'r_scale': int, 'a_scale': int,
+                     'center_attractor_scale': float,
+                     'initialize_coordinates': str, 'search': str,
+                     'search_radius': int, 'search_margin': int}
+
+#
+# do_layout parameters a request can set in its query string
+#
+DO_LAYOUT_PARAMETERS = {'rounds': int, 'node_size': int,
+                        'tolerance': float, 'patience': int}
+
+#
+# the parameters limited by the max_radius of the service,
+# they set the size of the fields added per node move
+#
+RADIUS_PARAMETERS = ('a_radius', 'r_radius')
+
+#
+# exceptions of a layout that are caused by the request body,
+# they are answered with 400, any other failure with 500.
+# gzip raises a plain OSError before Python 3.8
+#
+INPUT_ERRORS = (ValueError, ijson.JSONError, getattr(gzip, 'BadGzipFile', OSError))
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    # http.server.ThreadingHTTPServer, which needs Python 3.7
+    daemon_threads = True
+
+
+class Formatter(argparse.ArgumentDefaultsHelpFormatter,
+                argparse.RawDescriptionHelpFormatter):
+    pass
+
+
+def _parse_arguments(desc, args):
+    """
+    Parses command line arguments
+
+    :param desc: Description shown when -h is passed on
+                 command line
+    :type desc: str
+    :param args: Arguments from command line
+    :type args: list
+    :return: Argument Parser
+    :rtype: :py:class:`argparse.ArgumentParser`
+    """
+    parser = argparse.ArgumentParser(description=desc,
+                                     formatter_class=Formatter)
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='Address to listen on, 0.0.0.0 listens on '
+                             'every interface')
+    parser.add_argument('--port', default=8080, type=int,
+                        help='Port to listen on, 0 picks a free port')
+    parser.add_argument('--workers', default=2, type=int,
+                        help='Number of worker processes, the number of '
+                             'layouts that run at the same time')
+    parser.add_argument('--max_queue', default=16, type=int,
+                        help='Number of requests that may wait for a '
+                             'worker, further requests are refused with '
+                             '503 until one finishes')
+    parser.add_argument('--timeout', default=60.0, type=float,
+                        help='Seconds a request may take, including its '
+                             'wait for a worker, before it is answered '
+                             'with 504')
+    parser.add_argument('--max_payload', default=256 * 2**20, type=int,
+                        help='Largest request body in bytes')
+    parser.add_argument('--rounds', default=10, type=int,
+                        help='Number of layout iterations of requests '
+                             'that do not set rounds')
+    parser.add_argument('--max_rounds', default=1000, type=int,
+                        help='Most layout iterations a request may set, '
+                             'requests over it are refused with 400')
+    parser.add_argument('--max_radius', default=100, type=int,
+                        help='Largest a_radius and r_radius a request '
+                             'may set, requests over it are refused '
+                             'with 400')
+    parser.add_argument('--max_field', default=2**26, type=int,
+                        help='Most cells of the g_field of a layout, its '
+                             'side grows with the square root of sparsity '
+                             'times the node count. Larger layouts are '
+                             'refused with 400')
+    parser.add_argument('--verbose', '-v', action='count', default=0,
+                        help='Increases verbosity of logger to standard '
+                             'error for log messages in this module and '
+                             '. Messages are '
+                             'output at these python logging levels '
+                             '-v = ERROR, -vv = WARNING, -vvv = INFO, '
+                             '-vvvv = DEBUG, -vvvvv = NOTSET (default is to '
+                             'log CRITICAL)')
+    return parser.parse_args(args)
+
+
+def _setup_logging(args):
+    """
+    Sets up logging based on parsed command line arguments.
+
+    :param args: parsed command line arguments from argparse
+    :return: None
+    """
+    level = (50 - (10 * args.verbose))
+    logging.basicConfig(format=LOG_FORMAT,
+                        level=level)
+    logger.setLevel(level)
+
+
+def _get_network(payload, content_type):
+    """
+    Gets the network of a request body
+
+    :param payload: CX, optionally gzip compressed, or an edge list
+                    when content_type is ``text/plain``: a source and a
+                    target node id per line, separated by white space
+    :type payload: bytes
+    :param content_type: content type of the request
+    :type content_type: str
+    :return: the network
+    :rtype: :py:class:`~cdqforcelayout.qfnetwork.QFCompactNetwork`
+    """
+    if content_type is not None and content_type.split(';')[0].strip() == 'text/plain':
+        return qfnetwork.QFCompactNetwork.from_edge_list(io.BytesIO(payload), delimiter=None)
+    return qfnetwork.QFCompactNetwork.from_cx(io.BytesIO(payload))
+
+
+def _warm_worker():
+    """
+    Lays out a tiny network in a new worker process so that the
+    imports are done and the default kernels are in its kernel cache
+
+    :return: None
+    """
+    qflayout.QFLayout(qfnetwork.QFCompactNetwork.from_edge_array([[0, 1]])).do_layout()
+
+
+def _layout_payload(payload, content_type, layout_kwargs, do_layout_kwargs,
+                    max_field=None):
+    """
+    Runs in a worker process, lays out the network of a request body
+
+    :param max_field: most cells of the g_field, None for no limit
+    :type max_field: int
+    :raises ValueError: for a g_field larger than max_field
+    :return: cartesianLayout aspect
+    :rtype: list
+    """
+    network = _get_network(payload, content_type)
+    if max_field is not None:
+        sparsity = layout_kwargs.get('sparsity',
+                                     inspect.signature(qflayout.QFLayout).parameters['sparsity'].default)
+        dimension = qflayout.QFLayout.board_dimension(network.get_nodecount(), sparsity)
+        if dimension * dimension > max_field:
+            raise ValueError('g_field of ' + str(dimension * dimension) +
+                             ' cells is over the limit of ' + str(max_field) +
+                             ', lower sparsity')
+    layout = qflayout.QFLayout(network, **layout_kwargs)
+    return layout.do_layout(**do_layout_kwargs)
+
+
+def _get_request_kwargs(query, rounds, max_rounds=None, max_radius=None):
+    """
+    Gets the QFLayout and do_layout parameters of a query string
+
+    :param query: query string of the request
+    :type query: str
+    :param rounds: rounds when the query does not set them
+    :type rounds: int
+    :param max_rounds: most rounds the query may set, None for no limit
+    :type max_rounds: int
+    :param max_radius: largest radius the query may set, None for no limit
+    :type max_radius: int
+    :raises ValueError: for an unknown parameter, a bad value or
+                        a value over a limit
+    :return: keyword arguments for QFLayout and for do_layout
+    :rtype: tuple
+    """
+    layout_kwargs = {}
+    do_layout_kwargs = {'rounds': rounds}
+    for name, values in parse_qs(query).items():
+        if name in LAYOUT_PARAMETERS:
+            layout_kwargs[name] = LAYOUT_PARAMETERS[name](values[-1])
+        elif name in DO_LAYOUT_PARAMETERS:
+            do_layout_kwargs[name] = DO_LAYOUT_PARAMETERS[name](values[-1])
+        else:
+            raise ValueError('unknown parameter: ' + name)
+    if max_rounds is not None and do_layout_kwargs['rounds'] > max_rounds:
+        raise ValueError('rounds over the limit of ' + str(max_rounds))
+    for name in RADIUS_PARAMETERS:
+        if max_radius is not None and layout_kwargs.get(name, 0) > max_radius:
+            raise ValueError(name + ' over the limit of ' + str(max_radius))
+    return layout_kwargs, do_layout_kwargs
+
+
+class QFLayoutService:
+    """
+    Lays out the networks of requests in a pool of worker processes.
+    At most workers layouts run at the same time and at most max_queue
+    more wait for a worker. A request that times out is answered, but
+    its layout keeps its worker busy, and its slot taken, until it
+    finishes. A pool broken by a worker that died, e.g. killed for
+    running out of memory, is replaced by a new one.
+
+    max_rounds, max_radius and max_field bound the work of a layout,
+    requests over them are refused, see :py:func:`_get_request_kwargs`
+    and :py:func:`_layout_payload`.
+    """
+    def __init__(self, workers=2, max_queue=16, timeout=60.0, rounds=10,
+                 max_rounds=1000, max_radius=100, max_field=2**26):
+        self.timeout = timeout
+        self.rounds = rounds
+        self.max_rounds = max_rounds
+        self.max_radius = max_radius
+        self.max_field = max_field
+        self._workers = workers
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._executor_lock = threading.Lock()
+        self._executor = self._make_executor()
+        # the layouts not done yet, cancelled by shutdown
+        self._pending = set()
+
+    def _make_executor(self):
+        """
+        Makes a pool of warm worker processes
+
+        :rtype: :py:class:`concurrent.futures.ProcessPoolExecutor`
+        """
+        executor = ProcessPoolExecutor(max_workers=self._workers,
+                                       initializer=_warm_worker)
+        # start the workers now rather than on the first request
+        for future in [executor.submit(int) for worker in range(self._workers)]:
+            future.result()
+        return executor
+
+    def _replace_executor(self, broken):
+        """
+        Replaces the pool broken by a dead worker, unless another
+        request has replaced it already
+
+        :param broken: the broken pool
+        :type broken: :py:class:`concurrent.futures.ProcessPoolExecutor`
+        :return: None
+        """
+        with self._executor_lock:
+            if self._executor is broken:
+                logger.error('a worker process died, replacing the pool')
+                broken.shutdown(wait=False)
+                self._executor = self._make_executor()
+
+    def healthy(self):
+        """
+        Checks that the pool of workers can take layouts, a broken
+        pool is replaced
+
+        :return: False if the pool was broken
+        :rtype: bool
+        """
+        executor = self._executor
+        try:
+            # a broken pool refuses any work, a no-op is
+            # queued behind the layouts of a working one
+            executor.submit(int)
+        except BrokenProcessPool:
+            self._replace_executor(executor)
+            return False
+        return True
+
+    def layout(self, payload, content_type=None, query=''):
+        """
+        Lays out the network of a request
+
+        :return: HTTP status and the response, the cartesianLayout
+                 aspect or an error message
+        :rtype: tuple
+        """
+        try:
+            layout_kwargs, do_layout_kwargs = _get_request_kwargs(query, self.rounds,
+                                                                  max_rounds=self.max_rounds,
+                                                                  max_radius=self.max_radius)
+        except ValueError as e:
+            return 400, {'error': str(e)}
+        if not self._slots.acquire(blocking=False):
+            return 503, {'error': 'too many requests'}
+        executor = self._executor
+        try:
+            future = executor.submit(_layout_payload, payload, content_type,
+                                     layout_kwargs, do_layout_kwargs, self.max_field)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._replace_executor(executor)
+            return 503, {'error': 'a worker process died, try again'}
+        except Exception as e:
+            self._slots.release()
+            logger.exception('layout could not be started')
+            return 500, {'error': str(e)}
+        # the slot is free once the layout is done, not when
+        # the request is answered, see the timeout below
+        self._pending.add(future)
+        future.add_done_callback(self._layout_done)
+        try:
+            return 200, future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # only a layout still waiting for a worker is cancelled,
+            # a running one keeps its slot until it finishes
+            future.cancel()
+            return 504, {'error': 'layout timed out'}
+        except CancelledError:
+            # cancelled by shutdown while waiting for a worker
+            return 503, {'error': 'service is shutting down'}
+        except BrokenProcessPool:
+            self._replace_executor(executor)
+            return 500, {'error': 'the worker process of the layout died'}
+        except INPUT_ERRORS as e:
+            return 400, {'error': str(e)}
+        except Exception as e:
+            logger.exception('layout failed')
+            return 500, {'error': str(e)}
+
+    def _layout_done(self, future):
+        self._pending.discard(future)
+        self._slots.release()
+
+    def shutdown(self):
+        """
+        Stops the workers, the layouts still waiting for a worker are
+        cancelled
+
+        :return: None
+        """
+        # shutdown(cancel_futures=True) needs Python 3.9
+        for future in list(self._pending):
+            future.cancel()
+        self._executor.shutdown(wait=False)
+
+
+def make_server(service, host='127.0.0.1', port=8080, max_payload=256 * 2**20):
+    """
+    Makes an HTTP server for the service. ``POST /layout`` with a CX
+    body, or an edge list with content type ``text/plain``, answers
+    with the cartesianLayout aspect, QFLayout and do_layout parameters
+    go in the query string. ``GET /health`` answers ``{"status": "ok"}``,
+    or 503 and ``{"status": "broken"}`` when a worker process died, the
+    pool of workers is replaced by then.
+
+    :return: the server, call serve_forever() to run it
+    :rtype: :py:class:`ThreadingHTTPServer`
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status, response):
+            body = json.dumps(response).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if urlparse(self.path).path != '/health':
+                self._reply(404, {'error': 'not found'})
+            elif service.healthy():
+                self._reply(200, {'status': 'ok'})
+            else:
+                self._reply(503, {'status': 'broken'})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            if url.path != '/layout':
+                self._reply(404, {'error': 'not found'})
+                return
+            length = self.headers.get('Content-Length')
+            if length is None:
+                self._reply(411, {'error': 'Content-Length required'})
+                return
+            try:
+                length = int(length)
+            except ValueError:
+                length = -1
+            if length < 0:
+                self._reply(400, {'error': 'bad Content-Length'})
+                return
+            if length > max_payload:
+                self._reply(413, {'error': 'payload too large'})
+                return
+            payload = self.rfile.read(length)
+            self._reply(*service.layout(payload, self.headers.get('Content-Type'),
+                                        url.query))
+
+        def log_message(self, format, *args):
+            logger.info(format % args)
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def main(args):
+    """
+    Main entry point for program
+    :param args: command line arguments usually :py:const:`sys.argv`
+    :return: 0 for success otherwise failure
+    :rtype: int
+    """
+    desc = """
+    Runs qforce layout as an HTTP service. POST a CX network, or an
+    edge list as text/plain, to /layout and get its cartesianLayout
+    aspect back. Layout parameters go in the query string, e.g.
+    /layout?rounds=20&search=neighbors
+    """
+    theargs = _parse_arguments(desc, args[1:])
+    try:
+        _setup_logging(theargs)
+        service = QFLayoutService(workers=theargs.workers, max_queue=theargs.max_queue,
+                                  timeout=theargs.timeout, rounds=theargs.rounds,
+                                  max_rounds=theargs.max_rounds,
+                                  max_radius=theargs.max_radius,
+                                  max_field=theargs.max_field)
+        server = make_server(service, host=theargs.host, port=theargs.port,
+                             max_payload=theargs.max_payload)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            service.shutdown()
+        return 0
+    except Exception as e:
+        sys.stderr.write('\n\nCaught exception: ' + str(e))
+        traceback.print_exc()
+        return 2
+
+
+if __name__ == '__main__':  # pragma: no cover
+    sys.exit(main(sys.argv))
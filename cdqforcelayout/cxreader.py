@@ -0,0 +1,116 @@
+#
+# Streaming CX reader
+#
+# The layout only needs the ids of the nodes and the source and
+# target of each edge. Instead of materializing the whole network
+# as a NiceCXNetwork this reads the CX JSON incrementally with ijson
+# and keeps only the @id of the nodes aspect and the s and t of the
+# edges aspect, every other aspect is skipped token by token.
+#
+# Input can be a path, "-" for standard input or a binary file
+# object, gzip compressed input is recognized by its magic number.
+#
+import gzip
+import sys
+from array import array
+
+import ijson
+import numpy as np
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+class _PrefixedReader:
+    # a binary stream whose first bytes were already read
+    def __init__(self, prefix, stream):
+        self._prefix = prefix
+        self._stream = stream
+
+    def read(self, size=-1):
+        if len(self._prefix) == 0:
+            return self._stream.read(size)
+        if size is None or size < 0:
+            data = self._prefix + self._stream.read()
+        else:
+            data = self._prefix[:size]
+            if len(data) < size:
+                data += self._stream.read(size - len(data))
+        self._prefix = self._prefix[len(data):]
+        return data
+
+
+def open_cx(stream):
+    #
+    # return a readable binary stream of the CX JSON
+    # in stream, decompressing gzip input
+    #
+    magic = stream.read(len(GZIP_MAGIC))
+    stream = _PrefixedReader(magic, stream)
+    if magic == GZIP_MAGIC:
+        return gzip.GzipFile(fileobj=stream, mode="rb")
+    return stream
+
+
+def read_cx_edges(source, with_layout=False):
+    #
+    # return the node ids, in the order of the nodes aspect,
+    # and an n x 2 array of the source and target node ids
+    # of the edges of a CX network
+    #
+    # with_layout also returns the cartesianLayout aspect as an
+    # m x 3 array of node id, x and y, None if there is none
+    #
+    # source is a path, "-" for standard input or a binary file object
+    #
+    if source == "-":
+        return _parse_cx_edges(open_cx(sys.stdin.buffer), with_layout)
+    if isinstance(source, (str, bytes)) or hasattr(source, "__fspath__"):
+        with open(source, "rb") as stream:
+            return _parse_cx_edges(open_cx(stream), with_layout)
+    return _parse_cx_edges(open_cx(source), with_layout)
+
+
+def _parse_cx_edges(stream, with_layout=False):
+    node_ids = array("q")
+    edge_ends = array("q")
+    layout = array("d")
+    has_layout = False
+    source_id = target_id = None
+    position = {}
+    for prefix, event, value in ijson.parse(stream, use_float=True):
+        if prefix == "item.nodes.item.@id":
+            node_ids.append(value)
+        elif prefix == "item.edges.item.s":
+            source_id = value
+        elif prefix == "item.edges.item.t":
+            target_id = value
+        elif prefix == "item.edges.item" and event == "end_map":
+            if source_id is None or target_id is None:
+                raise ValueError("edge " + str(len(edge_ends) // 2) + " lacks s or t")
+            edge_ends.append(source_id)
+            edge_ends.append(target_id)
+            source_id = target_id = None
+        elif not with_layout:
+            continue
+        elif prefix == "item.cartesianLayout":
+            has_layout = True
+        elif prefix in ("item.cartesianLayout.item.node", "item.cartesianLayout.item.x",
+                        "item.cartesianLayout.item.y"):
+            position[prefix.rsplit(".", 1)[1]] = value
+        elif prefix == "item.cartesianLayout.item" and event == "end_map":
+            if len(position) != 3:
+                raise ValueError("cartesianLayout entry lacks node, x or y")
+            layout.extend((position["node"], position["x"], position["y"]))
+            position = {}
+    edge_array = np.frombuffer(edge_ends, dtype=np.int64).reshape(-1, 2)
+    logger.debug("edge array: " + str(edge_array.shape))
+    node_ids = np.frombuffer(node_ids, dtype=np.int64)
+    if not with_layout:
+        return node_ids, edge_array
+    layout = np.frombuffer(layout, dtype=np.float64).reshape(-1, 3) if has_layout else None
+    return node_ids, edge_array, layout
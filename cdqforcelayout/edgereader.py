@@ -0,0 +1,202 @@
+#
+# Edge list and NPZ readers
+#
+# Networks that don't come as CX: delimited text edge lists, NumPy
+# .npy and .npz edge arrays and SciPy sparse matrices saved with
+# scipy.sparse.save_npz. All of them return an n x 2 array of source
+# and target node ids, or the node count and index edges for the
+# sparse matrices, neither needs ndex2 or SciPy.
+#
+# Uncompressed .npz members and .npy files are memory-mapped.
+#
+import gzip
+import warnings
+import zipfile
+
+import numpy as np
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+def _delimiter(path):
+    # tab for .tsv, comma for .csv, white space otherwise
+    name = str(path).lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    if name.endswith(".tsv"):
+        return "\t"
+    if name.endswith(".csv"):
+        return ","
+    return None
+
+
+def _is_integer(text):
+    try:
+        int(text)
+    except ValueError:
+        return False
+    return True
+
+
+def _first_row(path, delimiter, columns, skip_rows, comments):
+    #
+    # return the line number and the id columns of the first data row
+    # after skip_rows, or None, None for a file without data. A file
+    # object is rewound.
+    #
+    if isinstance(comments, str):
+        comments = [comments]
+    lines = path if hasattr(path, "read") else (
+        gzip.open(path, "rt") if str(path).lower().endswith(".gz") else open(path))
+    try:
+        for number, line in enumerate(lines):
+            if number < skip_rows:
+                continue
+            if isinstance(line, bytes):
+                line = line.decode()
+            for comment in comments or ():
+                line = line.split(comment)[0]
+            if line.strip():
+                fields = line.strip("\r\n").split(delimiter)
+                try:
+                    return number, [fields[column] for column in columns]
+                except IndexError:
+                    return number, fields
+    finally:
+        if lines is path:
+            path.seek(0)
+        else:
+            lines.close()
+    return None, None
+
+
+def read_edge_list(path, delimiter="auto", columns=(0, 1), skip_rows=0, comments="#",
+                   header="auto"):
+    #
+    # return the n x 2 array of the source and target node ids in
+    # the columns of a delimited text file, gzip compressed if the name
+    # ends with .gz, or of a seekable file object. The ids are integers
+    # when every id is one, strings otherwise. delimiter "auto" goes
+    # by the file extension.
+    #
+    # header True skips the first data row after skip_rows, "auto"
+    # skips it when its ids are not integers and those of the rows
+    # after it are. A header over string ids needs header True.
+    #
+    if delimiter == "auto":
+        delimiter = _delimiter(path)
+    data_rows = skip_rows
+    if header:
+        number, row = _first_row(path, delimiter, columns, skip_rows, comments)
+        if number is not None and (header is True or not all(_is_integer(field) for field in row)):
+            data_rows = number + 1
+    kwargs = dict(delimiter=delimiter, usecols=columns, comments=comments, ndmin=2)
+    try:
+        edges = np.loadtxt(path, dtype=np.int64, skiprows=data_rows, **kwargs)
+    except ValueError:
+        if hasattr(path, "seek"):
+            path.seek(0)
+        if header is not True:
+            # the data rows are not integers either, the first row is data
+            data_rows = skip_rows
+        with warnings.catch_warnings():
+            # NumPy warns about comment lines when it reads strings
+            warnings.simplefilter("ignore", UserWarning)
+            edges = np.loadtxt(path, dtype=str, skiprows=data_rows, **kwargs)
+    if data_rows != skip_rows:
+        logger.info("skipped the header row of the edge list: " + str(row))
+    logger.debug("edge list: " + str(edges.shape))
+    return edges.reshape(-1, 2)
+
+
+def _memmap_member(archive, path, name, mode="r"):
+    #
+    # return a memory map of an uncompressed .npy member
+    # of an .npz file, or None if it is compressed
+    #
+    info = archive.getinfo(name)
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+    with open(path, "rb") as f:
+        # the local file header has the length of the name and the extra field
+        f.seek(info.header_offset + 26)
+        name_length, extra_length = np.frombuffer(f.read(4), dtype="<u2")
+        f.seek(info.header_offset + 30 + int(name_length) + int(extra_length))
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        if dtype.hasobject:
+            return None
+        offset = f.tell()
+    return np.memmap(path, dtype=dtype, mode=mode, offset=offset, shape=shape,
+                     order="F" if fortran_order else "C")
+
+
+def load_npz_arrays(path, keys=None, mode="r"):
+    #
+    # return a dict of the arrays named keys, default all, of an .npz
+    # file, memory-mapped where possible. mode is the np.memmap mode,
+    # "c" gives writable copy-on-write arrays.
+    #
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, np.load(path) as npz:
+        for key in (npz.files if keys is None else keys):
+            array = _memmap_member(archive, path, key + ".npy", mode=mode)
+            arrays[key] = npz[key] if array is None else array
+    return arrays
+
+
+def _sparse_index_edges(arrays):
+    #
+    # return the node count and the row and column indices of the
+    # entries of a matrix saved by scipy.sparse.save_npz
+    #
+    matrix_format = arrays["format"].item()
+    if isinstance(matrix_format, bytes):
+        matrix_format = matrix_format.decode()
+    shape = tuple(int(size) for size in arrays["shape"])
+    if shape[0] != shape[1]:
+        raise ValueError("adjacency matrix is not square: " + str(shape))
+    if matrix_format == "coo":
+        return shape[0], arrays["row"], arrays["col"]
+    if matrix_format in ("csr", "csc"):
+        indptr = np.asarray(arrays["indptr"])
+        outer = np.repeat(np.arange(shape[0], dtype=np.int64), np.diff(indptr))
+        inner = np.asarray(arrays["indices"])
+        if matrix_format == "csr":
+            return shape[0], outer, inner
+        return shape[0], inner, outer
+    raise ValueError("unsupported sparse matrix format: " + matrix_format)
+
+
+def read_npz_edges(path, key=None):
+    #
+    # return the edges of a .npy or .npz file: an n x 2 array of node
+    # ids, or (node count, sources, targets) of index edges for a sparse
+    # adjacency matrix saved by scipy.sparse.save_npz.
+    #
+    # The edge array of an .npz file is the one named key, "edges" or
+    # the only array in the file, a "sources" and a "targets" array are
+    # stacked into one.
+    #
+    if str(path).endswith(".npy"):
+        return np.load(path, mmap_mode="r").reshape(-1, 2)
+    with np.load(path) as npz:
+        keys = list(npz.keys())
+    if key is None and "format" in keys and "shape" in keys:
+        return _sparse_index_edges(load_npz_arrays(path, keys))
+    if key is None and "sources" in keys and "targets" in keys:
+        arrays = load_npz_arrays(path, ["sources", "targets"])
+        return np.column_stack((arrays["sources"], arrays["targets"]))
+    if key is None:
+        if "edges" in keys:
+            key = "edges"
+        elif len(keys) == 1:
+            key = keys[0]
+        else:
+            raise ValueError("no edge array among " + str(keys) + ", name it with key")
+    return load_npz_arrays(path, [key])[key].reshape(-1, 2)
@@ -0,0 +1,182 @@
+#
+# Per-component layout
+#
+# Networks often fall apart into many connected components. Laid out
+# together they share one g_field sized for all the nodes, so each
+# small component pays for the whole board. Here every component gets
+# its own g_field sized for its nodes, the components are laid out in
+# parallel worker processes and the results are packed side by side
+# into one non-overlapping layout.
+#
+import numpy as np
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from cdqforcelayout.qfnetwork import QFCompactNetwork
+from cdqforcelayout.qflayout import QFLayout
+
+
+logger = logging.getLogger(__name__)
+
+
+def connected_components(network):
+    #
+    # return an array with the component label of each node, the
+    # labels are 0..k-1 in the order of the first node of each component
+    #
+    # Edges hook the larger label onto the smaller one and pointer
+    # jumping flattens the label trees, repeated until nothing changes.
+    #
+    n = network.get_nodecount()
+    labels = np.arange(n, dtype=np.int64)
+    sources, targets = network.get_index_edges()
+    while True:
+        source_labels = labels[sources]
+        target_labels = labels[targets]
+        changed = source_labels != target_labels
+        if not changed.any():
+            break
+        np.minimum.at(labels, source_labels[changed], target_labels[changed])
+        np.minimum.at(labels, target_labels[changed], source_labels[changed])
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+    # renumber the roots 0..k-1 in node order
+    roots, first_seen, inverse = np.unique(labels, return_index=True, return_inverse=True)
+    rank = np.empty(len(roots), dtype=np.int64)
+    rank[np.argsort(first_seen, kind="stable")] = np.arange(len(roots))
+    return rank[inverse.reshape(-1)]
+
+
+def split_components(network, labels=None):
+    #
+    # return a list of (node indices, node ids, sources, targets) for
+    # each component, largest component first. The node indices are
+    # those of network, sources and targets number the component's nodes
+    # 0..k-1 in the order of the node indices.
+    #
+    if labels is None:
+        labels = connected_components(network)
+    sizes = np.bincount(labels)
+    members = np.argsort(labels, kind="stable")
+    starts = np.concatenate(([0], np.cumsum(sizes)))
+    local = np.empty(len(labels), dtype=np.int64)
+    local[members] = np.arange(len(labels)) - starts[labels[members]]
+
+    sources, targets = network.get_index_edges()
+    edge_order = np.argsort(labels[sources], kind="stable")
+    edge_starts = np.concatenate(([0], np.cumsum(np.bincount(labels[sources], minlength=len(sizes)))))
+    components = []
+    for label in np.argsort(-sizes, kind="stable").tolist():
+        indices = members[starts[label]:starts[label + 1]]
+        edges = edge_order[edge_starts[label]:edge_starts[label + 1]]
+        components.append((indices, network.node_ids[indices],
+                           local[sources[edges]], local[targets[edges]]))
+    return components
+
+
+def _layout_component(node_ids, sources, targets, do_layout_kwargs, layout_kwargs):
+    #
+    # runs in a worker process, returns the grid positions of
+    # the nodes and the round statistics of the layout
+    #
+    network = QFCompactNetwork.from_index_edges(node_ids, sources, targets)
+    layout = QFLayout(network, **layout_kwargs)
+    layout.do_layout(**do_layout_kwargs)
+    return network.x, network.y, layout.round_stats
+
+
+def pack_rectangles(widths, heights, padding=0):
+    #
+    # shelf packing: return the x and y offsets of rectangles packed
+    # row by row, tallest first, into a strip about as wide as the
+    # square root of their total area
+    #
+    widths = np.asarray(widths) + padding
+    heights = np.asarray(heights) + padding
+    strip = max(int(widths.max()), int(np.ceil(np.sqrt((widths * heights).sum()))))
+    offset_x = np.zeros(len(widths), dtype=np.int64)
+    offset_y = np.zeros(len(widths), dtype=np.int64)
+    shelf_x = shelf_y = shelf_height = 0
+    for index in np.argsort(-heights, kind="stable").tolist():
+        if shelf_x + widths[index] > strip:
+            shelf_y += shelf_height
+            shelf_x = shelf_height = 0
+        offset_x[index] = shelf_x
+        offset_y[index] = shelf_y
+        shelf_x += widths[index]
+        shelf_height = max(shelf_height, heights[index])
+    return offset_x, offset_y
+
+
+class QFComponentLayout:
+    #
+    # processes: the number of worker processes, 1 lays out the
+    #            components in this process
+    # padding: the gap between packed components, in g_field cells
+    # layout_kwargs: passed on to the QFLayout of every component
+    #
+    def __init__(self, qfnetwork, processes=None, padding=5, **layout_kwargs):
+        self.network = qfnetwork
+        self.graph = qfnetwork.to_compact()
+        self.processes = processes
+        self.padding = padding
+        self.layout_kwargs = layout_kwargs
+        self.components = split_components(self.graph)
+        self.round_stats = []
+
+    @classmethod
+    def from_nicecx(cls, nicecx, **kwargs):
+        return cls(QFCompactNetwork.from_nicecx(nicecx), **kwargs)
+
+    @classmethod
+    def from_cx(cls, source, **kwargs):
+        return cls(QFCompactNetwork.from_cx(source), **kwargs)
+
+    def _layout_components(self, do_layout_kwargs):
+        jobs = [(node_ids, sources, targets, do_layout_kwargs, self.layout_kwargs)
+                for indices, node_ids, sources, targets in self.components]
+        if self.processes == 1 or len(jobs) <= 1:
+            return [_layout_component(*job) for job in jobs]
+        with ProcessPoolExecutor(max_workers=self.processes) as executor:
+            # the largest components are submitted first
+            futures = [executor.submit(_layout_component, *job) for job in jobs]
+            return [future.result() for future in futures]
+
+    #
+    # rounds, tolerance, patience: passed on to the layout of each
+    #                              component, see QFLayout.do_layout
+    #
+    # the round statistics of all components, largest first, are left
+    # in self.round_stats, each with the index of its component
+    #
+    def do_layout(self, rounds=1, node_size=40, tolerance=None, patience=3):
+        if not self.components:
+            # a network without nodes has nothing to pack
+            self.round_stats = []
+            return self.graph.get_cx_layout(node_size=node_size)
+        results = self._layout_components(dict(rounds=rounds, tolerance=tolerance, patience=patience))
+        positions = [(x, y) for x, y, round_stats in results]
+        self.round_stats = [dict(stats, component=component)
+                            for component, (x, y, round_stats) in enumerate(results)
+                            for stats in round_stats]
+        # the bounding box of each component
+        min_x = np.array([x.min() for x, y in positions])
+        min_y = np.array([y.min() for x, y in positions])
+        widths = np.array([x.max() for x, y in positions]) - min_x + 1
+        heights = np.array([y.max() for x, y in positions]) - min_y + 1
+        offset_x, offset_y = pack_rectangles(widths, heights, padding=self.padding)
+        for component, (x, y), left, top, dx, dy in zip(self.components, positions, min_x, min_y,
+                                                       offset_x, offset_y):
+            indices = component[0]
+            self.graph.x[indices] = x - left + dx
+            self.graph.y[indices] = y - top + dy
+        if self.network is not self.graph:
+            for node, x, y in zip(self.network.node_dict.values(), self.graph.x.tolist(),
+                                  self.graph.y.tolist()):
+                node["x"] = x
+                node["y"] = y
+        logger.debug(str(len(self.components)) + " components packed")
+        return self.graph.get_cx_layout(node_size=node_size)
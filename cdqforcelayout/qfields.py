@@ -1,9 +1,9 @@
 import numpy as np
-from math import sqrt
+import mmap
+import tempfile
+from collections import OrderedDict
 import logging
 
-from sqlalchemy import between
-
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +13,7 @@ logger = logging.getLogger(__name__)
 # It is neccessary to crop the added field to fit within the target field
 #
 def add_field(source_field, target_field, x, y, remove=False, show_node_dict=False):
+    # runs several times per node move, it builds no log messages
     if show_node_dict: print("node_dict", x,y)
     target_x_max = target_field.shape[0] - 1
     target_y_max = target_field.shape[1] - 1
@@ -25,16 +26,10 @@ def add_field(source_field, target_field, x, y, remove=False, show_node_dict=Fal
     #
     x_offset = int(source_field.shape[0]/2)
     y_offset = int(source_field.shape[1]/2)
-    logger.debug("gb shape " + str(target_field.shape))
-    logger.debug("rf offset " + str(x_offset) + ' ' + str(y_offset))
     target_top_x = x - x_offset
     target_top_y = y - y_offset
     target_bottom_x = x + x_offset
     target_bottom_y = y + y_offset
-    logger.debug('gb target ' + str(target_top_x) +
-                 ' ' + str(target_top_y) + ' ' +
-                 str(target_bottom_x) + ' ' +
-                 str(target_bottom_y))
     source_top_x = 0
     source_top_y = 0
     source_bottom_x = source_x_max
@@ -42,28 +37,20 @@ def add_field(source_field, target_field, x, y, remove=False, show_node_dict=Fal
     #print("rf source", source_top_x,source_top_y,source_bottom_x,source_bottom_y)
     # trim if source_field goes off board negative
     if target_top_x < 0:
-        logger.debug("negative x")
         source_top_x = -target_top_x
         target_top_x = 0        
     if target_top_y < 0:
-        logger.debug("negative y")
         source_top_y = -target_top_y
         target_top_y = 0
     # trim if source_field goes off board positive
     if target_bottom_x > target_x_max:
         dx = target_bottom_x - target_x_max
-        logger.debug("positive x", dx)
         target_bottom_x = target_x_max
         source_bottom_x = source_x_max - dx
     if target_bottom_y > target_y_max:
         dy = target_bottom_y - target_y_max
-        logger.debug("positive y " + str(dy))
         target_bottom_y = target_y_max
         source_bottom_y = source_y_max - dy
-    logger.debug("adj gb target" + ' ' + str(target_top_x) + ' ' +
-                 str(target_top_y) + ' ' +
-                 str(target_bottom_x) + ' ' +
-                 str(target_bottom_y))
     #print("adj rf source", source_top_x,source_top_y,source_bottom_x,source_bottom_y)
     #gameboard[target_top_x, target_top_y] = 1
     #gameboard[target_bottom_x, target_bottom_y] = 1
@@ -74,28 +61,313 @@ def add_field(source_field, target_field, x, y, remove=False, show_node_dict=Fal
         target_field[target_top_x:target_bottom_x+1, target_top_y:target_bottom_y+1] -= source_field[source_top_x:source_bottom_x+1, source_top_y:source_bottom_y+1]
     else:
         target_field[target_top_x:target_bottom_x+1, target_top_y:target_bottom_y+1] += source_field[source_top_x:source_bottom_x+1, source_top_y:source_bottom_y+1]
+    # the window of the target field that was changed
+    return target_top_x, target_bottom_x+1, target_top_y, target_bottom_y+1
 
 # wrapper for readability
 def subtract_field(source_field, target_field, x, y, show_node_dict=False):
-    add_field(source_field, target_field, x, y, remove=True, show_node_dict=show_node_dict)
+    return add_field(source_field, target_field, x, y, remove=True, show_node_dict=show_node_dict)
+
+
+#
+# Windows:
+# A window is the rectangle (top_x, bottom_x, top_y, bottom_y) of a
+# field, the bottom coordinates are exclusive so that
+# field[top_x:bottom_x, top_y:bottom_y] is the window's region
+#
+def field_window(source_field, target_shape, x, y):
+    #
+    # return the window of the target field that add_field touches
+    # when it adds source_field at x, y, or None if the source
+    # field lies entirely off the target field
+    #
+    x_offset = int(source_field.shape[0]/2)
+    y_offset = int(source_field.shape[1]/2)
+    return clip_window((x - x_offset, x + x_offset + 1, y - y_offset, y + y_offset + 1), target_shape)
+
+
+def clip_window(window, shape):
+    top_x, bottom_x, top_y, bottom_y = window
+    top_x = max(top_x, 0)
+    top_y = max(top_y, 0)
+    bottom_x = min(bottom_x, shape[0])
+    bottom_y = min(bottom_y, shape[1])
+    if top_x >= bottom_x or top_y >= bottom_y:
+        return None
+    return top_x, bottom_x, top_y, bottom_y
+
+
+def union_window(window, other):
+    if window is None:
+        return other
+    if other is None:
+        return window
+    return (min(window[0], other[0]), max(window[1], other[1]),
+            min(window[2], other[2]), max(window[3], other[3]))
+
+
+def intersect_window(window, other):
+    if window is None or other is None:
+        return None
+    top_x, top_y = max(window[0], other[0]), max(window[2], other[2])
+    bottom_x, bottom_y = min(window[1], other[1]), min(window[3], other[3])
+    if top_x >= bottom_x or top_y >= bottom_y:
+        return None
+    return top_x, bottom_x, top_y, bottom_y
+
+
+#
+# Fields on disk:
+# A g_field too large for memory is memory-mapped on local disk. Only
+# the windows the layout touches are read, the operating system keeps
+# the recently used pages in its page cache. Operations on the whole
+# field run over tiles of tile x tile cells so that no temporary the
+# size of the field is made.
+#
+FIELD_TILE = 1024
+
+
+def make_field(shape, dtype, directory=None):
+    #
+    # return a zeroed field, in memory or, given a directory, in a
+    # memory-mapped temporary file in the directory. The file has no
+    # name, it is removed when the field is no longer used.
+    #
+    if directory is None:
+        return np.zeros(shape, dtype=dtype)
+    size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    with tempfile.TemporaryFile(dir=directory) as f:
+        # the file grows with zeros, a mapping can't be empty
+        f.truncate(max(size, 1))
+        buffer = mmap.mmap(f.fileno(), max(size, 1))
+    if hasattr(mmap, "MADV_RANDOM"):
+        # windows of the field are read at random, read-ahead
+        # would only push the hot windows out of the page cache
+        buffer.madvise(mmap.MADV_RANDOM)
+    return np.ndarray(shape, dtype=dtype, buffer=buffer)
+
+
+def tile_windows(window, tile=FIELD_TILE):
+    # the windows of the tile x tile tiles covering a window
+    top_x, bottom_x, top_y, bottom_y = window
+    for x in range(top_x, bottom_x, tile):
+        for y in range(top_y, bottom_y, tile):
+            yield x, min(x + tile, bottom_x), y, min(y + tile, bottom_y)
+
+
+def add_attraction_tiled(target_field, x, y, radius, scale, tile=FIELD_TILE):
+    #
+    # add attraction_field(radius, scale) at x, y one tile at a time,
+    # the result is the same as add_field of the kernel, but neither the
+    # kernel nor a temporary the size of the window is made. For the
+    # center attractor of a g_field on disk, whose kernel is larger
+    # than the g_field.
+    #
+    window = clip_window((x - radius, x + radius + 1, y - radius, y + radius + 1), target_field.shape)
+    if window is None:
+        return None
+    energy = int(scale * radius)
+    slope = energy/radius if radius > 0 else 0
+    for top_x, bottom_x, top_y, bottom_y in tile_windows(window, tile):
+        offsets_x = np.abs(np.arange(top_x - x, bottom_x - x, dtype=np.float64))
+        offsets_y = np.abs(np.arange(top_y - y, bottom_y - y, dtype=np.float64))
+        distance = np.sqrt(offsets_x[:, None]**2 + offsets_y[None, :]**2)
+        ef = np.minimum(0, np.trunc((slope * distance) - energy))
+        target_field[top_x:bottom_x, top_y:bottom_y] += ef.astype(target_field.dtype)
+    return window
+
+
+def _fft_size(n):
+    # the smallest size >= n with no prime factor above 5, fast for the FFT
+    size = n
+    while True:
+        rest = size
+        for factor in (2, 3, 5):
+            while rest % factor == 0:
+                rest //= factor
+        if rest == 1:
+            return size
+        size += 1
+
+
+def add_field_at_positions(source_field, target_field, x, y, tile=FIELD_TILE):
+    #
+    # add source_field at every position x, y, the same as add_field
+    # once per position but in bulk: the positions are counted on a
+    # grid that is convolved with the source field by FFT, one tile of
+    # the target field at a time. The sums are integers, rounding the
+    # convolution recovers them exactly. Positions may lie off the
+    # target field, only the part of their field on it is added.
+    #
+    x = np.asarray(x, dtype=np.int64)
+    y = np.asarray(y, dtype=np.int64)
+    offset_x = int(source_field.shape[0]/2)
+    offset_y = int(source_field.shape[1]/2)
+    kernel = source_field.astype(np.float64)
+    for top_x, bottom_x, top_y, bottom_y in tile_windows((0, target_field.shape[0], 0, target_field.shape[1]),
+                                                         tile):
+        # the positions whose field reaches the tile, on a grid
+        # that is the tile grown by the offsets
+        reach = ((x >= top_x - offset_x) & (x < bottom_x + offset_x)
+                 & (y >= top_y - offset_y) & (y < bottom_y + offset_y))
+        if not reach.any():
+            continue
+        grid_shape = (bottom_x - top_x + 2*offset_x, bottom_y - top_y + 2*offset_y)
+        cells = (x[reach] - top_x + offset_x) * grid_shape[1] + (y[reach] - top_y + offset_y)
+        counts = np.bincount(cells, minlength=grid_shape[0] * grid_shape[1]).reshape(grid_shape)
+
+        # the tile is the part of the full convolution starting at twice the offsets
+        shape = (_fft_size(grid_shape[0] + source_field.shape[0] - 1),
+                 _fft_size(grid_shape[1] + source_field.shape[1] - 1))
+        full = np.fft.irfft2(np.fft.rfft2(counts, shape) * np.fft.rfft2(kernel, shape), shape)
+        tile_field = full[2*offset_x:2*offset_x + bottom_x - top_x, 2*offset_y:2*offset_y + bottom_y - top_y]
+        target_field[top_x:bottom_x, top_y:bottom_y] += np.rint(tile_field).astype(np.int64).astype(target_field.dtype)
+
+
+class QFScratchpad:
+    #
+    # A scratchpad that only covers a dirty rectangle of the g_field:
+    # the union of the windows of the fields accumulated on it for
+    # one node move. Clearing it and adding it to or subtracting it
+    # from the g_field only touches that rectangle, so the cost of a
+    # node move scales with its attraction footprints rather than
+    # with the area of the g_field.
+    #
+    # The backing buffer is reused from move to move and only grows.
+    #
+    def __init__(self, dtype):
+        self.dtype = dtype
+        self._buffer = np.zeros(0, dtype=dtype)
+        self.window = None
+        self.field = None
+
+    def reset(self, window):
+        # start a new, zeroed accumulation over the window
+        top_x, bottom_x, top_y, bottom_y = window
+        shape = (bottom_x - top_x, bottom_y - top_y)
+        size = shape[0] * shape[1]
+        if size > self._buffer.size:
+            self._buffer = np.empty(size, dtype=self.dtype)
+        self.field = self._buffer[:size].reshape(shape)
+        self.field[...] = 0
+        self.window = window
+        return self.field
+
+    def region(self, field):
+        # the region of a g_field sized field under the window
+        top_x, bottom_x, top_y, bottom_y = self.window
+        return field[top_x:bottom_x, top_y:bottom_y]
+
+    def add_field(self, source_field, x, y):
+        # x, y are g_field coordinates, fields entirely
+        # outside of the window are skipped
+        x = x - self.window[0]
+        y = y - self.window[2]
+        if field_window(source_field, self.field.shape, x, y) is not None:
+            add_field(source_field, self.field, x, y)
+
+    def add_board_field(self, board_field):
+        # add a g_field sized field, e.g. a bias field
+        self.field += self.region(board_field)
+
+    def add_to(self, target_field):
+        target_region = self.region(target_field)
+        target_region += self.field
+
+    def subtract_from(self, target_field):
+        target_region = self.region(target_field)
+        target_region -= self.field
+
+
+def _block_min(region, factor):
+    #
+    # the minimum of each factor x factor block of the region,
+    # the blocks at the bottom and right edges may be partial
+    #
+    columns = region[:, 0::factor].copy()
+    for j in range(1, factor):
+        part = region[:, j::factor]
+        np.minimum(columns[:, :part.shape[1]], part, out=columns[:, :part.shape[1]])
+    blocks = columns[0::factor].copy()
+    for i in range(1, factor):
+        part = columns[i::factor]
+        np.minimum(blocks[:part.shape[0]], part, out=blocks[:part.shape[0]])
+    return blocks
+
+
+class QFFieldPyramid:
+    #
+    # A pyramid of block-min reductions of a field: each level holds
+    # the minimum of every factor x factor block of the level below,
+    # the first level reduces the field itself. The minimum of the field
+    # is found by descending from the coarsest level, scanning one block
+    # per level, and it has the exact minimum value. Among several cells
+    # with the minimum value it may pick a different one than np.argmin.
+    #
+    # update() must be called with the window of every change to the field.
+    #
+    def __init__(self, field, factor=4, levels=2):
+        self.field = field
+        self.factor = factor
+        self.levels = []
+        # the first level is reduced from bands of the field,
+        # a field on disk is read once and never copied whole
+        band = factor * max(1, FIELD_TILE // factor)
+        source = np.concatenate([_block_min(field[top:top + band], factor)
+                                 for top in range(0, field.shape[0], band)])
+        self.levels.append(source)
+        for level in range(1, levels):
+            source = _block_min(source, factor)
+            self.levels.append(source)
+
+    def update(self, window):
+        top_x, bottom_x, top_y, bottom_y = window
+        source = self.field
+        f = self.factor
+        for level in self.levels:
+            top_x, top_y = top_x // f, top_y // f
+            bottom_x, bottom_y = (bottom_x - 1) // f + 1, (bottom_y - 1) // f + 1
+            level[top_x:bottom_x, top_y:bottom_y] = _block_min(
+                source[top_x * f:bottom_x * f, top_y * f:bottom_y * f], f)
+            source = level
+
+    def argmin(self):
+        # return the coordinates of a minimum of the field
+        top = self.levels[-1]
+        x, y = np.unravel_index(np.argmin(top, axis=None), top.shape)
+        f = self.factor
+        for level in self.levels[-2::-1] + [self.field]:
+            block = level[x * f:(x + 1) * f, y * f:(y + 1) * f]
+            block_x, block_y = np.unravel_index(np.argmin(block, axis=None), block.shape)
+            x, y = x * f + block_x, y * f + block_y
+        return x, y
+
+
+def _distance_grid(radius):
+    #
+    # return the euclidean distance of every cell of
+    # a (2*radius)+1 square field from its center cell
+    #
+    offsets = np.abs(np.arange(-radius, radius + 1, dtype=np.float64))
+    return np.sqrt(offsets[:, None]**2 + offsets[None, :]**2)
 
 
-def attraction_field(radius, scale, dtype):
+def attraction_field(radius, scale, dtype, energy=None):
     #
     # create a QField with array with a
     # linear slope -scale at the center
     #
-    dimension = (2*radius)+1
-    ef = np.zeros((dimension, dimension), dtype=dtype)
-    energy = int(scale * radius)
-    slope = energy/radius
-    for x in range(0, dimension):
-        dx = abs(radius - x)
-        for y in range(0, dimension):
-            dy = abs(radius - y)
-            distance = sqrt(dx**2 + dy**2)
-            ef[x,y] = -1 * energy if distance == 0 else min( 0, int((slope * distance) - energy))
-    return ef
+    # energy, the depth at the center, is int(scale * radius)
+    # unless it is given, scale is then ignored
+    #
+    distance = _distance_grid(radius)
+    if energy is None:
+        energy = int(scale * radius)
+    slope = energy/radius if radius > 0 else 0
+    # int() truncates towards zero, np.trunc does the same for the whole array
+    ef = np.minimum(0, np.trunc((slope * distance) - energy))
+    ef[radius, radius] = -1 * energy
+    return ef.astype(dtype)
 
 def repulsion_field(radius, scale, dtype, center_spike=False):
     #
@@ -107,18 +379,14 @@ def repulsion_field(radius, scale, dtype, center_spike=False):
     # a minima. At the moment, the size of the spike is
     # crudely hardwired at 1000
     #
-    dimension = (2*radius)+1
-    ef = np.zeros((dimension, dimension), dtype=dtype)
+    distance = _distance_grid(radius)
     energy = int(scale * radius)
     center_energy = 1000 if center_spike == True else energy
-    for x in range(0, dimension):
-        dx = abs(radius - x)
-        for y in range(0, dimension):
-            dy = abs(radius - y)
-            distance = sqrt(dx**2 + dy**2)
-            #energy = 1000 if distance == 0 else int(scale * (abs(distance - radius)**2))
-            ef[x,y] = center_energy if distance == 0 else int(energy / distance**2) + int(0.1 * (energy / distance))
-    return ef
+    # the center is overwritten below, avoid dividing by zero there
+    distance[radius, radius] = 1
+    ef = np.trunc(energy / distance**2) + np.trunc(0.1 * (energy / distance))
+    ef[radius, radius] = center_energy
+    return ef.astype(dtype)
 
 def bias_fields(shape, dtype, direction, bias):
     #
@@ -132,39 +400,163 @@ def bias_fields(shape, dtype, direction, bias):
     # that the order aligns with the direction of
     # the edges.
     #
-    sb_field = np.zeros(shape, dtype=dtype)
-    tb_field = np.zeros(shape, dtype=dtype)
-   
+    # The fields only vary along one axis, they are read-only broadcast
+    # views of a single row or column and take no memory the size of
+    # the g_field.
+    #
     if direction == "top" or direction == "bottom":
+        # the slope runs down the rows, every column is the same
         slope = bias / shape[0]
-        # scan over all the rows
-        for y in range(0, shape[1]):
-            # for each row, make a slope between
-            # the value of "bias" and zero,
-            # opposite directions for sb and tb fields
-            for x in range(0, shape[0]):
-                if direction == "top":
-                    sb_field[x, y] = int(bias + (x * -slope))
-                    tb_field[x, y] = int(x * slope)
-                if direction == "bottom":
-                    tb_field[x, y] = int(bias + (x * -slope))
-                    sb_field[x, y] = int(x * slope)
-        
+        steps = np.arange(shape[0], dtype=np.float64)[:, None]
     elif direction == "left" or direction == "right":
+        # the slope runs across the columns, every row is the same
         slope = bias / shape[1]
-        # scan over all the columns
-        for x in range(0, shape[0]):
-            # for each column, make a slope between
-            # the value of "bias" and zero,
-            # opposite directions for sb and tb fields
-            for y in range(0, shape[1]):
-                if direction == "left":
-                    sb_field[x, y] = int(bias + (y * -slope))
-                    tb_field[x, y] = int(y * slope)
-                if direction == "right":
-                    tb_field[x, y] = int(bias + (y * -slope))
-                    sb_field[x, y] = int(y * slope)
-
-    return sb_field, tb_field
+        steps = np.arange(shape[1], dtype=np.float64)[None, :]
+    else:
+        zero = np.broadcast_to(np.zeros(1, dtype=dtype)[:, None], shape)
+        return zero, zero
+
+    # a slope between the value of "bias" and zero,
+    # opposite directions for sb and tb fields
+    falling = np.broadcast_to(np.trunc(bias + (steps * -slope)).astype(dtype), shape)
+    rising = np.broadcast_to(np.trunc(steps * slope).astype(dtype), shape)
+    if direction == "top" or direction == "left":
+        return falling, rising
+    return rising, falling
+
+
+#
+# Attraction by degree:
+# The attraction field a moving node adds at each of its neighbors is
+# a_scale times a multiplier of the node's degree and the weight of
+# the edge. The functions take and return NumPy arrays. The energy of
+# the field, trunc(a_scale * multiplier * a_radius), is the key of its
+# kernel, so nearby multipliers share one.
+#
+def steps_attraction(degree, weight):
+    # 10 for degree 1, 5 below degree 5, 1 otherwise
+    return np.where(degree == 1, 10, np.where(degree < 5, 5, 1)) * weight
+
+
+def inverse_sqrt_attraction(degree, weight):
+    # 10 for degree 1, falling with the square root of the degree
+    return 10 / np.sqrt(np.maximum(degree, 1)) * weight
+
+
+def inverse_attraction(degree, weight):
+    # 10 for degree 1, falling with the degree
+    return 10 / np.maximum(degree, 1) * weight
+
+
+ATTRACTIONS = {"steps": steps_attraction,
+               "inverse_sqrt": inverse_sqrt_attraction,
+               "inverse": inverse_attraction}
+
+
+def attraction_function(attraction):
+    # return the function of a name in ATTRACTIONS or a callable
+    if callable(attraction):
+        return attraction
+    if attraction not in ATTRACTIONS:
+        raise ValueError("unknown attraction: " + str(attraction))
+    return ATTRACTIONS[attraction]
+
+
+def attraction_energies(degree, a_radius, a_scale, attraction=steps_attraction, weight=1.0):
+    # return the energy of the attraction field for each degree and weight
+    scale = a_scale * attraction(np.asarray(degree), weight)
+    return np.trunc(scale * a_radius).astype(np.int64)
+
+
+#
+# Kernel cache
+#
+# Building a kernel is cheap for the small repulsion and
+# attraction fields but the center attractor and the bias
+# fields are the size of the g_field. The cache is process-wide
+# so that repeated QFLayout constructions reuse the kernels.
+#
+# Cached kernels are shared, so they are returned read-only.
+# The cache is bounded by the number of kernels and by their memory,
+# the least recently used kernels are evicted. Attraction and
+# repulsion kernels are keyed by their integer energy, scales that
+# give the same energy share a kernel.
+#
+KERNEL_CACHE_SIZE = 256
+
+KERNEL_CACHE_BYTES = 256 * 2**20
+
+_kernel_cache = OrderedDict()
+
+_kernel_cache_bytes = 0
+
+
+def _kernel_nbytes(kernel):
+    # the memory of a kernel, a broadcast view only holds its base
+    fields = kernel if isinstance(kernel, tuple) else (kernel,)
+    return sum(field.nbytes if field.base is None else field.base.nbytes for field in fields)
+
+
+def _cache_lookup(key, build):
+    global _kernel_cache_bytes
+    kernel = _kernel_cache.get(key)
+    if kernel is not None:
+        _kernel_cache.move_to_end(key)
+        return kernel
+    kernel = build()
+    if isinstance(kernel, tuple):
+        for field in kernel:
+            field.flags.writeable = False
+    else:
+        kernel.flags.writeable = False
+    _kernel_cache[key] = kernel
+    _kernel_cache_bytes += _kernel_nbytes(kernel)
+    # the newest kernel stays even if it is over the memory cap
+    while len(_kernel_cache) > 1 and (len(_kernel_cache) > KERNEL_CACHE_SIZE
+                                      or _kernel_cache_bytes > KERNEL_CACHE_BYTES):
+        evicted_key, evicted = _kernel_cache.popitem(last=False)
+        _kernel_cache_bytes -= _kernel_nbytes(evicted)
+    return kernel
+
+
+def kernel_cache_info():
+    # return the number of cached kernels and their memory in bytes
+    return len(_kernel_cache), _kernel_cache_bytes
+
+
+def get_kernel(kind, radius, scale, dtype, spike=False):
+    #
+    # return a cached, read-only attraction or repulsion field
+    #
+    # kind is "attraction" or "repulsion", spike is the
+    # center_spike flag of the repulsion field
+    #
+    if kind == "attraction":
+        return get_attraction_kernel(radius, int(scale * radius), dtype)
+    elif kind == "repulsion":
+        key = (kind, radius, int(scale * radius), np.dtype(dtype).str, spike)
+        return _cache_lookup(key, lambda: repulsion_field(radius, scale, dtype, center_spike=spike))
+    raise ValueError("unknown kernel kind: " + str(kind))
+
+
+def get_attraction_kernel(radius, energy, dtype):
+    # return the cached, read-only attraction field of an integer energy
+    key = ("attraction", radius, energy, np.dtype(dtype).str, False)
+    return _cache_lookup(key, lambda: attraction_field(radius, None, dtype, energy=energy))
+
+
+def get_bias_fields(shape, dtype, direction, bias):
+    #
+    # return the cached, read-only source and target bias fields
+    #
+    # the key follows get_kernel: the shape stands in
+    # for the radius and the direction for the spike
+    #
+    key = ("bias", tuple(shape), bias, np.dtype(dtype).str, direction)
+    return _cache_lookup(key, lambda: bias_fields(shape, dtype, direction, bias))
 
 
+def clear_kernel_cache():
+    global _kernel_cache_bytes
+    _kernel_cache.clear()
+    _kernel_cache_bytes = 0
@@ -0,0 +1,69 @@
+#
+# Instrumentation of the node moves
+#
+# A QFLayout made with instrument=True counts and times the phases of
+# layout_one_node, with instrument="trace" it also records an event per
+# move. Without it layout_one_node only checks that there is nothing to
+# record, the hot path builds no strings and reads no clock.
+#
+import threading
+from timeit import default_timer as timer
+
+
+# the phases of a node move, in order
+#
+# subtract: remove the node's repulsion and find its neighbors and windows
+# accumulate: add the attractions of the neighbors on the scratchpad
+# bias: add the bias fields of directed flow to the scratchpad
+# argmin: add the scratchpad to the g_field and find the destination,
+#         the minimum of the search window
+# add: add the node's repulsion at the destination and subtract the scratchpad
+#
+PHASES = ("subtract", "accumulate", "bias", "argmin", "add")
+
+
+class QFInstrumentation:
+    #
+    # the number of times each phase ran, the number of fields it
+    # added and its total run time, and with trace the events of the
+    # moves: the node index, its position before and after and the
+    # windows of the scratchpad and the search, None for the whole
+    # g_field. Safe to use from the threads of a parallel layout.
+    #
+    def __init__(self, trace=False):
+        self.moves = 0
+        self.calls = dict((phase, 0) for phase in PHASES)
+        self.fields = dict((phase, 0) for phase in PHASES)
+        self.seconds = dict((phase, 0.0) for phase in PHASES)
+        self.events = [] if trace else None
+        self._lock = threading.Lock()
+
+    def start(self):
+        # the clock at the start of a move
+        return timer()
+
+    def record(self, phase, start, fields=1):
+        # add the time since start to the phase and return the clock
+        now = timer()
+        with self._lock:
+            self.calls[phase] += 1
+            self.fields[phase] += fields
+            self.seconds[phase] += now - start
+        return now
+
+    def record_move(self, index, origin, destination, s_window, search_window):
+        with self._lock:
+            self.moves += 1
+            if self.events is not None:
+                self.events.append({"node": int(index), "from": list(origin), "to": list(destination),
+                                    "s_window": None if s_window is None else list(s_window),
+                                    "search_window": None if search_window is None else list(search_window)})
+
+    def reset(self):
+        self.__init__(trace=self.events is not None)
+
+    def report(self):
+        # return the counters and timers as a dict, e.g. for JSON
+        return {"moves": self.moves,
+                "phases": dict((phase, {"calls": self.calls[phase], "fields": self.fields[phase],
+                                        "seconds": self.seconds[phase]}) for phase in PHASES)}
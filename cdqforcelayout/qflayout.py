@@ -3,10 +3,23 @@
 # and parameters for the algorithm.
 #
 import numpy as np
-from cdqforcelayout import qfnetwork
+import json
+import os
+import random
+import threading
+from itertools import repeat
+from concurrent.futures import ThreadPoolExecutor
+from cdqforcelayout import qfnetwork, qfnumba
+from cdqforcelayout.edgereader import load_npz_arrays
 #import qfnetwork
 from math import sqrt
-from cdqforcelayout.qfields import repulsion_field, attraction_field, add_field, subtract_field, bias_fields
+from timeit import default_timer as timer
+from cdqforcelayout.qfields import get_kernel, get_bias_fields, add_field, subtract_field
+from cdqforcelayout.qfields import QFScratchpad, QFFieldPyramid, field_window, clip_window, union_window, intersect_window
+from cdqforcelayout.qfields import make_field, add_attraction_tiled, tile_windows, add_field_at_positions
+from cdqforcelayout.qfields import get_attraction_kernel, attraction_function, attraction_energies
+from cdqforcelayout.qfprecision import choose_precision, fits
+from cdqforcelayout.qfinstrument import QFInstrumentation
 #from qfields import repulsion_field, attraction_field, add_field, subtract_field
 
 import logging
@@ -14,37 +27,191 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# the format and version of the files written by QFLayout.save
+CHECKPOINT_FORMAT = "cdqforcelayout-checkpoint"
+CHECKPOINT_VERSION = 1
+
+# the parameters that may differ between a saved layout and its
+# continuation, the others shape the g_field or the kernels
+RESUME_PARAMETERS = ("search", "search_margin", "search_radius", "workers", "deterministic",
+                     "field_dir", "attraction", "backend", "instrument")
+
+# the number of attraction kernels a layout holds on to, the
+# others are looked up in the bounded kernel cache of qfields
+ATTRACTION_MEMO_SIZE = 64
+
+
+def converged(round_stats, tolerance, patience):
+    #
+    # return True when the layout has settled after the rounds of
+    # round_stats: the last round moved no node, so it would repeat
+    # itself, or the energy has not improved by more than the fraction
+    # tolerance of the best energy so far for patience rounds in a row
+    #
+    if round_stats[-1]["moved"] == 0:
+        return True
+    best_energy = None
+    stale = 0
+    for stats in round_stats:
+        if best_energy is None or stats["energy"] < best_energy - tolerance * abs(best_energy):
+            best_energy = stats["energy"]
+            stale = 0
+        else:
+            best_energy = min(best_energy, stats["energy"])
+            stale += 1
+    return stale >= patience
+
 
 class QFLayout:
     def __init__(self, qfnetwork, sparsity=30, r_radius=10, 
                         a_radius=10, r_scale=10, a_scale=5, center_attractor_scale=0.01,
-                        initialize_coordinates="spiral", dtype=np.int16, directed_flow="not_enabled", 
-                        directed_flow_bias=0.01):
-        self.integer_type = dtype
+                        initialize_coordinates="spiral", dtype="auto", directed_flow="not_enabled", 
+                        directed_flow_bias=0.01, search="global", search_margin=None, search_radius=None,
+                        workers=1, deterministic=True, seed=None, cx_layout=None, cx_node_size=40,
+                        g_field=None, field_dir=None, attraction="steps", edge_weights=None,
+                        backend="auto", instrument=False):
+        # the parameters that recreate the layout from its g_field and
+        # positions, they are saved by save
+        self.parameters = dict(sparsity=sparsity, r_radius=r_radius, a_radius=a_radius,
+                               r_scale=r_scale, a_scale=a_scale,
+                               center_attractor_scale=center_attractor_scale,
+                               dtype=dtype if dtype == "auto" else np.dtype(dtype).name,
+                               directed_flow=directed_flow,
+                               directed_flow_bias=directed_flow_bias, search=search,
+                               search_margin=search_margin, search_radius=search_radius,
+                               workers=workers, deterministic=deterministic, seed=seed,
+                               field_dir=field_dir,
+                               attraction=attraction if isinstance(attraction, str) else None,
+                               backend=backend, instrument=instrument)
         self.network = qfnetwork
+        # the layout runs on the array backed form of the network,
+        # a QFNetwork is converted and its node_dict positions are
+        # updated from the arrays after each do_layout
+        self.graph = qfnetwork.to_compact()
+
+        # The destination of a node is the minimum of the g_field.
+        # "global" searches the whole g_field, "neighbors" only the bounding
+        # box of the attraction footprints of the node's neighbors plus
+        # search_margin, "radius" only the square of search_radius around
+        # the node's current position. Windowed searches fall back to the
+        # global search when the window is degenerate, e.g. isolated nodes.
+        # "pyramid" searches the whole g_field by descending a pyramid of
+        # block minima of the g_field, see QFFieldPyramid. It finds a cell
+        # with the same value as the global search, ties may be broken
+        # differently.
+        #
+        if search not in ("global", "neighbors", "radius", "pyramid"):
+            raise ValueError("unknown search mode: " + str(search))
+        if search == "radius" and search_radius is None:
+            raise ValueError("search mode radius requires search_radius")
+        self.search = search
+        self.search_margin = r_radius if search_margin is None else search_margin
+        self.search_radius = search_radius
+        self.a_radius = a_radius
+
+        # With workers > 1 the nodes are moved in parallel on a thread pool.
+        # Each round visits the color classes of a graph coloring, so nodes
+        # moved together are never adjacent. Within a class, nodes whose
+        # windows on the g_field overlap are not moved at the same time:
+        # deterministic layouts run the class in batches of non-overlapping
+        # nodes, otherwise nodes start as soon as their window is free,
+        # which is faster but depends on thread timing.
+        # seed makes the random initialization reproducible.
+        #
+        if workers > 1 and search in ("global", "pyramid"):
+            raise ValueError("parallel layout requires a windowed search")
+        self.workers = workers
+        self.deterministic = deterministic
+        self.seed = seed
+
+        # With a field_dir the g_field and its mask are memory-mapped
+        # temporary files in that directory rather than arrays in memory,
+        # for networks whose g_field doesn't fit in memory. Only the windows
+        # a move touches are read, so the search must be windowed or
+        # use the pyramid, a global search reads the whole g_field.
+        #
+        if field_dir is not None and search == "global":
+            raise ValueError("a g_field in field_dir requires a windowed or pyramid search")
+        self.field_dir = field_dir
+
+        # instrument True counts and times the phases of the node moves
+        # in self.instrumentation, "trace" also records every move, see
+        # qfinstrument. The moves then run on the numpy backend.
+        #
+        if instrument not in (False, True, "trace"):
+            raise ValueError("instrument must be False, True or trace")
+        self.instrumentation = QFInstrumentation(trace=instrument == "trace") if instrument else None
+
+        # The attraction field a moving node adds at each neighbor is
+        # a_scale times attraction(degree, weight), a name in
+        # qfields.ATTRACTIONS or a function of NumPy arrays of the node's
+        # degree and the weights of its edges. "steps" is 10 times for
+        # degree 1, 5 times below degree 5. edge_weights, aligned with
+        # the adjacency of the network, default 1, weight the attraction
+        # of each edge, the network can't be edited then. The kernels are
+        # cached by their integer energy, see _a_field.
+        #
+        self._set_attraction(attraction, edge_weights)
+
+        # dtype "auto" picks the narrowest integer type that is safe for
+        # each of the g_field, the scratchpad and the kernels, see
+        # qfprecision. A fixed dtype is used for all three and a warning
+        # is logged when it may overflow. self.precision reports the
+        # types and their bounds.
+        #
+        dimension = (g_field.shape[0] if g_field is not None
+                     else self.board_dimension(self.graph.get_nodecount(), sparsity))
+        stacked = (self.graph.get_nodecount()
+                   if initialize_coordinates == "center" and g_field is None else 1)
+        self._set_precision(dtype, dimension, stacked)
         
         # this is now g_field, the variable names need to be updatated
-        self.gameboard, center = self._make_gameboard(sparsity, center_attractor_scale)
-        self.gameboard_mask = np.zeros(self.gameboard.shape, dtype=self.integer_type)
+        #
+        # A g_field given by load already holds the center attractor and
+        # the repulsions of the nodes at their positions, they are kept.
+        #
+        if g_field is not None:
+            if g_field.ndim != 2 or g_field.shape[0] != g_field.shape[1]:
+                raise ValueError("g_field must be a square array")
+            if dtype != "auto" and g_field.dtype != np.dtype(dtype):
+                raise ValueError("g_field must be a " + np.dtype(dtype).name + " array")
+            self.integer_type = np.promote_types(self.integer_type, g_field.dtype)
+            self.gameboard, center = g_field, int(g_field.shape[0]/2)
+            if field_dir is not None or self.integer_type != g_field.dtype:
+                # move the g_field to disk or widen it
+                self._copy_g_field(self.integer_type)
+        else:
+            self.gameboard, center = self._make_gameboard(sparsity, center_attractor_scale)
+        self.gameboard_mask = make_field(self.gameboard.shape, self.integer_type, field_dir)
 
-        if initialize_coordinates == "center":
+        if g_field is not None:
+            # the nodes are on the g_field already
+            logger.debug("init from g_field")
+        elif initialize_coordinates == "center":
             logger.debug("init at center")
-            self.network.place_nodes_at_center(center)
+            self.graph.place_nodes_at_center(center)
         elif initialize_coordinates == "random":
             logger.debug("init random")
-            self.network.place_nodes_randomly(self.gameboard.shape[0])
+            self.graph.place_nodes_randomly(self.gameboard.shape[0],
+                                            rng=None if seed is None else random.Random(seed))
         elif initialize_coordinates == "spiral":
             logger.debug("init spiral")
-            self.network.place_nodes_in_a_spiral(center)
+            self.graph.place_nodes_in_a_spiral(center)
+        elif initialize_coordinates == "preset":
+            # keep the positions already set on the network,
+            # e.g. by a coarser level of a multilevel layout
+            logger.debug("init preset")
+            np.clip(self.graph.x, 0, self.gameboard.shape[0] - 1, out=self.graph.x)
+            np.clip(self.graph.y, 0, self.gameboard.shape[1] - 1, out=self.graph.y)
+        elif initialize_coordinates == "layout":
+            # start from an existing layout, see _place_from_cx_layout
+            logger.debug("init from layout")
+            self._place_from_cx_layout(self.graph.cx_layout if cx_layout is None else cx_layout,
+                                       cx_node_size, center)
+        else:
+            raise ValueError("unknown initialize_coordinates: " + str(initialize_coordinates))
 
-        self.r_field = repulsion_field(r_radius, r_scale, self.integer_type, center_spike=True)
-        
-        # Three attraction fields are created in order to
-        # scale attraction depending on node degree
-        #
-        self.a_field = attraction_field(a_radius, a_scale, self.integer_type)
-        self.a_field_med = attraction_field(a_radius, a_scale*5, self.integer_type)
-        self.a_field_high = attraction_field(a_radius, a_scale*10, self.integer_type)
+        self._make_kernels(r_radius, a_radius, r_scale, a_scale)
 
         # If we are in directed flow mode, create two gameboard-size fields, the source bias 
         # and the target bias. These will be added to the gameboard to bias the 
@@ -53,22 +220,285 @@ class QFLayout:
         #
         if directed_flow in ("top", "bottom", "left", "right"):
             self.directed_flow_mode = True
-            self.sb_field, self.tb_field = bias_fields(self.gameboard.shape, self.integer_type, directed_flow, directed_flow_bias)
+            self.sb_field, self.tb_field = get_bias_fields(self.gameboard.shape, self.scratchpad_type, directed_flow, directed_flow_bias)
         else:
             self.directed_flow_mode = False
 
-        # make a scratchpad board where we add all the attraction fields
+        # make a scratchpad where we add all the attraction fields
         # and the use it to update the gameboard
-        self.s_field = np.zeros(self.gameboard.shape, self.integer_type)
+        self.scratchpad = QFScratchpad(self.scratchpad_type)
+
+        # the statistics of the rounds of the last do_layout
+        self.round_stats = []
+
+        # the ids of the nodes touched by edits since the last relayout
+        self.affected_nodes = set()
+
+        # the number of rounds run on the layout, in all calls
+        self.rounds_done = 0
 
-        # initialize the repulsion field and the mask
-        for node in self.network.get_sorted_nodes():  
-            add_field(self.r_field, self.gameboard, node["x"], node["y"])
-            self.gameboard_mask[node["x"], node["y"]] = 1
+        # initialize the repulsion field and the mask, the
+        # repulsions of all nodes are added in one convolution
+        if g_field is None:
+            add_field_at_positions(self.r_field, self.gameboard, self.graph.x, self.graph.y)
+        self.gameboard_mask[self.graph.x, self.graph.y] = 1
+        self.pyramid = QFFieldPyramid(self.gameboard) if search == "pyramid" else None
+        self._sync_network()
+
+        # backend "numba" runs the rounds of one worker compiled by
+        # Numba, see qfnumba, the layouts are the same as with "numpy".
+        # "auto" uses Numba when it is installed and supports the layout,
+        # "numba" falls back to NumPy with a warning when it isn't
+        # installed. The parallel layout always moves nodes with NumPy.
+        # The compiled rounds keep a scratchpad the size of the g_field
+        # in memory, so a g_field in field_dir stays with NumPy.
+        #
+        if backend not in ("auto", "numpy", "numba"):
+            raise ValueError("unknown backend: " + str(backend))
+        supported = search != "pyramid" and not self.directed_flow_mode and field_dir is None
+        if backend == "numba" and not supported:
+            raise ValueError("the numba backend supports neither the pyramid search, "
+                             "directed flow nor a g_field in field_dir")
+        if backend == "numba" and not qfnumba.NUMBA_AVAILABLE:
+            logger.warning("numba is not installed, using the numpy backend")
+        self.backend = ("numba" if backend != "numpy" and supported and qfnumba.NUMBA_AVAILABLE
+                        else "numpy")
+        self._scratch_field = None
 
     @classmethod
     def from_nicecx(cls, nicecx, **kwargs):
-        return cls(qfnetwork.QFNetwork.from_nicecx(nicecx), **kwargs)
+        return cls(qfnetwork.QFCompactNetwork.from_nicecx(nicecx), **kwargs)
+
+    #
+    # set the integer types of the g_field, the scratchpad and the
+    # kernels for a g_field of the dimension, see __init__
+    #
+    def _set_precision(self, dtype, dimension, stacked=1):
+        parameters = self.parameters
+        directed = parameters["directed_flow"] in ("top", "bottom", "left", "right")
+        energies, depths = self._attraction_depths()
+        self.precision = choose_precision(self.graph.degree, dimension, parameters["r_radius"],
+                                          parameters["r_scale"], parameters["a_radius"],
+                                          parameters["a_scale"], parameters["center_attractor_scale"],
+                                          parameters["directed_flow_bias"] if directed else None,
+                                          stacked=stacked, depths=depths, energies=energies)
+        if dtype == "auto":
+            self.precision["mode"] = "auto"
+        else:
+            self.precision["mode"] = "fixed"
+            for field in ("g_field", "scratchpad", "kernels"):
+                self.precision[field] = np.dtype(dtype).name
+            if not fits(dtype, *self.precision["g_field_range"]):
+                logger.warning(np.dtype(dtype).name + " may overflow: " + self.precision["reason"])
+        self.integer_type = np.dtype(self.precision["g_field"])
+        self.scratchpad_type = np.dtype(self.precision["scratchpad"])
+        self.kernel_type = np.dtype(self.precision["kernels"])
+        self.precision["safe"] = fits(self.integer_type, *self.precision["g_field_range"])
+        logger.info("precision " + str(self.precision))
+
+    #
+    # copy the g_field to a new one of the integer type,
+    # on disk with a field_dir, one tile at a time
+    #
+    def _copy_g_field(self, dtype):
+        g_field = self.gameboard
+        board = make_field(g_field.shape, dtype, self.field_dir)
+        for top_x, bottom_x, top_y, bottom_y in tile_windows((0, g_field.shape[0], 0, g_field.shape[1])):
+            board[top_x:bottom_x, top_y:bottom_y] = g_field[top_x:bottom_x, top_y:bottom_y]
+        self.gameboard = board
+        if getattr(self, "pyramid", None) is not None:
+            self.pyramid = QFFieldPyramid(board)
+
+    #
+    # widen the integer types after an edit of the network when the
+    # attraction of one of the nodes with the indices may overflow them.
+    # Only for dtype "auto", the types never get narrower.
+    #
+    def _check_precision(self, indices):
+        parameters = self.parameters
+        if parameters["dtype"] != "auto" or len(indices) == 0:
+            return
+        depth = int(self._attraction_depths(indices)[1].max())
+        if depth <= -self.precision["scratchpad_range"][0]:
+            return
+        integer_type, scratchpad_type = self.integer_type, self.scratchpad_type
+        self._set_precision("auto", self.gameboard.shape[0])
+        self.integer_type = np.promote_types(self.integer_type, integer_type)
+        self.scratchpad_type = np.promote_types(self.scratchpad_type, scratchpad_type)
+        if self.integer_type != integer_type:
+            self._copy_g_field(self.integer_type)
+        if self.scratchpad_type != scratchpad_type:
+            self.scratchpad = QFScratchpad(self.scratchpad_type)
+            if self.directed_flow_mode:
+                self.sb_field, self.tb_field = get_bias_fields(self.gameboard.shape, self.scratchpad_type,
+                                                               parameters["directed_flow"],
+                                                               parameters["directed_flow_bias"])
+
+    #
+    # set the attraction function and the edge weights, see __init__
+    #
+    def _set_attraction(self, attraction, edge_weights):
+        self.attraction = attraction_function(attraction)
+        self.edge_weights = None
+        if edge_weights is not None:
+            edge_weights = np.asarray(edge_weights, dtype=np.float64)
+            if edge_weights.shape != self.graph.adj_indices.shape:
+                raise ValueError("edge_weights must have one weight per adjacency entry, "
+                                 + str(len(self.graph.adj_indices)))
+            self.edge_weights = edge_weights
+        # the energies of the nodes' a_fields by degree, and of each
+        # adjacency entry with edge_weights
+        self._degree_energies = {}
+        self._entry_energies = None
+
+    #
+    # return the attraction energies, of each node or with edge_weights
+    # of each adjacency entry, and the depth of each node's attraction:
+    # the sum of the energies it adds to the scratchpad. Without
+    # edge_weights only of the nodes with the indices, default all.
+    #
+    def _attraction_depths(self, indices=None):
+        graph = self.graph
+        a_radius, a_scale = self.parameters["a_radius"], self.parameters["a_scale"]
+        if self.edge_weights is None:
+            degree = graph.degree if indices is None else graph.degree[indices]
+            energies = attraction_energies(degree, a_radius, a_scale, self.attraction)
+            return energies, degree.astype(np.int64) * energies
+        rows = np.repeat(np.arange(graph.get_nodecount()), graph.degree)
+        if self._entry_energies is None:
+            self._entry_energies = attraction_energies(graph.degree[rows], a_radius, a_scale,
+                                                       self.attraction, self.edge_weights)
+        depths = np.bincount(rows, weights=self._entry_energies, minlength=graph.get_nodecount())
+        return self._entry_energies, depths.astype(np.int64)
+
+    def _make_kernels(self, r_radius, a_radius, r_scale, a_scale):
+        # the kernels come from the process-wide kernel cache
+        # and are shared between layouts, they are read-only
+        self.r_field = get_kernel("repulsion", r_radius, r_scale, self.kernel_type, spike=True)
+        
+        # Three attraction fields are created in order to
+        # scale attraction depending on node degree
+        #
+        self.a_field = get_kernel("attraction", a_radius, a_scale, self.kernel_type)
+        self.a_field_med = get_kernel("attraction", a_radius, a_scale*5, self.kernel_type)
+        self.a_field_high = get_kernel("attraction", a_radius, a_scale*10, self.kernel_type)
+
+        # the a_fields by energy, held by the layout so that a move
+        # doesn't go to the kernel cache. At most ATTRACTION_MEMO_SIZE
+        # of them, e.g. one per degree, so that the layout doesn't undo
+        # the bounds of the kernel cache with many distinct energies.
+        self.a_scale = a_scale
+        self._a_fields = {}
+
+    #
+    # return the attraction field of the energy
+    #
+    def _a_field(self, energy):
+        a_field = self._a_fields.get(energy)
+        if a_field is None:
+            a_field = get_attraction_kernel(self.a_radius, energy, self.kernel_type)
+            if len(self._a_fields) < ATTRACTION_MEMO_SIZE:
+                self._a_fields[energy] = a_field
+        return a_field
+
+    @classmethod
+    def from_cx(cls, source, **kwargs):
+        return cls(qfnetwork.QFCompactNetwork.from_cx(source), **kwargs)
+
+    #
+    # the size of the g_field for a network of nodecount nodes
+    #
+    @staticmethod
+    def board_dimension(nodecount, sparsity):
+        radius = round(sqrt(nodecount * sparsity))
+        return (2*radius)+1
+
+    #
+    # place the nodes at the positions of a cartesianLayout aspect,
+    # a list of {"node", "x", "y"} dicts or an m x 3 array of node id,
+    # x and y, by inverting the scaling of get_cx_layout with node_size.
+    # A layout that doesn't fit on the g_field, e.g. from Cytoscape, is
+    # scaled down to fit and centered. Nodes without a position start at
+    # the mean position of their placed neighbors, or at the center.
+    # Nodes on the same cell are moved to the nearest free cells.
+    #
+    def _place_from_cx_layout(self, cx_layout, node_size, center):
+        if cx_layout is None:
+            raise ValueError("initialize_coordinates layout requires a cartesianLayout")
+        if not isinstance(cx_layout, np.ndarray):
+            cx_layout = np.array([(entry["node"], entry["x"], entry["y"]) for entry in cx_layout],
+                                 dtype=np.float64).reshape(-1, 3)
+        graph = self.graph
+        dimension = self.gameboard.shape[0]
+        n = graph.get_nodecount()
+        target_x = np.full(n, float(center))
+        target_y = np.full(n, float(center))
+        placed = np.zeros(n, dtype=bool)
+        node_index = graph.node_index
+        rows = [row for row, node_id in enumerate(cx_layout[:, 0].astype(np.int64).tolist())
+                if node_id in node_index]
+        indices = np.array([node_index[node_id] for node_id in cx_layout[rows, 0].astype(np.int64).tolist()],
+                           dtype=np.int64)
+        # the x of the g_field is the y of the cartesianLayout
+        target_x[indices] = cx_layout[rows, 2] / node_size
+        target_y[indices] = cx_layout[rows, 1] / node_size
+        placed[indices] = True
+
+        if placed.any():
+            low = min(target_x[placed].min(), target_y[placed].min())
+            high = max(target_x[placed].max(), target_y[placed].max())
+            if low < 0 or high > dimension - 1:
+                middle_x = (target_x[placed].min() + target_x[placed].max()) / 2
+                middle_y = (target_y[placed].min() + target_y[placed].max()) / 2
+                span = max(np.ptp(target_x[placed]), np.ptp(target_y[placed]))
+                scale = min(1.0, (dimension - 1) / span) if span > 0 else 1.0
+                target_x[placed] = center + (target_x[placed] - middle_x) * scale
+                target_y[placed] = center + (target_y[placed] - middle_y) * scale
+
+        # spread the positions to the nodes without one, hop by hop
+        missing = np.flatnonzero(~placed).tolist()
+        while len(missing) > 0:
+            found = []
+            for index in missing:
+                neighbors = graph.adjacent(index)
+                neighbors = neighbors[placed[neighbors]]
+                if len(neighbors) > 0:
+                    found.append((index, target_x[neighbors].mean(), target_y[neighbors].mean()))
+            if len(found) == 0:
+                break
+            for index, x, y in found:
+                target_x[index] = x
+                target_y[index] = y
+                placed[index] = True
+            missing = np.flatnonzero(~placed).tolist()
+        logger.debug(str(len(indices)) + " nodes placed from the layout")
+        graph.place_nodes_near(np.rint(target_x).astype(np.int64), np.rint(target_y).astype(np.int64),
+                               dimension)
+
+    #
+    # recompute the g_field from the node positions: the center
+    # attractor plus the repulsion of every node, one tile at a time,
+    # and return the number of cells that differed. The moves keep the
+    # g_field exact, cells differ only after an integer overflow or a
+    # change of the g_field outside of the layout.
+    #
+    def rebuild_g_field(self):
+        board = self.gameboard
+        center = int(board.shape[0]/2)
+        center_attractor_radius = int(sqrt(2 * center**2))
+        changed = 0
+        for top_x, bottom_x, top_y, bottom_y in tile_windows((0, board.shape[0], 0, board.shape[1])):
+            region = np.zeros((bottom_x - top_x, bottom_y - top_y), dtype=board.dtype)
+            add_attraction_tiled(region, center - top_x, center - top_y, center_attractor_radius,
+                                 self.parameters["center_attractor_scale"])
+            add_field_at_positions(self.r_field, region, self.graph.x.astype(np.int64) - top_x,
+                                   self.graph.y.astype(np.int64) - top_y)
+            changed += int(np.count_nonzero(region != board[top_x:bottom_x, top_y:bottom_y]))
+            board[top_x:bottom_x, top_y:bottom_y] = region
+        if changed > 0 and self.pyramid is not None:
+            self.pyramid = QFFieldPyramid(board)
+        logger.debug("rebuilt g_field, " + str(changed) + " cells changed")
+        return changed
 
     #
     # return the g_field for the QFLayout
@@ -76,87 +506,586 @@ class QFLayout:
     # This still uses the old name "gameboard" at the moment
     # 
     def _make_gameboard(self, sparsity, center_attractor_scale):
-        radius = round(sqrt(self.network.get_nodecount() * sparsity))
-        dimension = (2*radius)+1
-        board = np.zeros((dimension, dimension), dtype=self.integer_type)
+        dimension = self.board_dimension(self.graph.get_nodecount(), sparsity)
+        board = make_field((dimension, dimension), self.integer_type, self.field_dir)
         # nodes are pulled towards the center of the gameboard
         # by giving the gameboard an attraction field at its center
         # the radius of the field is the distance from the center to the corners
         center = int(board.shape[0]/2)
         center_attractor_radius = int(sqrt(2 * center**2))
-        add_field(attraction_field(center_attractor_radius, center_attractor_scale, self.integer_type),
-              board,
-              center, center)
+        if self.field_dir is not None:
+            # the kernel would be twice the size of the g_field
+            add_attraction_tiled(board, center, center, center_attractor_radius, center_attractor_scale)
+        else:
+            add_field(get_kernel("attraction", center_attractor_radius, center_attractor_scale, self.kernel_type),
+                  board,
+                  center, center)
         return board, center
 
-    # update the position of one node
-    def layout_one_node(self, node):
+    # update the position of one node, given by its index in self.graph
+    def layout_one_node(self, index, scratchpad=None):
+        graph = self.graph
+        if scratchpad is None:
+            scratchpad = self.scratchpad
+        instrumentation = self.instrumentation
+        if instrumentation is not None:
+            start = instrumentation.start()
+        node_x = int(graph.x[index])
+        node_y = int(graph.y[index])
         # remove the node from the gameboard by subtracting it at its current location
         # also set that location of the gameboard_mask to zero
-        subtract_field(self.r_field, self.gameboard, node['x'], node['y'])
+        r_window = subtract_field(self.r_field, self.gameboard, node_x, node_y)
         #self.gameboard[node['x'], node['y']] = 32768 # 
         #self.gameboard_mask[node['x'], node["y"]] = 0
 
-        # clear the scratchpad
-        self.s_field[...]=0
-        # add the attractions to the scratchpad
-        degree = node["degree"]   
-        for adj_node_id in node['adj']:
-            # add an a_field to the scratchpad field
-            # at the position of the adjacent node
-            # lower degree nodes have higher attractions
-            adj_node = self.network.node_dict[adj_node_id]
-            if degree == 1:
-                add_field(self.a_field_high, self.s_field, adj_node["x"], adj_node["y"])
-            elif degree < 5:
-                add_field(self.a_field_med, self.s_field, adj_node["x"], adj_node["y"])
-            else:
-                add_field(self.a_field, self.s_field, adj_node["x"], adj_node["y"])
+        a_fields, adj_x, adj_y, bias_fields, search_window = self._prepare_move(index, node_x, node_y)
 
-        # check if we are in directed_flow mode
-        if self.directed_flow_mode is True and degree != 0:
-            # if the out_degree of the node is zero, add the tb_field
-            # (the node is only a target, bias its placement to the target side)
-            if node["out_degree"] == 0:
-                self.s_field += self.tb_field
-            # if the in_degree of the node is zero and there is a sb_field
-            # (the node is only a source, bias its placement to the source side)
-            if node["in_degree"] == 0:
-                self.s_field += self.sb_field
-
-        # add s_field to the gameboard
-        self.gameboard += self.s_field     
+        # the scratchpad only covers the union of the windows of the
+        # a_fields added to it. Bias fields cover the whole g_field.
+        # Outside of the search window nothing needs to be added at all.
+        if len(bias_fields) > 0:
+            s_window = (0, self.gameboard.shape[0], 0, self.gameboard.shape[1])
+        elif len(adj_x) > 0:
+            offset = self.a_radius
+            s_window = clip_window((int(adj_x.min()) - offset, int(adj_x.max()) + offset + 1,
+                                    int(adj_y.min()) - offset, int(adj_y.max()) + offset + 1),
+                                   self.gameboard.shape)
+        else:
+            s_window = None
+        if search_window is not None:
+            s_window = intersect_window(s_window, search_window)
+        if instrumentation is not None:
+            start = instrumentation.record("subtract", start)
+
+        if s_window is not None:
+            # clear the scratchpad and add the attractions to it:
+            # an a_field at the position of each adjacent node
+            scratchpad.reset(s_window)
+            for a_field, x, y in zip(a_fields, adj_x.tolist(), adj_y.tolist()):
+                scratchpad.add_field(a_field, x, y)
+        if instrumentation is not None:
+            start = instrumentation.record("accumulate", start, 0 if s_window is None else len(adj_x))
+
+        if s_window is not None:
+            for bias_field in bias_fields:
+                scratchpad.add_board_field(bias_field)
+        if instrumentation is not None:
+            start = instrumentation.record("bias", start, 0 if s_window is None else len(bias_fields))
+
+        if s_window is not None:
+            # add s_field to the gameboard
+            scratchpad.add_to(self.gameboard)
+        if self.pyramid is not None:
+            self.pyramid.update(union_window(r_window, s_window))
         
         # place the node at a mimima in the gameboard
-        # argmin returns the index of the first location containing
-        # the minimum value in a flattened version of the array
-        # unravel_index turns the index back into the coordinates
-        #
-        destination = np.unravel_index(np.argmin(self.gameboard, axis=None), self.s_field.shape)
-        node["x"] = destination[0]
-        node["y"] = destination[1]            
+        destination_x, destination_y = self._find_minimum(search_window)
+        graph.x[index] = destination_x
+        graph.y[index] = destination_y
+        if instrumentation is not None:
+            start = instrumentation.record("argmin", start)
 
         # add the node's repulsion field at the destination 
-        add_field(self.r_field, self.gameboard, destination[0], destination[1])
+        r_window = add_field(self.r_field, self.gameboard, destination_x, destination_y)
 
         # subtract the s_field, leaving the gameboard with only the repulsion fields
-        self.gameboard -= self.s_field
+        if s_window is not None:
+            scratchpad.subtract_from(self.gameboard)
+        if self.pyramid is not None:
+            self.pyramid.update(union_window(r_window, s_window))
+        if instrumentation is not None:
+            instrumentation.record("add", start)
+            instrumentation.record_move(index, (node_x, node_y), (int(destination_x), int(destination_y)),
+                                        s_window, search_window)
 
+    #
+    # move the nodes of node_list in that order with the backend
+    #
+    def _layout_nodes(self, node_list):
+        if self.backend == "numba" and self.instrumentation is None:
+            self._layout_nodes_compiled(node_list)
+            return
+        for index in node_list:
+            self.layout_one_node(index)
 
-    def do_layout(self, rounds=1, node_size=40):
-        node_list = self.network.get_sorted_nodes()
-              
-        # perform the rounds of layout
-        # start = timer()
+    #
+    # move the nodes with qfnumba.layout_nodes, plain Python
+    # when Numba is not installed
+    #
+    def _layout_nodes_compiled(self, node_list):
+        graph = self.graph
+        board = np.asarray(self.gameboard)
+        if (self._scratch_field is None or self._scratch_field.shape != board.shape
+                or self._scratch_field.dtype != self.scratchpad_type):
+            self._scratch_field = np.zeros(board.shape, dtype=self.scratchpad_type)
+        # the kernel of each adjacency entry
+        energies = self._attraction_depths()[0]
+        if self.edge_weights is None:
+            energies = np.repeat(energies, graph.degree)
+        kernel_energies, entry_kernel = np.unique(energies, return_inverse=True)
+        kernels = np.stack([self._a_field(int(energy)) for energy in kernel_energies.tolist()]
+                           or [self.a_field])
+        search = {"neighbors": qfnumba.SEARCH_NEIGHBORS,
+                  "radius": qfnumba.SEARCH_RADIUS}.get(self.search, qfnumba.SEARCH_GLOBAL)
+        qfnumba.layout_nodes(board, self._scratch_field, np.asarray(self.r_field), kernels,
+                             entry_kernel.astype(np.int64), graph.adj_indptr, graph.adj_indices,
+                             np.asarray(graph.x), np.asarray(graph.y), np.asarray(node_list, dtype=np.int64),
+                             search, self.a_radius + self.search_margin, self.search_radius or 0)
+
+    #
+    # return what moving a node depends on: the attraction fields for
+    # its degree, one per neighbor, the positions of its neighbors, the
+    # bias fields that apply to it and its search window
+    #
+    def _prepare_move(self, index, node_x, node_y):
+        graph = self.graph
+        # pick the attraction field for the node's degree,
+        # lower degree nodes have higher attractions
+        degree = int(graph.degree[index])
+        if self.edge_weights is None:
+            energy = self._degree_energies.get(degree)
+            if energy is None:
+                energy = int(attraction_energies(degree, self.a_radius, self.a_scale, self.attraction))
+                self._degree_energies[degree] = energy
+            a_fields = repeat(self._a_field(energy))
+        else:
+            if self._entry_energies is None:
+                self._attraction_depths()
+            start, end = graph.adj_indptr[index], graph.adj_indptr[index + 1]
+            a_fields = [self._a_field(energy) for energy in self._entry_energies[start:end].tolist()]
+        adjacent = graph.adjacent(index)
+        adj_x = graph.x[adjacent]
+        adj_y = graph.y[adjacent]
+
+        # check if we are in directed_flow mode
+        # if the out_degree of the node is zero, add the tb_field
+        # (the node is only a target, bias its placement to the target side)
+        # if the in_degree of the node is zero and there is a sb_field
+        # (the node is only a source, bias its placement to the source side)
+        bias_fields = []
+        if self.directed_flow_mode is True and degree != 0:
+            if graph.out_degree[index] == 0:
+                bias_fields.append(self.tb_field)
+            if graph.in_degree[index] == 0:
+                bias_fields.append(self.sb_field)
+
+        # the scratchpad only covers the union of the windows of the
+        # a_fields added to it. Bias fields cover the whole g_field.
+        # Outside of the search window nothing needs to be added at all.
+        search_window = self._search_window(node_x, node_y, adj_x, adj_y)
+        return a_fields, adj_x, adj_y, bias_fields, search_window
+
+    #
+    # return the (top_x, bottom_x, top_y, bottom_y) window, bottom exclusive,
+    # in which to search for the destination of the node at node_x, node_y
+    # with neighbors at adj_x, adj_y, or None for a search of the whole g_field
+    #
+    def _search_window(self, node_x, node_y, adj_x, adj_y):
+        if self.search == "neighbors":
+            if len(adj_x) == 0:
+                return None
+            reach = self.a_radius + self.search_margin
+            window = (int(adj_x.min()) - reach, int(adj_x.max()) + reach + 1,
+                      int(adj_y.min()) - reach, int(adj_y.max()) + reach + 1)
+        elif self.search == "radius":
+            window = (node_x - self.search_radius, node_x + self.search_radius + 1,
+                      node_y - self.search_radius, node_y + self.search_radius + 1)
+        else:
+            return None
+        return clip_window(window, self.gameboard.shape)
+
+    #
+    # return the coordinates of the minimum of the g_field
+    # within the window
+    #
+    # argmin returns the index of the first location containing
+    # the minimum value in a flattened version of the array
+    # unravel_index turns the index back into the coordinates
+    #
+    def _find_minimum(self, window=None):
+        if window is None and self.pyramid is not None:
+            return self.pyramid.argmin()
+        if window is None:
+            return np.unravel_index(np.argmin(self.gameboard, axis=None), self.gameboard.shape)
+        top_x, bottom_x, top_y, bottom_y = window
+        region = self.gameboard[top_x:bottom_x, top_y:bottom_y]
+        x, y = np.unravel_index(np.argmin(region, axis=None), region.shape)
+        return top_x + x, top_y + y
+
+    #
+    # copy the positions back to the node dicts when
+    # the layout was given a QFNetwork
+    #
+    def _sync_network(self):
+        if self.network is self.graph:
+            return
+        for node, x, y in zip(self.network.node_dict.values(), self.graph.x.tolist(), self.graph.y.tolist()):
+            node["x"] = x
+            node["y"] = y
+
+    #
+    # return the window of the g_field that moving the node reads or
+    # writes: its repulsion field at the current position and the search
+    # window grown by the repulsion radius. None means the whole g_field.
+    #
+    def _touched_window(self, index):
+        node_x = int(self.graph.x[index])
+        node_y = int(self.graph.y[index])
+        search_window = self._prepare_move(index, node_x, node_y)[4]
+        if search_window is None:
+            return None
+        offset = int(self.r_field.shape[0]/2)
+        top_x, bottom_x, top_y, bottom_y = search_window
+        grown = clip_window((top_x - offset, bottom_x + offset, top_y - offset, bottom_y + offset),
+                            self.gameboard.shape)
+        return union_window(grown, field_window(self.r_field, self.gameboard.shape, node_x, node_y))
+
+    #
+    # a scratchpad for each thread of the parallel layout
+    #
+    def _thread_scratchpad(self):
+        scratchpad = getattr(self._thread_data, "scratchpad", None)
+        if scratchpad is None:
+            scratchpad = QFScratchpad(self.scratchpad_type)
+            self._thread_data.scratchpad = scratchpad
+        return scratchpad
+
+    def _layout_nodes_threaded(self, indices):
+        scratchpad = self._thread_scratchpad()
+        for index in indices:
+            self.layout_one_node(index, scratchpad=scratchpad)
+
+    #
+    # split a color class into batches of nodes whose touched windows
+    # don't overlap, first fit: each node joins the oldest open batch it
+    # doesn't overlap. Overlap is checked on a grid of tiles in which
+    # bit b of a tile is set when the tile is used by open batch b, so
+    # a node costs one reduction over its tiles. At most 64 batches are
+    # open, a batch closes when it is full or to make room for a new one.
+    # A node that needs the whole g_field is a batch of its own.
+    # The batches don't depend on the number of workers.
+    #
+    def _spatial_batches(self, indices, tile=8, batch_size=256):
+        tiles_shape = (-(-self.gameboard.shape[0] // tile), -(-self.gameboard.shape[1] // tile))
+        occupied = np.zeros(tiles_shape, dtype=np.uint64)
+        batches = []
+        open_batches = {}
+        for index in indices:
+            window = self._touched_window(index)
+            if window is None:
+                batches.append([index])
+                continue
+            tiles = occupied[window[0] // tile:(window[1] - 1) // tile + 1,
+                             window[2] // tile:(window[3] - 1) // tile + 1]
+            used = int(np.bitwise_or.reduce(tiles, axis=None))
+            free = [slot for slot in sorted(open_batches, key=lambda slot: open_batches[slot][0])
+                    if not used & (1 << slot)]
+            if len(free) > 0:
+                slot = free[0]
+            else:
+                if len(open_batches) == 64:
+                    oldest = min(open_batches, key=lambda slot: open_batches[slot][0])
+                    self._close_batch(occupied, open_batches, oldest)
+                slot = min(set(range(64)) - set(open_batches))
+                batches.append([])
+                open_batches[slot] = (len(batches) - 1, batches[-1])
+            tiles |= np.uint64(1 << slot)
+            batch = open_batches[slot][1]
+            batch.append(index)
+            if len(batch) >= batch_size:
+                self._close_batch(occupied, open_batches, slot)
+        return batches
+
+    @staticmethod
+    def _close_batch(occupied, open_batches, slot):
+        occupied &= ~np.uint64(1 << slot)
+        del open_batches[slot]
+
+    #
+    # move the nodes of a color class as soon as their windows are free,
+    # the order in which overlapping nodes move depends on thread timing
+    #
+    def _layout_class_unordered(self, indices, executor):
+        board = (0, self.gameboard.shape[0], 0, self.gameboard.shape[1])
+        windows = dict((index, self._touched_window(index) or board) for index in indices)
+        busy = []
+        condition = threading.Condition()
+
+        def move(index):
+            window = windows[index]
+            with condition:
+                while any(intersect_window(window, other) is not None for other in busy):
+                    condition.wait()
+                busy.append(window)
+            try:
+                self.layout_one_node(index, scratchpad=self._thread_scratchpad())
+            finally:
+                with condition:
+                    busy.remove(window)
+                    condition.notify_all()
+
+        for future in [executor.submit(move, index) for index in indices]:
+            future.result()
+
+    def _layout_round_parallel(self, color_classes, executor):
+        for indices in color_classes:
+            if not self.deterministic:
+                self._layout_class_unordered(indices, executor)
+                continue
+            for batch in self._spatial_batches(indices):
+                if len(batch) == 1:
+                    self.layout_one_node(batch[0])
+                    continue
+                # one chunk of the batch per worker
+                chunks = [batch[start::self.workers] for start in range(min(self.workers, len(batch)))]
+                for future in [executor.submit(self._layout_nodes_threaded, chunk) for chunk in chunks]:
+                    future.result()
+
+    def _color_classes(self, node_list):
+        # the nodes of each color, in the order of node_list
+        colors = self.graph.greedy_coloring(node_list)
+        color_classes = [[] for color in range(int(colors.max()) + 1 if len(colors) > 0 else 0)]
+        for index in node_list:
+            color_classes[colors[index]].append(index)
+        return color_classes
+
+    #
+    # return the statistics of round n given the positions
+    # of the nodes at the start of the round: the number of nodes
+    # that moved, their total displacement in g_field cells and the
+    # energy, the sum of the g_field at the nodes' positions without
+    # the nodes' own repulsion. _layout_rounds adds the run time.
+    #
+    def _round_statistics(self, n, start_x, start_y):
+        graph = self.graph
+        dx = graph.x.astype(np.int64) - start_x
+        dy = graph.y.astype(np.int64) - start_y
+        center = self.r_field.shape[0] // 2
+        energy = (self.gameboard[graph.x, graph.y].astype(np.int64).sum()
+                  - graph.get_nodecount() * int(self.r_field[center, center]))
+        return {"round": n,
+                "moved": int(np.count_nonzero(dx | dy)),
+                "displacement": float(np.hypot(dx, dy).sum()),
+                "energy": int(energy)}
+
+    #
+    # run layout_round up to rounds times, recording the statistics of
+    # each round and stopping early once the layout has settled. With a
+    # checkpoint path the layout is saved every checkpoint_every rounds,
+    # with rebuild_every the g_field is rebuilt every rebuild_every rounds.
+    #
+    def _layout_rounds(self, layout_round, rounds, tolerance, patience,
+                       checkpoint=None, checkpoint_every=1, rebuild_every=None):
         for n in range(0, rounds):
             logger.debug('round ' + str(n))
-            for node in node_list:
-                #degree = node.get("degree")
-                # only layout the degree 1 nodes on the last
-                # round
-                #if degree > 1 or n >= (rounds-1):
-                self.layout_one_node(node)
-
-        # end = timer()
-        # print("layout time = ", end - start)
-        return self.network.get_cx_layout(node_size=node_size)
\ No newline at end of file
+            start_x = self.graph.x.astype(np.int64)
+            start_y = self.graph.y.astype(np.int64)
+            start = timer()
+            layout_round()
+            stats = self._round_statistics(n, start_x, start_y)
+            stats["seconds"] = timer() - start
+            self.round_stats.append(stats)
+            self.rounds_done += 1
+            logger.debug(str(stats))
+            if rebuild_every is not None and self.rounds_done % rebuild_every == 0:
+                stats["rebuilt_cells"] = self.rebuild_g_field()
+            if checkpoint is not None and self.rounds_done % checkpoint_every == 0:
+                self.save(checkpoint)
+            if tolerance is not None and converged(self.round_stats, tolerance, patience):
+                logger.debug('converged after round ' + str(n))
+                break
+
+    #
+    # rounds: the maximum number of rounds
+    # tolerance: stop early when the energy has not improved by more than
+    #            the fraction tolerance of the best energy so far for
+    #            patience rounds in a row, or when a round moves no node.
+    #            None always runs all rounds
+    #
+    # Nodes keep trading places long after the layout has settled, so the
+    # energy rather than the displacement decides when to stop. The
+    # statistics of each round are left in self.round_stats.
+    #
+    # checkpoint: save the layout to this path every checkpoint_every
+    #             rounds and at the end, see save
+    # rebuild_every: rebuild the g_field from the node positions every
+    #             rebuild_every rounds, see rebuild_g_field. None never
+    #             rebuilds it
+    #
+    def do_layout(self, rounds=1, node_size=40, tolerance=None, patience=3,
+                  checkpoint=None, checkpoint_every=1, rebuild_every=None):
+        node_list = self.graph.get_sorted_indices().tolist()
+        self.round_stats = []
+
+        # perform the rounds of layout
+        if self.workers > 1:
+            color_classes = self._color_classes(node_list)
+            # the thread scratchpads only live for this call
+            self._thread_data = threading.local()
+            try:
+                with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                    self._layout_rounds(lambda: self._layout_round_parallel(color_classes, executor),
+                                        rounds, tolerance, patience, checkpoint, checkpoint_every,
+                                        rebuild_every)
+            finally:
+                del self._thread_data
+        else:
+            self._layout_rounds(lambda: self._layout_nodes(node_list), rounds, tolerance, patience,
+                                checkpoint, checkpoint_every, rebuild_every)
+
+        if checkpoint is not None and self.rounds_done % checkpoint_every != 0:
+            self.save(checkpoint)
+        self._sync_network()
+        return self.graph.get_cx_layout(node_size=node_size)
+
+    #
+    # Checkpoints
+    #
+    # save writes the complete state of the layout, the g_field, the
+    # network with the node positions, the parameters, the number of
+    # rounds done, the statistics of the last rounds and the affected
+    # nodes, to an uncompressed .npz file. The kernels are not saved,
+    # they follow from the parameters. load memory-maps the arrays
+    # copy-on-write, so a layout resumes without reading or recomputing
+    # the g_field up front and the file is never changed by the layout.
+    #
+    # The file is written next to path and then renamed, a crash while
+    # saving leaves the previous checkpoint intact.
+    #
+    def save(self, path):
+        graph = self.graph
+        state = {"format": CHECKPOINT_FORMAT, "version": CHECKPOINT_VERSION,
+                 "name": graph.name, "parameters": self.parameters,
+                 "rounds_done": self.rounds_done, "round_stats": self.round_stats,
+                 "affected_nodes": sorted(self.affected_nodes, key=str)}
+        arrays = dict(g_field=self.gameboard, node_ids=graph.node_ids,
+                      adj_indptr=graph.adj_indptr, adj_indices=graph.adj_indices,
+                      in_indptr=graph.in_indptr, in_indices=graph.in_indices,
+                      out_indptr=graph.out_indptr, out_indices=graph.out_indices,
+                      x=graph.x, y=graph.y,
+                      state=np.frombuffer(json.dumps(state).encode(), dtype=np.uint8))
+        if graph.self_loops is not None:
+            arrays["self_loops"] = graph.self_loops
+        if self.edge_weights is not None:
+            arrays["edge_weights"] = self.edge_weights
+        temporary = str(path) + ".tmp"
+        with open(temporary, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(temporary, path)
+        logger.debug("saved layout after " + str(self.rounds_done) + " rounds to " + str(path))
+
+    #
+    # return the layout saved at path, on a QFCompactNetwork even if the
+    # saved layout was given a QFNetwork. kwargs may change the parameters
+    # in RESUME_PARAMETERS, e.g. workers. mmap False reads the arrays
+    # into memory.
+    #
+    @classmethod
+    def load(cls, path, mmap=True, **kwargs):
+        unknown = set(kwargs) - set(RESUME_PARAMETERS)
+        if len(unknown) > 0:
+            raise ValueError("parameters that can't change on load: " + str(sorted(unknown)))
+        if mmap:
+            arrays = load_npz_arrays(path, mode="c")
+        else:
+            with np.load(path) as npz:
+                arrays = {key: npz[key] for key in npz.files}
+        state = json.loads(np.asarray(arrays.pop("state")).tobytes().decode())
+        if state.get("format") != CHECKPOINT_FORMAT or state.get("version") != CHECKPOINT_VERSION:
+            raise ValueError(str(path) + " is not a layout checkpoint of version " + str(CHECKPOINT_VERSION))
+        graph = qfnetwork.QFCompactNetwork(arrays["node_ids"], arrays["adj_indptr"], arrays["adj_indices"],
+                                           arrays["in_indptr"], arrays["in_indices"],
+                                           arrays["out_indptr"], arrays["out_indices"],
+                                           name=state["name"])
+        graph.x = arrays["x"]
+        graph.y = arrays["y"]
+        graph.self_loops = arrays.get("self_loops")
+        parameters = dict(state["parameters"], **kwargs)
+        if parameters.get("attraction", "steps") is None:
+            raise ValueError("the layout was saved with an attraction function, pass it as attraction")
+        layout = cls(graph, g_field=arrays["g_field"], edge_weights=arrays.get("edge_weights"), **parameters)
+        layout.rounds_done = state["rounds_done"]
+        layout.round_stats = state["round_stats"]
+        layout.affected_nodes = set(state["affected_nodes"])
+        return layout
+
+    #
+    # Editing the network
+    #
+    # The edits change the network and the g_field in place and collect
+    # the nodes they touch in self.affected_nodes, relayout then moves
+    # only those nodes and their neighborhood. The g_field keeps its size,
+    # after the network has grown a lot a new QFLayout lays it out better.
+    #
+    def _edit(self, method, *args):
+        # apply an edit to the layout's network and to the one it was given
+        if self.edge_weights is not None:
+            raise ValueError("a layout with edge_weights can't be edited")
+        if self.network is not self.graph:
+            getattr(self.network, method)(*args)
+        return getattr(self.graph, method)(*args)
+
+    #
+    # the new node starts where a move would take it: at the minimum of
+    # the search window around the nodes in near, the ids of those it is
+    # going to be connected to, or around the center of the g_field
+    # without them. Only the global search scans the whole g_field.
+    #
+    def add_node(self, node_id, near=()):
+        indices = [self.graph.node_index[neighbor] for neighbor in near]
+        if indices:
+            adj_x, adj_y = self.graph.x[indices], self.graph.y[indices]
+        else:
+            center = self.gameboard.shape[0] // 2
+            adj_x, adj_y = np.array([center]), np.array([center])
+        # the anchor is the mean position of the neighbors, as for nodes
+        # placed from a layout, see _place_from_cx_layout
+        anchor_x, anchor_y = int(np.rint(adj_x.mean())), int(np.rint(adj_y.mean()))
+        x, y = self._find_minimum(self._search_window(anchor_x, anchor_y, adj_x, adj_y))
+        self._edit("add_node", node_id, int(x), int(y))
+        window = add_field(self.r_field, self.gameboard, x, y)
+        if self.pyramid is not None:
+            self.pyramid.update(window)
+        self.affected_nodes.add(node_id)
+
+    def remove_node(self, node_id):
+        index = self.graph.node_index[node_id]
+        window = subtract_field(self.r_field, self.gameboard, int(self.graph.x[index]),
+                                int(self.graph.y[index]))
+        if self.pyramid is not None:
+            self.pyramid.update(window)
+        neighbors = self.graph.node_ids[self.graph.adjacent(index)].tolist()
+        self._edit("remove_node", node_id)
+        self.affected_nodes.discard(node_id)
+        self.affected_nodes.update(neighbor for neighbor in neighbors if neighbor != node_id)
+
+    def add_edge(self, source_id, target_id):
+        # the g_field only holds repulsions, attractions are
+        # added per move, so edges don't change it
+        if self._edit("add_edge", source_id, target_id):
+            self.affected_nodes.update((source_id, target_id))
+            self._check_precision([self.graph.node_index[source_id], self.graph.node_index[target_id]])
+
+    def remove_edge(self, source_id, target_id):
+        if self._edit("remove_edge", source_id, target_id):
+            self.affected_nodes.update((source_id, target_id))
+
+    #
+    # run rounds over the nodes at most hops edges away from the
+    # affected nodes, or from the ids in nodes, highest degree first,
+    # and return the layout. tolerance and patience are as for do_layout,
+    # the statistics of the rounds count all nodes.
+    #
+    def relayout(self, rounds=1, hops=1, nodes=None, node_size=40, tolerance=None, patience=3):
+        if nodes is None:
+            nodes = self.affected_nodes
+        graph = self.graph
+        indices = [graph.node_index[node_id] for node_id in nodes if node_id in graph.node_index]
+        region = graph.neighborhood(indices, hops=hops)
+        node_list = region[np.argsort(-graph.degree[region].astype(np.int64), kind="stable")].tolist()
+        logger.debug("relayout of " + str(len(node_list)) + " nodes")
+        self.round_stats = []
+        self._layout_rounds(lambda: self._layout_nodes(node_list), rounds, tolerance, patience)
+        self.affected_nodes = set()
+        self._sync_network()
+        return graph.get_cx_layout(node_size=node_size)
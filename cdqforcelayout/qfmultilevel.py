@@ -0,0 +1,172 @@
+#
+# Multilevel layout
+#
+# The network is repeatedly coarsened by heavy-edge matching: each
+# node is merged with the unmatched neighbor it shares the heaviest
+# edge with, the weight of an edge being the number of original edges
+# it stands for. The coarsest network is laid out on a small g_field.
+# Then, level by level, the nodes of the finer network are placed near
+# the position of the node they were merged into, scaled to the
+# larger g_field of the finer level, and refined by a few rounds of
+# QFLayout.
+#
+import numpy as np
+import logging
+
+from cdqforcelayout.qfnetwork import QFCompactNetwork
+from cdqforcelayout.qflayout import QFLayout
+
+
+logger = logging.getLogger(__name__)
+
+
+#
+# A level of the hierarchy: the network, the weight of each entry
+# of its adjacency (aligned with adj_indices) and, for every node,
+# the index of the node of the next coarser level it was merged into
+#
+class QFLevel:
+    def __init__(self, network, weights):
+        self.network = network
+        self.weights = weights
+        self.parent = None
+
+
+def heavy_edge_matching(network, weights):
+    #
+    # return an array that maps each node to its matching group, the
+    # groups are numbered in the order in which they were formed.
+    # Low degree nodes are matched first, ties go to the first
+    # neighbor in adjacency order.
+    #
+    n = network.get_nodecount()
+    group = np.full(n, -1, dtype=np.int64)
+    groups = 0
+    for index in np.argsort(network.degree, kind="stable").tolist():
+        if group[index] >= 0:
+            continue
+        start, end = network.adj_indptr[index], network.adj_indptr[index + 1]
+        neighbors = network.adj_indices[start:end]
+        candidates = (group[neighbors] < 0) & (neighbors != index)
+        group[index] = groups
+        if candidates.any():
+            neighbor_weights = np.where(candidates, weights[start:end], -1)
+            group[neighbors[np.argmax(neighbor_weights)]] = groups
+        groups += 1
+    return group
+
+
+def coarsen(network, weights=None):
+    #
+    # return the coarser network, the weights of its adjacency and the
+    # parent array that maps the nodes of network to the coarser nodes
+    #
+    if weights is None:
+        weights = np.ones(len(network.adj_indices), dtype=np.int64)
+    parent = heavy_edge_matching(network, weights)
+    m = int(parent.max()) + 1 if len(parent) > 0 else 0
+
+    sources, targets = network.get_index_edges()
+    sources = parent[sources]
+    targets = parent[targets]
+    keep = sources != targets
+    coarse = QFCompactNetwork.from_index_edges(np.arange(m), sources[keep], targets[keep],
+                                               name=network.name)
+
+    # the weight of a coarse adjacency entry is the sum of the weights of
+    # the fine entries it merges, both are sorted by row * m + column
+    rows = np.repeat(np.arange(network.get_nodecount(), dtype=np.int64), network.degree)
+    rows = parent[rows]
+    columns = parent[network.adj_indices]
+    keep = rows != columns
+    keys = rows[keep] * m + columns[keep]
+    coarse_keys = np.repeat(np.arange(m, dtype=np.int64), coarse.degree) * m + coarse.adj_indices
+    coarse_weights = np.bincount(np.searchsorted(coarse_keys, keys), weights=weights[keep],
+                                 minlength=len(coarse_keys)).astype(np.int64)
+    return coarse, coarse_weights, parent
+
+
+class QFMultilevelLayout:
+    #
+    # min_nodes: stop coarsening when a level has at most this many nodes
+    # max_levels: the maximum number of coarser levels
+    # coarse_rounds: layout rounds on the coarsest level
+    # refine_rounds: layout rounds on each finer level
+    # layout_kwargs: passed on to the QFLayout of every level,
+    #                initialize_coordinates applies to the coarsest level
+    #
+    def __init__(self, qfnetwork, min_nodes=100, max_levels=20, coarse_rounds=20,
+                 refine_rounds=3, **layout_kwargs):
+        if layout_kwargs.get("initialize_coordinates") == "layout":
+            raise ValueError("a multilevel layout can't start from an existing layout")
+        self.network = qfnetwork
+        self.coarse_rounds = coarse_rounds
+        self.refine_rounds = refine_rounds
+        self.layout_kwargs = layout_kwargs
+        self.sparsity = layout_kwargs.get("sparsity", 30)
+        self.levels = self._make_levels(qfnetwork.to_compact(), min_nodes, max_levels)
+        self.round_stats = []
+
+    @classmethod
+    def from_nicecx(cls, nicecx, **kwargs):
+        return cls(QFCompactNetwork.from_nicecx(nicecx), **kwargs)
+
+    @classmethod
+    def from_cx(cls, source, **kwargs):
+        return cls(QFCompactNetwork.from_cx(source), **kwargs)
+
+    def _make_levels(self, network, min_nodes, max_levels):
+        levels = [QFLevel(network, np.ones(len(network.adj_indices), dtype=np.int64))]
+        while len(levels) <= max_levels and levels[-1].network.get_nodecount() > min_nodes:
+            fine = levels[-1]
+            coarse, weights, parent = coarsen(fine.network, fine.weights)
+            # stop when matching hardly shrinks the network, e.g. a star
+            if coarse.get_nodecount() > 0.9 * fine.network.get_nodecount():
+                break
+            fine.parent = parent
+            levels.append(QFLevel(coarse, weights))
+            logger.debug("level " + str(len(levels) - 1) + ": " + str(coarse.get_nodecount()) + " nodes")
+        return levels
+
+    def _place_from_parent(self, fine, coarse):
+        #
+        # place the nodes of the fine level near their parent's position,
+        # scaled from the coarse g_field to the larger fine g_field
+        #
+        coarse_center = QFLayout.board_dimension(coarse.network.get_nodecount(), self.sparsity) // 2
+        dimension = QFLayout.board_dimension(fine.network.get_nodecount(), self.sparsity)
+        center = dimension // 2
+        scale = center / coarse_center if coarse_center > 0 else 1
+        target_x = np.rint(center + (coarse.network.x[fine.parent] - coarse_center) * scale)
+        target_y = np.rint(center + (coarse.network.y[fine.parent] - coarse_center) * scale)
+        fine.network.place_nodes_near(target_x.astype(np.int64), target_y.astype(np.int64), dimension)
+
+    #
+    # tolerance, patience: early stopping of the layout of each level,
+    #                      see QFLayout.do_layout
+    #
+    # the round statistics of all levels, coarsest first, are left in
+    # self.round_stats, each with the level it belongs to
+    #
+    def do_layout(self, node_size=40, tolerance=None, patience=3):
+        kwargs = dict(self.layout_kwargs)
+        coarsest = self.levels[-1]
+        layout = QFLayout(self.network if len(self.levels) == 1 else coarsest.network, **kwargs)
+        layout.do_layout(rounds=self.coarse_rounds, tolerance=tolerance, patience=patience)
+        self.round_stats = [dict(stats, level=len(self.levels) - 1) for stats in layout.round_stats]
+        kwargs["initialize_coordinates"] = "preset"
+        for level in range(len(self.levels) - 2, -1, -1):
+            fine = self.levels[level]
+            self._place_from_parent(fine, self.levels[level + 1])
+            # the finest level lays out the network that was given, so
+            # that a QFNetwork gets its positions
+            if level == 0 and self.network is not fine.network:
+                for node, x, y in zip(self.network.node_dict.values(), fine.network.x.tolist(),
+                                      fine.network.y.tolist()):
+                    node["x"] = x
+                    node["y"] = y
+            layout = QFLayout(self.network if level == 0 else fine.network, **kwargs)
+            layout.do_layout(rounds=self.refine_rounds, tolerance=tolerance, patience=patience)
+            self.round_stats.extend(dict(stats, level=level) for stats in layout.round_stats)
+        self.layout = layout
+        return layout.graph.get_cx_layout(node_size=node_size)
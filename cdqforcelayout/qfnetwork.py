@@ -11,15 +11,61 @@
 import numpy as np
 from operator import itemgetter
 from random import randint
+from cdqforcelayout.cxreader import read_cx_edges
+from cdqforcelayout.edgereader import read_edge_list, read_npz_edges
 import logging
 
 
 logger = logging.getLogger(__name__)
 
 
+def make_spiral(n, center):
+    # place nodes in a spiral from the center
+    x_list = [center]
+    y_list = [center]
+    x_dist = 1
+    y_dist = 1
+    x_dir = 1
+    y_dir = 1
+    x = center
+    y = center
+    count = 1
+    while count <= n:
+        for dx in range(1, x_dist):
+            x = x + x_dir
+            x_list.append(x)
+            y_list.append(y)
+
+            count = count+1
+            if count > n:
+                break
+        x_dir = -x_dir
+        x_dist = x_dist +1
+        for dy in range(1, y_dist):
+            y = y + y_dir
+            x_list.append(x)
+            y_list.append(y)
+            count = count + 1
+            if count > n:
+                break
+        y_dir = -y_dir
+        y_dist = y_dist + 1
+    return list(zip(x_list, y_list))
+
+
+def nicecx_edge_array(nicecx):
+    # the source and target node ids of the edges of a NiceCXNetwork
+    edges = nicecx.get_edges()
+    edge_array = np.array([(edge["s"], edge["t"]) for edge_id, edge in edges],
+                          dtype=int).reshape(len(edges), 2)
+    logger.debug("edge array: " + str(edge_array.shape))
+    return edge_array
+
+
 class QFNetwork:
  
     def __init__(self, edge_array, name="unnamed network") -> None:
+        self.name = name
         self.node_dict = {}
         for edge in edge_array:
             if logger.isEnabledFor(logging.DEBUG):
@@ -40,28 +86,23 @@ class QFNetwork:
                                            "out":set(), "out_degree":0}
             self.node_dict[edge[0]]["adj"].add(edge[1])
             self.node_dict[edge[0]]["out"].add(edge[1])
-            self.node_dict[edge[0]]["degree"] = len(self.node_dict[edge[0]]["adj"])
-            self.node_dict[edge[0]]["out_degree"] = len(self.node_dict[edge[0]]["out"])
             if edge[1] not in self.node_dict:
                 self.node_dict[edge[1]] = {"adj":set(), "degree":0,
                                            "in":set(), "in_degree":0, 
                                            "out":set(), "out_degree":0}
             self.node_dict[edge[1]]["adj"].add(edge[0])
             self.node_dict[edge[1]]["in"].add(edge[0])
-            self.node_dict[edge[1]]["degree"] = len(self.node_dict[edge[1]]["adj"])
-            self.node_dict[edge[1]]["in_degree"] = len(self.node_dict[edge[1]]["in"])
+
+        # the degrees are the sizes of the adjacency sets
+        for node in self.node_dict.values():
+            node["degree"] = len(node["adj"])
+            node["in_degree"] = len(node["in"])
+            node["out_degree"] = len(node["out"])
 
     
     @classmethod
     def from_nicecx(cls, nicecx):
-        edge_array = np.zeros((len(nicecx.get_edges()), 2), dtype=int)
-        logger.debug("edge array: " + str(edge_array.shape))
-        i = 0
-        for edge_id, edge in nicecx.get_edges():
-            edge_array[i, 0] = edge["s"]
-            edge_array[i, 1] = edge["t"]
-            i += 1
-        return cls(edge_array, name=nicecx.get_name())
+        return cls(nicecx_edge_array(nicecx), name=nicecx.get_name())
 
     def get_sorted_nodes(self, reverse=True):
         # get the nodes as a list, sorted by degree, highest degree first
@@ -70,6 +111,63 @@ class QFNetwork:
     def get_nodecount(self):
         return len(self.node_dict.values())
 
+    #
+    # editing the network, see QFCompactNetwork.add_node
+    #
+    def add_node(self, node_id, x=0, y=0):
+        if node_id in self.node_dict:
+            raise ValueError("node already exists: " + str(node_id))
+        self.node_dict[node_id] = {"adj":set(), "degree":0,
+                                   "in":set(), "in_degree":0,
+                                   "out":set(), "out_degree":0,
+                                   "x":x, "y":y}
+
+    def remove_node(self, node_id):
+        node = self.node_dict.pop(node_id)
+        for other_id in node["adj"]:
+            if other_id == node_id:
+                continue
+            other = self.node_dict[other_id]
+            for key in ("adj", "in", "out"):
+                other[key].discard(node_id)
+            self._update_degrees(other)
+
+    def add_edge(self, source_id, target_id):
+        source = self.node_dict[source_id]
+        target = self.node_dict[target_id]
+        if target_id in source["out"]:
+            return False
+        source["out"].add(target_id)
+        source["adj"].add(target_id)
+        target["in"].add(source_id)
+        target["adj"].add(source_id)
+        self._update_degrees(source)
+        self._update_degrees(target)
+        return True
+
+    def remove_edge(self, source_id, target_id):
+        source = self.node_dict[source_id]
+        target = self.node_dict[target_id]
+        if target_id not in source["out"]:
+            return False
+        source["out"].discard(target_id)
+        target["in"].discard(source_id)
+        if source_id not in target["out"]:
+            source["adj"].discard(target_id)
+            target["adj"].discard(source_id)
+        self._update_degrees(source)
+        self._update_degrees(target)
+        return True
+
+    @staticmethod
+    def _update_degrees(node):
+        node["degree"] = len(node["adj"])
+        node["in_degree"] = len(node["in"])
+        node["out_degree"] = len(node["out"])
+
+    def to_compact(self):
+        return QFCompactNetwork.from_qfnetwork(self)
+
     def place_nodes_randomly(self, dimension):
         # randomly place the nodes in the center of the g_field
         temp_board = np.zeros((dimension, dimension))
@@ -92,37 +190,7 @@ class QFNetwork:
             node["y"] = center
 
     def make_spiral(self, n, center):
-        # place nodes in a spiral from the center
-        x_list = [center]
-        y_list = [center]
-        x_dist = 1
-        y_dist = 1
-        x_dir = 1
-        y_dir = 1
-        x = center
-        y = center
-        count = 1
-        while count <= n:
-            for dx in range(1, x_dist):
-                x = x + x_dir
-                x_list.append(x)
-                y_list.append(y)
-
-                count = count+1
-                if count > n:
-                    break
-            x_dir = -x_dir
-            x_dist = x_dist +1
-            for dy in range(1, y_dist):
-                y = y + y_dir
-                x_list.append(x)
-                y_list.append(y)
-                count = count + 1
-                if count > n:
-                    break
-            y_dir = -y_dir
-            y_dist = y_dist + 1
-        return list(zip(x_list, y_list))
+        return make_spiral(n, center)
 
     def place_nodes_in_a_spiral(self, center, scale=1):
         #
@@ -180,3 +248,559 @@ class QFNetwork:
                        "x": int(node["y"] * node_size)}
             cx_layout.append(cx_node)
         return cx_layout
+
+
+def _csr(rows, n):
+    #
+    # return the indptr and indices arrays of the CSR
+    # adjacency for a list of n collections of node indices
+    #
+    counts = np.fromiter((len(row) for row in rows), dtype=np.int64, count=n)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    indices = np.fromiter((index for row in rows for index in sorted(row)),
+                          dtype=np.int32, count=int(indptr[-1]))
+    return _compact_indptr(indptr), indices
+
+
+def _nearest_free_cell(x, y, occupied, offsets, dimension):
+    # walk the spiral offsets, extending them when the neighborhood is full
+    while True:
+        for dx, dy in offsets:
+            cell = (x + dx, y + dy)
+            if 0 <= cell[0] < dimension and 0 <= cell[1] < dimension and cell not in occupied:
+                return cell
+        offsets[:] = make_spiral(len(offsets) * 4, 0)
+
+
+def _sorted_unique(keys):
+    # sort based, np.unique may pick a slower hash based path
+    keys = np.sort(keys)
+    if len(keys) == 0:
+        return keys
+    return keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+
+
+def _csr_from_keys(keys, n):
+    #
+    # return the indptr and indices arrays of the CSR adjacency
+    # for sorted edge keys row * n + column
+    #
+    rows = keys // n if n > 0 else keys
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+    indices = (keys - rows * n).astype(np.int32)
+    return _compact_indptr(indptr), indices
+
+
+def _split_self_loops(n, sources, targets, self_loops):
+    #
+    # return the sources and targets without the self-loops unless
+    # self_loops is "keep", and for "flag" a boolean array that marks
+    # the n nodes with self-loops, otherwise None
+    #
+    loops = sources == targets
+    flagged = np.zeros(n, dtype=bool) if self_loops == "flag" else None
+    if self_loops != "keep" and loops.any():
+        if flagged is not None:
+            flagged[sources[loops]] = True
+        sources = sources[~loops]
+        targets = targets[~loops]
+    return sources, targets, flagged
+
+
+def _csr_insert(indptr, indices, row, value):
+    # insert value into the sorted row of a CSR array
+    # unless it is there, return the arrays and whether it was inserted
+    start, end = int(indptr[row]), int(indptr[row + 1])
+    position = start + int(np.searchsorted(indices[start:end], value))
+    if position < end and indices[position] == value:
+        return indptr, indices, False
+    indptr = indptr.astype(np.int64)
+    indptr[row + 1:] += 1
+    return _compact_indptr(indptr), np.insert(indices, position, value), True
+
+
+def _csr_delete(indptr, indices, row, value):
+    # delete value from the row of a CSR array if it is there
+    start, end = int(indptr[row]), int(indptr[row + 1])
+    position = start + int(np.searchsorted(indices[start:end], value))
+    if position == end or indices[position] != value:
+        return indptr, indices, False
+    indptr = indptr.astype(np.int64)
+    indptr[row + 1:] -= 1
+    return _compact_indptr(indptr), np.delete(indices, position), True
+
+
+def _csr_delete_row(indptr, indices, row):
+    # delete an empty row and renumber the later rows in indices
+    indices = indices.copy()
+    indices[indices > row] -= 1
+    return np.delete(indptr, row + 1), indices
+
+
+def _compact_indptr(indptr):
+    # int32 unless there are too many edges for it
+    if indptr[-1] <= np.iinfo(np.int32).max:
+        return indptr.astype(np.int32)
+    return indptr.astype(np.int64)
+
+
+#
+# An array backed network for large networks
+#
+# Nodes are numbered 0..n-1 in the order in which they were first seen,
+# node_ids maps the numbers back to the network's node ids and
+# node_index maps the node ids to the numbers. The adjacency is in
+# compressed sparse row form: the neighbors of node i are
+# adj_indices[adj_indptr[i]:adj_indptr[i+1]], in_indices and out_indices
+# likewise hold the sources and targets of the node's edges.
+# Degrees and positions are NumPy arrays.
+#
+# QFLayout runs on this representation directly. node_dict is a lazy
+# compatibility view that looks like the node_dict of a QFNetwork.
+#
+class QFCompactNetwork:
+
+    def __init__(self, node_ids, adj_indptr, adj_indices, in_indptr, in_indices,
+                 out_indptr, out_indices, name="unnamed network") -> None:
+        self.name = name
+        self.node_ids = np.asarray(node_ids)
+        self.node_index = {node_id: index for index, node_id in enumerate(self.node_ids.tolist())}
+        self.adj_indptr = np.asarray(adj_indptr)
+        self.adj_indices = np.asarray(adj_indices, dtype=np.int32)
+        self.in_indptr = np.asarray(in_indptr)
+        self.in_indices = np.asarray(in_indices, dtype=np.int32)
+        self.out_indptr = np.asarray(out_indptr)
+        self.out_indices = np.asarray(out_indices, dtype=np.int32)
+        self.degree = np.diff(self.adj_indptr).astype(np.int32)
+        self.in_degree = np.diff(self.in_indptr).astype(np.int32)
+        self.out_degree = np.diff(self.out_indptr).astype(np.int32)
+        self.x = np.zeros(len(self.node_ids), dtype=np.int32)
+        self.y = np.zeros(len(self.node_ids), dtype=np.int32)
+        # the nodes with self-loops, set by from_edge_array(self_loops="flag")
+        self.self_loops = None
+        # the cartesianLayout aspect of a CX file as an m x 3 array
+        # of node id, x and y, set by from_cx
+        self.cx_layout = None
+
+    @classmethod
+    def from_qfnetwork(cls, qfnetwork):
+        node_ids = list(qfnetwork.node_dict.keys())
+        node_index = {node_id: index for index, node_id in enumerate(node_ids)}
+        nodes = list(qfnetwork.node_dict.values())
+        n = len(nodes)
+        adj_indptr, adj_indices = _csr([[node_index[i] for i in node["adj"]] for node in nodes], n)
+        in_indptr, in_indices = _csr([[node_index[i] for i in node["in"]] for node in nodes], n)
+        out_indptr, out_indices = _csr([[node_index[i] for i in node["out"]] for node in nodes], n)
+        network = cls(node_ids, adj_indptr, adj_indices, in_indptr, in_indices,
+                      out_indptr, out_indices, name=getattr(qfnetwork, "name", "unnamed network"))
+        if n > 0 and "x" in nodes[0]:
+            network.x[:] = [node["x"] for node in nodes]
+            network.y[:] = [node["y"] for node in nodes]
+        return network
+
+    @classmethod
+    def from_edge_array(cls, edge_array, name="unnamed network", self_loops="keep"):
+        #
+        # build the network from an n x 2 array of source, target
+        # node ids in one vectorized pass
+        #
+        # Duplicate edges are removed. self_loops is "keep" to treat
+        # self-loops like QFNetwork does, "drop" to remove them or "flag"
+        # to remove them and mark their nodes in the self_loops array.
+        # Nodes that only have self-loops are kept in all cases.
+        #
+        if self_loops not in ("keep", "drop", "flag"):
+            raise ValueError("self_loops must be keep, drop or flag: " + str(self_loops))
+        # objects with the buffer protocol are wrapped, not copied,
+        # a flat buffer holds source, target pairs
+        edges = np.asarray(edge_array)
+        if edges.size == 0 or edges.ndim == 1:
+            edges = edges.reshape(-1, 2)
+
+        # number the nodes in the order in which they first appear,
+        # edge by edge, source before target, like QFNetwork does
+        unique_ids, first_seen, inverse = np.unique(edges[:, :2].reshape(-1), return_index=True,
+                                                    return_inverse=True)
+        order = np.argsort(first_seen, kind="stable")
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        codes = rank[inverse.reshape(-1)].reshape(-1, 2)
+        n = len(order)
+        sources, targets, flagged = _split_self_loops(n, codes[:, 0], codes[:, 1], self_loops)
+        network = cls.from_index_edges(unique_ids[order], sources, targets, name=name)
+        network.self_loops = flagged
+        return network
+
+    @classmethod
+    def from_sparse(cls, matrix, name="unnamed network", self_loops="keep"):
+        #
+        # build the network from a square sparse adjacency matrix, or
+        # anything else with a tocoo() method, e.g. a SciPy sparse matrix.
+        # Node i has the id i, an entry at row i and column j is an
+        # edge from i to j. self_loops is as for from_edge_array.
+        #
+        coo = matrix.tocoo()
+        if coo.shape[0] != coo.shape[1]:
+            raise ValueError("adjacency matrix is not square: " + str(coo.shape))
+        return cls._from_index_edge_arrays(coo.shape[0], coo.row, coo.col, name, self_loops)
+
+    @classmethod
+    def _from_index_edge_arrays(cls, n, sources, targets, name, self_loops):
+        if self_loops not in ("keep", "drop", "flag"):
+            raise ValueError("self_loops must be keep, drop or flag: " + str(self_loops))
+        sources, targets, flagged = _split_self_loops(n, np.asarray(sources, dtype=np.int64),
+                                                      np.asarray(targets, dtype=np.int64),
+                                                      self_loops)
+        network = cls.from_index_edges(np.arange(n), sources, targets, name=name)
+        network.self_loops = flagged
+        return network
+
+    @classmethod
+    def from_edge_list(cls, path, name="unnamed network", self_loops="keep", **kwargs):
+        # build the network from a delimited text file,
+        # kwargs are passed on to edgereader.read_edge_list
+        return cls.from_edge_array(read_edge_list(path, **kwargs), name=name,
+                                   self_loops=self_loops)
+
+    @classmethod
+    def from_npz(cls, path, key=None, name="unnamed network", self_loops="keep"):
+        # build the network from a .npy or .npz edge array or
+        # a sparse matrix .npz, see edgereader.read_npz_edges
+        edges = read_npz_edges(path, key=key)
+        if isinstance(edges, tuple):
+            return cls._from_index_edge_arrays(*edges, name, self_loops)
+        return cls.from_edge_array(edges, name=name, self_loops=self_loops)
+
+    @classmethod
+    def from_index_edges(cls, node_ids, sources, targets, name="unnamed network"):
+        #
+        # build the network from edges between node indices,
+        # node i has the id node_ids[i], nodes without edges are kept
+        #
+        n = len(node_ids)
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        # unique edge keys, sorted by the first and then the second node
+        out_keys = _sorted_unique(sources * n + targets)
+        in_keys = _sorted_unique(targets * n + sources)
+        adj_keys = _sorted_unique(np.concatenate((out_keys, in_keys)))
+        out_indptr, out_indices = _csr_from_keys(out_keys, n)
+        in_indptr, in_indices = _csr_from_keys(in_keys, n)
+        adj_indptr, adj_indices = _csr_from_keys(adj_keys, n)
+        return cls(node_ids, adj_indptr, adj_indices, in_indptr, in_indices,
+                   out_indptr, out_indices, name=name)
+
+    @classmethod
+    def from_nicecx(cls, nicecx, self_loops="keep"):
+        return cls.from_edge_array(nicecx_edge_array(nicecx), name=nicecx.get_name(),
+                                   self_loops=self_loops)
+
+    @classmethod
+    def from_cx(cls, source, name="unnamed network", self_loops="keep"):
+        #
+        # build the network from a CX file, "-" for standard input or
+        # a binary file object, see cxreader. Nodes without edges
+        # follow the nodes of the edges, in the order of the nodes aspect.
+        # The cartesianLayout aspect, if any, is kept in cx_layout.
+        #
+        node_ids, edge_array, cx_layout = read_cx_edges(source, with_layout=True)
+        network = cls.from_edge_array(edge_array, name=name, self_loops=self_loops)
+        isolated = node_ids[~np.isin(node_ids, network.node_ids)]
+        if len(isolated) > 0:
+            sources, targets = network.get_index_edges()
+            flagged = network.self_loops
+            network = cls.from_index_edges(np.concatenate((network.node_ids, isolated)),
+                                           sources, targets, name=name)
+            if flagged is not None:
+                network.self_loops = np.concatenate((flagged, np.zeros(len(isolated), dtype=bool)))
+        network.cx_layout = cx_layout
+        return network
+
+    def to_compact(self):
+        return self
+
+    @property
+    def node_dict(self):
+        return _QFNodeDictView(self)
+
+    def get_nodecount(self):
+        return len(self.node_ids)
+
+    def adjacent(self, index):
+        return self.adj_indices[self.adj_indptr[index]:self.adj_indptr[index + 1]]
+
+    def get_sorted_indices(self, reverse=True):
+        # the node indices sorted by degree, highest degree first,
+        # ties keep their node order like the sorted() of QFNetwork
+        if reverse:
+            return np.argsort(-self.degree.astype(np.int64), kind="stable")
+        return np.argsort(self.degree, kind="stable")
+
+    def get_sorted_nodes(self, reverse=True):
+        node_dict = self.node_dict
+        return [node_dict.node(index) for index in self.get_sorted_indices(reverse=reverse)]
+
+    def get_index_edges(self):
+        # the sources and targets of the directed edges as node indices
+        sources = np.repeat(np.arange(self.get_nodecount(), dtype=np.int64), self.out_degree)
+        return sources, self.out_indices.astype(np.int64)
+
+    def greedy_coloring(self, order=None):
+        #
+        # return an array with a color for each node such that
+        # adjacent nodes never share a color. Nodes are colored in
+        # the given order, default highest degree first, each with
+        # the smallest color not used by its colored neighbors.
+        # Self-loops are ignored.
+        #
+        if order is None:
+            order = self.get_sorted_indices()
+        colors = np.full(self.get_nodecount(), -1, dtype=np.int32)
+        for index in np.asarray(order).tolist():
+            used = set(colors[self.adjacent(index)].tolist())
+            color = 0
+            while color in used:
+                color += 1
+            colors[index] = color
+        return colors
+
+    #
+    # Editing the network
+    #
+    # The edits change the CSR arrays in place of a rebuild, each costs
+    # time linear in the number of edges, which is fine for a handful of
+    # edits. Nodes are given by their ids. Removing a node renumbers the
+    # nodes after it.
+    #
+    def add_node(self, node_id, x=0, y=0):
+        # add a node without edges, return its index
+        if node_id in self.node_index:
+            raise ValueError("node already exists: " + str(node_id))
+        index = self.get_nodecount()
+        self.node_ids = np.append(self.node_ids, node_id)
+        self.node_index[node_id] = index
+        for name in ("adj_indptr", "in_indptr", "out_indptr"):
+            indptr = getattr(self, name)
+            setattr(self, name, np.append(indptr, indptr[-1]))
+        self.x = np.append(self.x, np.int32(x)).astype(np.int32)
+        self.y = np.append(self.y, np.int32(y)).astype(np.int32)
+        if self.self_loops is not None:
+            self.self_loops = np.append(self.self_loops, False)
+        self._update_degrees()
+        return index
+
+    def remove_node(self, node_id):
+        # remove a node and its edges, return the indices of its neighbors
+        # before the removal
+        index = self.node_index[node_id]
+        neighbors = self.adjacent(index).copy()
+        for target in self.out_indices[self.out_indptr[index]:self.out_indptr[index + 1]].tolist():
+            self.remove_edge(node_id, self.node_ids[target].item())
+        for source in self.in_indices[self.in_indptr[index]:self.in_indptr[index + 1]].tolist():
+            self.remove_edge(self.node_ids[source].item(), node_id)
+        for name in ("adj", "in", "out"):
+            indptr, indices = _csr_delete_row(getattr(self, name + "_indptr"),
+                                              getattr(self, name + "_indices"), index)
+            setattr(self, name + "_indptr", indptr)
+            setattr(self, name + "_indices", indices)
+        self.node_ids = np.delete(self.node_ids, index)
+        self.node_index = {node_id: index for index, node_id in enumerate(self.node_ids.tolist())}
+        self.x = np.delete(self.x, index)
+        self.y = np.delete(self.y, index)
+        if self.self_loops is not None:
+            self.self_loops = np.delete(self.self_loops, index)
+        self._update_degrees()
+        return neighbors
+
+    def add_edge(self, source_id, target_id):
+        # add an edge between existing nodes, return whether it is new
+        source = self.node_index[source_id]
+        target = self.node_index[target_id]
+        self.out_indptr, self.out_indices, added = _csr_insert(self.out_indptr, self.out_indices,
+                                                               source, target)
+        if not added:
+            return False
+        self.in_indptr, self.in_indices, _ = _csr_insert(self.in_indptr, self.in_indices,
+                                                         target, source)
+        self.adj_indptr, self.adj_indices, _ = _csr_insert(self.adj_indptr, self.adj_indices,
+                                                           source, target)
+        self.adj_indptr, self.adj_indices, _ = _csr_insert(self.adj_indptr, self.adj_indices,
+                                                           target, source)
+        self._update_degrees()
+        return True
+
+    def remove_edge(self, source_id, target_id):
+        # remove an edge, return whether it existed. The nodes stay
+        # adjacent while there is an edge in the other direction.
+        source = self.node_index[source_id]
+        target = self.node_index[target_id]
+        self.out_indptr, self.out_indices, removed = _csr_delete(self.out_indptr, self.out_indices,
+                                                                 source, target)
+        if not removed:
+            return False
+        self.in_indptr, self.in_indices, _ = _csr_delete(self.in_indptr, self.in_indices,
+                                                         target, source)
+        reverse = self.out_indices[self.out_indptr[target]:self.out_indptr[target + 1]]
+        if source not in reverse.tolist():
+            self.adj_indptr, self.adj_indices, _ = _csr_delete(self.adj_indptr, self.adj_indices,
+                                                               source, target)
+            self.adj_indptr, self.adj_indices, _ = _csr_delete(self.adj_indptr, self.adj_indices,
+                                                               target, source)
+        self._update_degrees()
+        return True
+
+    def _update_degrees(self):
+        self.degree = np.diff(self.adj_indptr).astype(np.int32)
+        self.in_degree = np.diff(self.in_indptr).astype(np.int32)
+        self.out_degree = np.diff(self.out_indptr).astype(np.int32)
+
+    def neighborhood(self, indices, hops=1):
+        # the sorted indices of the nodes at most hops edges away from indices
+        reached = np.zeros(self.get_nodecount(), dtype=bool)
+        frontier = np.unique(np.asarray(indices, dtype=np.int64))
+        reached[frontier] = True
+        for hop in range(hops):
+            if len(frontier) == 0:
+                break
+            starts = self.adj_indptr[frontier]
+            counts = self.adj_indptr[frontier + 1] - starts
+            positions = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            neighbors = self.adj_indices[positions]
+            frontier = np.unique(neighbors[~reached[neighbors]])
+            reached[frontier] = True
+        return np.flatnonzero(reached)
+
+    def place_nodes_randomly(self, dimension, rng=None):
+        # randomly place the nodes in the center of the g_field
+        # rng is an optional random.Random for reproducible placements
+        rand = randint if rng is None else rng.randint
+        temp_board = np.zeros((dimension, dimension))
+        center_left = round(dimension/4)
+        center_right = dimension - center_left
+        for index in range(self.get_nodecount()):
+            placed = False
+            while not placed:
+                x = rand(center_left, center_right)
+                y = rand(center_left, center_right)
+                if temp_board[x, y] == 0:
+                    temp_board[x, y] = 1
+                    placed = True
+            self.x[index] = x
+            self.y[index] = y
+
+    def place_nodes_at_center(self, center):
+        self.x[:] = center
+        self.y[:] = center
+
+    def place_nodes_near(self, target_x, target_y, dimension):
+        #
+        # place each node on the free cell of a dimension x dimension
+        # g_field that is nearest to its target, searching outwards
+        # in a spiral. Nodes are placed in index order.
+        #
+        if self.get_nodecount() > dimension * dimension:
+            raise ValueError("more nodes than cells on the g_field")
+        target_x = np.clip(np.asarray(target_x), 0, dimension - 1).tolist()
+        target_y = np.clip(np.asarray(target_y), 0, dimension - 1).tolist()
+        occupied = set()
+        offsets = make_spiral(64, 0)
+        for index in range(self.get_nodecount()):
+            x = target_x[index]
+            y = target_y[index]
+            if (x, y) in occupied:
+                x, y = _nearest_free_cell(x, y, occupied, offsets, dimension)
+            occupied.add((x, y))
+            self.x[index] = x
+            self.y[index] = y
+
+    def place_nodes_in_a_spiral(self, center, scale=1):
+        # see QFNetwork.place_nodes_in_a_spiral, the low
+        # degree nodes are in the center
+        sorted_indices = self.get_sorted_indices(reverse=False)
+        coordinates = np.array(make_spiral(len(sorted_indices), center), dtype=np.int32)
+        self.x[sorted_indices] = coordinates[:len(sorted_indices), 0]
+        self.y[sorted_indices] = coordinates[:len(sorted_indices), 1]
+
+    def get_cx_layout(self, node_size=40):
+        # see QFNetwork.get_cx_layout, node ids that are
+        # not integers, e.g. from edge lists, are kept
+        integer_ids = self.node_ids.dtype.kind in "iuf"
+        cx_layout = []
+        for node_id, x, y in zip(self.node_ids.tolist(), self.x.tolist(), self.y.tolist()):
+            cx_layout.append({"node": int(node_id) if integer_ids else node_id,
+                              "y": int(x * node_size),
+                              "x": int(y * node_size)})
+        return cx_layout
+
+
+class _QFNodeView:
+    #
+    # a node of a QFCompactNetwork that reads like a node dict of
+    # a QFNetwork. Only the position can be assigned.
+    #
+    def __init__(self, network, index):
+        self._network = network
+        self.index = index
+
+    def _node_ids(self, indptr, indices):
+        neighbors = indices[indptr[self.index]:indptr[self.index + 1]]
+        return set(self._network.node_ids[neighbors].tolist())
+
+    def __getitem__(self, key):
+        network = self._network
+        if key == "adj":
+            return self._node_ids(network.adj_indptr, network.adj_indices)
+        elif key == "in":
+            return self._node_ids(network.in_indptr, network.in_indices)
+        elif key == "out":
+            return self._node_ids(network.out_indptr, network.out_indices)
+        elif key in ("degree", "in_degree", "out_degree", "x", "y"):
+            return int(getattr(network, key)[self.index])
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in ("x", "y"):
+            raise KeyError(key)
+        getattr(self._network, key)[self.index] = value
+
+    def __contains__(self, key):
+        return key in ("adj", "in", "out", "degree", "in_degree", "out_degree", "x", "y")
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+
+class _QFNodeDictView:
+    #
+    # the node_dict of a QFCompactNetwork, node views are
+    # only created when they are looked up
+    #
+    def __init__(self, network):
+        self._network = network
+
+    def node(self, index):
+        return _QFNodeView(self._network, index)
+
+    def __getitem__(self, node_id):
+        return self.node(self._network.node_index[node_id])
+
+    def __contains__(self, node_id):
+        return node_id in self._network.node_index
+
+    def __len__(self):
+        return self._network.get_nodecount()
+
+    def __iter__(self):
+        return iter(self._network.node_ids.tolist())
+
+    def keys(self):
+        return self._network.node_ids.tolist()
+
+    def values(self):
+        return [self.node(index) for index in range(len(self))]
+
+    def items(self):
+        return [(node_id, self.node(index)) for index, node_id in enumerate(self.keys())]
+
@@ -0,0 +1,142 @@
+#
+# Compiled layout rounds
+#
+# layout_one_node moves a node with a dozen small NumPy calls, for a
+# low degree node the cost of the calls rivals the arithmetic. Here a
+# whole round of moves is one loop over the array backed positions and
+# adjacency of a QFCompactNetwork, compiled by Numba when it is
+# installed. Without Numba the functions are plain Python, far too slow
+# for a layout but they run the same steps, see QFLayout backend.
+#
+# The moves are those of layout_one_node step by step: the same
+# windows, the same clipping of the kernels, the attractions summed on
+# a scratchpad of the scratchpad type and the first minimum of the
+# search window in row-major order, so the layouts are identical.
+# Directed flow, the pyramid search and g_fields on disk are not
+# supported.
+#
+import logging
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+logger = logging.getLogger(__name__)
+
+NUMBA_AVAILABLE = numba is not None
+
+# the search modes of layout_nodes
+SEARCH_GLOBAL = 0
+SEARCH_NEIGHBORS = 1
+SEARCH_RADIUS = 2
+
+
+def _compiled(function):
+    # compile on first use, cached on disk across processes
+    if numba is None:
+        return function
+    return numba.njit(cache=True, nogil=True)(function)
+
+
+@_compiled
+def _add_clipped(kernel, target, x, y, top_x, bottom_x, top_y, bottom_y, remove):
+    # add or subtract the kernel centered at x, y, clipped to the window
+    offset = kernel.shape[0] // 2
+    from_x = max(x - offset, top_x)
+    to_x = min(x + offset + 1, bottom_x)
+    from_y = max(y - offset, top_y)
+    to_y = min(y + offset + 1, bottom_y)
+    for i in range(from_x, to_x):
+        for j in range(from_y, to_y):
+            if remove:
+                target[i, j] -= kernel[i - x + offset, j - y + offset]
+            else:
+                target[i, j] += kernel[i - x + offset, j - y + offset]
+
+
+@_compiled
+def _argmin(field, top_x, bottom_x, top_y, bottom_y):
+    # the first minimum of the window in row-major order, as np.argmin
+    best_x, best_y = top_x, top_y
+    best = field[top_x, top_y]
+    for i in range(top_x, bottom_x):
+        for j in range(top_y, bottom_y):
+            if field[i, j] < best:
+                best = field[i, j]
+                best_x, best_y = i, j
+    return best_x, best_y
+
+
+@_compiled
+def layout_nodes(board, scratch, r_field, kernels, entry_kernel, adj_indptr, adj_indices,
+                 x, y, order, search, reach, search_radius):
+    #
+    # move the nodes in order, see QFLayout.layout_one_node
+    #
+    # board: the g_field, changed in place
+    # scratch: a g_field sized array of the scratchpad type, only the
+    #          window of each move is used and it is left dirty
+    # kernels: the attraction kernels, entry_kernel the one for each
+    #          adjacency entry
+    # x, y: the positions, changed in place
+    # search: SEARCH_GLOBAL, SEARCH_NEIGHBORS with reach, the attraction
+    #         radius plus the search margin, or SEARCH_RADIUS
+    #
+    size_x, size_y = board.shape
+    a_radius = kernels.shape[1] // 2
+    for index in order:
+        node_x, node_y = int(x[index]), int(y[index])
+        _add_clipped(r_field, board, node_x, node_y, 0, size_x, 0, size_y, True)
+        start, end = adj_indptr[index], adj_indptr[index + 1]
+        low_x, high_x, low_y, high_y = size_x, -1, size_y, -1
+        for entry in range(start, end):
+            neighbor = adj_indices[entry]
+            low_x = min(low_x, int(x[neighbor]))
+            high_x = max(high_x, int(x[neighbor]))
+            low_y = min(low_y, int(y[neighbor]))
+            high_y = max(high_y, int(y[neighbor]))
+
+        # the search window, the whole g_field when it is empty
+        search_window = False
+        top_x, bottom_x, top_y, bottom_y = 0, size_x, 0, size_y
+        if search == SEARCH_NEIGHBORS and end > start:
+            top_x, bottom_x = max(low_x - reach, 0), min(high_x + reach + 1, size_x)
+            top_y, bottom_y = max(low_y - reach, 0), min(high_y + reach + 1, size_y)
+            search_window = True
+        elif search == SEARCH_RADIUS:
+            top_x, bottom_x = max(node_x - search_radius, 0), min(node_x + search_radius + 1, size_x)
+            top_y, bottom_y = max(node_y - search_radius, 0), min(node_y + search_radius + 1, size_y)
+            search_window = True
+        if search_window and (top_x >= bottom_x or top_y >= bottom_y):
+            top_x, bottom_x, top_y, bottom_y = 0, size_x, 0, size_y
+            search_window = False
+
+        # the scratchpad window, the attraction footprints within the search window
+        s_top_x, s_bottom_x = max(low_x - a_radius, 0), min(high_x + a_radius + 1, size_x)
+        s_top_y, s_bottom_y = max(low_y - a_radius, 0), min(high_y + a_radius + 1, size_y)
+        if search_window:
+            s_top_x, s_bottom_x = max(s_top_x, top_x), min(s_bottom_x, bottom_x)
+            s_top_y, s_bottom_y = max(s_top_y, top_y), min(s_bottom_y, bottom_y)
+        attracted = end > start and s_top_x < s_bottom_x and s_top_y < s_bottom_y
+
+        if attracted:
+            scratch[s_top_x:s_bottom_x, s_top_y:s_bottom_y] = 0
+            for entry in range(start, end):
+                neighbor = adj_indices[entry]
+                _add_clipped(kernels[entry_kernel[entry]], scratch, int(x[neighbor]), int(y[neighbor]),
+                             s_top_x, s_bottom_x, s_top_y, s_bottom_y, False)
+            for i in range(s_top_x, s_bottom_x):
+                for j in range(s_top_y, s_bottom_y):
+                    board[i, j] += scratch[i, j]
+
+        destination_x, destination_y = _argmin(board, top_x, bottom_x, top_y, bottom_y)
+        x[index] = destination_x
+        y[index] = destination_y
+        _add_clipped(r_field, board, destination_x, destination_y, 0, size_x, 0, size_y, False)
+
+        if attracted:
+            for i in range(s_top_x, s_bottom_x):
+                for j in range(s_top_y, s_bottom_y):
+                    board[i, j] -= scratch[i, j]
@@ -0,0 +1,100 @@
+#
+# Integer precision
+#
+# The g_field, the scratchpad and the kernels are integer arrays and
+# integer arithmetic wraps around silently: a hub whose neighbors'
+# attractions add up past -32768 makes the most attractive cell of an
+# int16 g_field one of its least attractive. choose_precision bounds
+# the values each of them can take and picks the narrowest integer
+# type that holds the bounds twice over.
+#
+# The bounds assume the worst case for attraction, all neighbors of a
+# node on one cell, and for repulsion the nodes on distinct cells packed
+# around one cell, except for those placed on the same cell by the
+# initialization. The headroom covers the odd pair of nodes that
+# share a cell later.
+#
+import numpy as np
+import logging
+from math import sqrt
+
+from cdqforcelayout.qfields import repulsion_field, attraction_energies
+
+
+logger = logging.getLogger(__name__)
+
+# the integer types to choose from, narrowest first
+INTEGER_TYPES = (np.int16, np.int32, np.int64)
+
+# how many times the bounds must fit into the chosen type
+HEADROOM = 2
+
+
+def narrowest_type(low, high, headroom=HEADROOM):
+    # return the narrowest integer type that holds low and high headroom times over
+    for integer_type in INTEGER_TYPES:
+        info = np.iinfo(integer_type)
+        if low * headroom >= info.min and high * headroom <= info.max:
+            return np.dtype(integer_type)
+    raise ValueError("energies between " + str(low) + " and " + str(high) + " overflow int64")
+
+
+def fits(dtype, low, high):
+    # True when low and high are values of the integer type
+    info = np.iinfo(dtype)
+    return info.min <= low and high <= info.max
+
+
+def choose_precision(degree, dimension, r_radius=10, r_scale=10, a_radius=10, a_scale=5,
+                     center_attractor_scale=0.01, directed_flow_bias=None, stacked=1,
+                     depths=None, energies=None):
+    #
+    # return the precision report of a layout: the integer type and the
+    # bounds of the g_field, the scratchpad and the kernels, and the
+    # reason for the type of the g_field
+    #
+    # degree: the degree of every node
+    # dimension: the size of the g_field
+    # directed_flow_bias: the bias in directed flow mode, None otherwise
+    # stacked: the number of nodes placed on the same cell, e.g. all
+    #          of them when they start at the center
+    # depths, energies: the sum of the attraction energies around each
+    #          node and the energies of the attraction kernels, for
+    #          layouts that don't use the default steps_attraction
+    #
+    nodecount = len(degree)
+    center = int(dimension/2)
+    center_energy = int(center_attractor_scale * int(sqrt(2 * center**2)))
+
+    # the deepest sum of attractions a move adds to the scratchpad
+    if depths is None:
+        energies = attraction_energies(degree, a_radius, a_scale)
+        depths = np.asarray(degree, dtype=np.int64) * energies
+    hub = int(np.argmax(depths)) if nodecount > 0 else None
+    attraction = int(depths[hub]) if nodecount > 0 else 0
+
+    # the highest sum of repulsions on a cell
+    r_field = np.sort(repulsion_field(r_radius, r_scale, np.int64, center_spike=True).ravel())[::-1]
+    spike = int(r_field[0])
+    repulsion = int(r_field[:nodecount].sum()) + max(stacked - 1, 0) * spike
+
+    bias = 0 if directed_flow_bias is None else int(np.trunc(directed_flow_bias))
+    bias_low, bias_high = min(bias, 0), max(bias, 0)
+
+    scratchpad = (-attraction + bias_low, bias_high)
+    g_field = (-center_energy - attraction + bias_low, repulsion + bias_high)
+    kernels = (-max(int(energies.max()) if len(energies) > 0 else 0, center_energy), spike)
+
+    reason = ("attraction " + str(-attraction)
+              + ("" if hub is None else " of a node of degree " + str(int(degree[hub])))
+              + ", center attractor " + str(-center_energy)
+              + ", repulsion " + str(repulsion)
+              + ("" if stacked <= 1 else " with " + str(stacked) + " nodes on one cell")
+              + ("" if directed_flow_bias is None else ", bias " + str(bias)))
+    return {"g_field": narrowest_type(*g_field).name,
+            "scratchpad": narrowest_type(*scratchpad).name,
+            "kernels": narrowest_type(*kernels).name,
+            "g_field_range": list(g_field),
+            "scratchpad_range": list(scratchpad),
+            "kernel_range": list(kernels),
+            "reason": reason}
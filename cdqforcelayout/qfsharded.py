@@ -0,0 +1,384 @@
+#
+# Sharded layout
+#
+# The g_field is split into a grid of tiles, each owned by a shard in
+# its own worker process. A shard keeps the window of the g_field over
+# its tile and a halo around it, max(r_radius, a_radius) cells wide,
+# and moves the nodes on its tile, which may move into the halo. The
+# shards of a round all start from the same positions. Between rounds
+# the moves of every shard are sent to all shards, each updates the
+# repulsions of the moved nodes in its window, and the nodes are
+# handed to the shard whose tile they are on now.
+#
+# Within its window a shard's g_field is the same as the g_field of a
+# QFLayout. Attraction only comes from neighbors inside the window and
+# nodes of two shards may move to the same cell of a halo in the same
+# round, the repulsion separates them in the next rounds.
+#
+# Every shard holds the whole network, the g_field is what is split.
+#
+import numpy as np
+import logging
+import multiprocessing
+import random
+from math import sqrt
+from timeit import default_timer as timer
+
+from cdqforcelayout.qfnetwork import QFCompactNetwork
+from cdqforcelayout.qflayout import QFLayout, converged
+from cdqforcelayout.qfields import QFScratchpad, QFFieldPyramid, add_field, subtract_field
+from cdqforcelayout.qfields import make_field, add_attraction_tiled, add_field_at_positions
+from cdqforcelayout.qfields import attraction_function, attraction_energies
+from cdqforcelayout.qfprecision import choose_precision
+
+
+logger = logging.getLogger(__name__)
+
+# the QFLayout parameters a shard takes
+SHARD_PARAMETERS = ("r_radius", "a_radius", "r_scale", "a_scale", "center_attractor_scale",
+                    "dtype", "search", "search_margin", "search_radius", "attraction")
+
+
+def shard_grid(shards):
+    # return the rows and columns of the most square grid of shards tiles
+    rows = int(sqrt(shards))
+    while shards % rows != 0:
+        rows -= 1
+    return rows, shards // rows
+
+
+class QFShard(QFLayout):
+    #
+    # A QFLayout on a window of the g_field: the graph's positions are
+    # relative to the window, so the moves of QFLayout run unchanged.
+    # Only nodes inside the window may be moved. The parameters are
+    # those of QFLayout, directed flow is not supported.
+    #
+    # QFLayout.__init__ is not called, it would make a g_field for the
+    # whole network.
+    #
+    def __init__(self, graph, window, dimension, r_radius=10, a_radius=10, r_scale=10, a_scale=5,
+                 center_attractor_scale=0.01, dtype=np.int16, search="neighbors",
+                 search_margin=None, search_radius=None, attraction="steps"):
+        if search == "radius" and search_radius is None:
+            raise ValueError("search mode radius requires search_radius")
+        # the g_field, scratchpad and kernel types, chosen by
+        # QFShardedLayout for all shards
+        self.integer_type = self.scratchpad_type = self.kernel_type = np.dtype(dtype)
+        self.network = self.graph = graph
+        self.search = search
+        self.search_margin = r_radius if search_margin is None else search_margin
+        self.search_radius = search_radius
+        self.a_radius = a_radius
+        self._set_attraction(attraction, None)
+        self.directed_flow_mode = False
+        self.instrumentation = None
+        self.window = window
+        top_x, bottom_x, top_y, bottom_y = window
+        graph.x -= top_x
+        graph.y -= top_y
+
+        # the window of the g_field of the whole network
+        self.gameboard = make_field((bottom_x - top_x, bottom_y - top_y), dtype)
+        center = int(dimension/2)
+        add_attraction_tiled(self.gameboard, center - top_x, center - top_y,
+                             int(sqrt(2 * center**2)), center_attractor_scale)
+        self._make_kernels(r_radius, a_radius, r_scale, a_scale)
+        self.scratchpad = QFScratchpad(dtype)
+        add_field_at_positions(self.r_field, self.gameboard, graph.x, graph.y)
+        self.pyramid = QFFieldPyramid(self.gameboard) if search == "pyramid" else None
+
+    def _in_reach(self, indices, x=None, y=None):
+        # the nodes whose repulsion field reaches into the window
+        x = self.graph.x[indices] if x is None else x
+        y = self.graph.y[indices] if y is None else y
+        radius = self.r_field.shape[0] // 2
+        return indices[(x + radius >= 0) & (x - radius < self.gameboard.shape[0])
+                       & (y + radius >= 0) & (y - radius < self.gameboard.shape[1])]
+
+    #
+    # move the nodes with the indices, in that order, and return their
+    # positions on the g_field of the whole network and their energy
+    #
+    def move_nodes(self, indices):
+        for index in indices.tolist():
+            self.layout_one_node(index)
+        graph = self.graph
+        center = self.r_field.shape[0] // 2
+        energy = (self.gameboard[graph.x[indices], graph.y[indices]].astype(np.int64).sum()
+                  - len(indices) * int(self.r_field[center, center]))
+        return graph.x[indices] + self.window[0], graph.y[indices] + self.window[2], int(energy)
+
+    #
+    # move the nodes with the indices, moved by other shards, to the
+    # positions x, y on the g_field of the whole network
+    #
+    def update_nodes(self, indices, x, y):
+        graph = self.graph
+        x = x - self.window[0]
+        y = y - self.window[2]
+        moved = (graph.x[indices] != x) | (graph.y[indices] != y)
+        indices, x, y = indices[moved], x[moved], y[moved]
+        for index in self._in_reach(indices).tolist():
+            window = subtract_field(self.r_field, self.gameboard, int(graph.x[index]), int(graph.y[index]))
+            if self.pyramid is not None:
+                self.pyramid.update(window)
+        graph.x[indices] = x
+        graph.y[indices] = y
+        for index in self._in_reach(indices).tolist():
+            window = add_field(self.r_field, self.gameboard, int(graph.x[index]), int(graph.y[index]))
+            if self.pyramid is not None:
+                self.pyramid.update(window)
+
+
+def _run_shard(connection, network_arrays, shard_kwargs):
+    #
+    # runs in a worker process: make the shard, then move the nodes
+    # and update the moves of other shards as the coordinator asks
+    #
+    try:
+        graph = QFCompactNetwork(*network_arrays[:7])
+        graph.x, graph.y = network_arrays[7:]
+        shard = QFShard(graph, **shard_kwargs)
+        connection.send(None)
+        while True:
+            message = connection.recv()
+            if message[0] == "move":
+                connection.send(shard.move_nodes(message[1]))
+            elif message[0] == "update":
+                shard.update_nodes(*message[1:])
+            else:
+                break
+    except Exception as e:
+        connection.send(e)
+    finally:
+        connection.close()
+
+
+class _ProcessShard:
+    # a shard in a worker process, with the methods of QFShard
+    def __init__(self, context, network_arrays, shard_kwargs):
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=_run_shard, args=(child, network_arrays, shard_kwargs),
+                                       daemon=True)
+        self.process.start()
+        child.close()
+
+    def _receive(self):
+        result = self.connection.recv()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def started(self):
+        self._receive()
+
+    def move_nodes(self, indices):
+        self.connection.send(("move", indices))
+
+    def moved_nodes(self):
+        return self._receive()
+
+    def update_nodes(self, indices, x, y):
+        self.connection.send(("update", indices, x, y))
+
+    def stop(self):
+        try:
+            self.connection.send(("stop",))
+        except (BrokenPipeError, EOFError, OSError):
+            pass
+        self.process.join()
+        self.connection.close()
+
+
+class _LocalShard(QFShard):
+    # a shard in this process, with the methods of _ProcessShard
+    def started(self):
+        pass
+
+    def move_nodes(self, indices):
+        self._moved = QFShard.move_nodes(self, indices)
+
+    def moved_nodes(self):
+        return self._moved
+
+    def stop(self):
+        pass
+
+
+class QFShardedLayout:
+    #
+    # shards: the number of tiles of the g_field, each laid out by a
+    #         worker process
+    # processes: False runs the shards one after the other in this
+    #            process, with the same result
+    # sparsity, initialize_coordinates, seed: as for QFLayout,
+    #         initialize_coordinates is center, random, spiral or preset
+    # layout_kwargs: the QFLayout parameters in SHARD_PARAMETERS,
+    #                search defaults to neighbors. dtype "auto", the
+    #                default, picks one integer type for all shards that
+    #                holds the g_field, see self.precision
+    #
+    def __init__(self, qfnetwork, shards=4, processes=True, seed=None, sparsity=30,
+                 initialize_coordinates="spiral", **layout_kwargs):
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+        unknown = set(layout_kwargs) - set(SHARD_PARAMETERS)
+        if len(unknown) > 0:
+            raise ValueError("not supported by a sharded layout: " + str(sorted(unknown)))
+        layout_kwargs.setdefault("search", "neighbors")
+        if layout_kwargs["search"] == "global":
+            raise ValueError("sharded layout requires a windowed or pyramid search")
+        self.network = qfnetwork
+        self.graph = qfnetwork.to_compact()
+        self.processes = processes
+        self.layout_kwargs = layout_kwargs
+        self.dimension = QFLayout.board_dimension(self.graph.get_nodecount(), sparsity)
+        self.grid = shard_grid(shards)
+        self.halo = max(layout_kwargs.get("r_radius", 10), layout_kwargs.get("a_radius", 10))
+        self.round_stats = []
+        self.rounds_done = 0
+
+        dtype = layout_kwargs.get("dtype", "auto")
+        energies = attraction_energies(self.graph.degree, layout_kwargs.get("a_radius", 10),
+                                       layout_kwargs.get("a_scale", 5),
+                                       attraction_function(layout_kwargs.get("attraction", "steps")))
+        self.precision = choose_precision(self.graph.degree, self.dimension,
+                                          layout_kwargs.get("r_radius", 10), layout_kwargs.get("r_scale", 10),
+                                          layout_kwargs.get("a_radius", 10), layout_kwargs.get("a_scale", 5),
+                                          layout_kwargs.get("center_attractor_scale", 0.01),
+                                          stacked=(self.graph.get_nodecount()
+                                                   if initialize_coordinates == "center" else 1),
+                                          depths=self.graph.degree.astype(np.int64) * energies,
+                                          energies=energies)
+        if dtype == "auto":
+            layout_kwargs["dtype"] = np.dtype(self.precision["g_field"])
+        for field in ("g_field", "scratchpad", "kernels"):
+            self.precision[field] = np.dtype(layout_kwargs["dtype"]).name
+        self.precision["mode"] = "auto" if dtype == "auto" else "fixed"
+
+        center = int(self.dimension/2)
+        if initialize_coordinates == "center":
+            self.graph.place_nodes_at_center(center)
+        elif initialize_coordinates == "random":
+            self.graph.place_nodes_randomly(self.dimension, rng=None if seed is None else random.Random(seed))
+        elif initialize_coordinates == "spiral":
+            self.graph.place_nodes_in_a_spiral(center)
+        elif initialize_coordinates == "preset":
+            np.clip(self.graph.x, 0, self.dimension - 1, out=self.graph.x)
+            np.clip(self.graph.y, 0, self.dimension - 1, out=self.graph.y)
+        else:
+            raise ValueError("unknown initialize_coordinates for a sharded layout: "
+                             + str(initialize_coordinates))
+
+    @classmethod
+    def from_nicecx(cls, nicecx, **kwargs):
+        return cls(QFCompactNetwork.from_nicecx(nicecx), **kwargs)
+
+    @classmethod
+    def from_cx(cls, source, **kwargs):
+        return cls(QFCompactNetwork.from_cx(source), **kwargs)
+
+    def _tile_size(self):
+        rows, columns = self.grid
+        return -(-self.dimension // rows), -(-self.dimension // columns)
+
+    def shard_windows(self):
+        #
+        # return the windows of the shards: the tile of each,
+        # grown by the halo and clipped to the g_field
+        #
+        rows, columns = self.grid
+        tile_x, tile_y = self._tile_size()
+        windows = []
+        for row in range(rows):
+            for column in range(columns):
+                windows.append((max(row * tile_x - self.halo, 0),
+                                min((row + 1) * tile_x + self.halo, self.dimension),
+                                max(column * tile_y - self.halo, 0),
+                                min((column + 1) * tile_y + self.halo, self.dimension)))
+        return windows
+
+    def owners(self):
+        # return the shard of each node, the one whose tile it is on
+        tile_x, tile_y = self._tile_size()
+        return (self.graph.x // tile_x) * self.grid[1] + self.graph.y // tile_y
+
+    def _start_shards(self):
+        graph = self.graph
+        network_arrays = (graph.node_ids, graph.adj_indptr, graph.adj_indices, graph.in_indptr,
+                          graph.in_indices, graph.out_indptr, graph.out_indices)
+        shards = []
+        context = multiprocessing.get_context()
+        try:
+            for window in self.shard_windows():
+                shard_kwargs = dict(self.layout_kwargs, window=window, dimension=self.dimension)
+                if self.processes:
+                    shards.append(_ProcessShard(context, network_arrays + (graph.x, graph.y), shard_kwargs))
+                else:
+                    local = QFCompactNetwork(*network_arrays)
+                    local.x, local.y = graph.x.copy(), graph.y.copy()
+                    shards.append(_LocalShard(local, **shard_kwargs))
+            for shard in shards:
+                shard.started()
+        except Exception:
+            for shard in shards:
+                shard.stop()
+            raise
+        return shards
+
+    def _layout_round(self, shards, order, n):
+        graph = self.graph
+        start = timer()
+        owners = self.owners()[order]
+        indices = [order[owners == shard] for shard in range(len(shards))]
+        for shard, owned in zip(shards, indices):
+            shard.move_nodes(owned)
+        energy = 0
+        new_x = graph.x.copy()
+        new_y = graph.y.copy()
+        for shard, owned in zip(shards, indices):
+            x, y, shard_energy = shard.moved_nodes()
+            new_x[owned] = x
+            new_y[owned] = y
+            energy += shard_energy
+        # the halo exchange
+        dx = new_x.astype(np.int64) - graph.x
+        dy = new_y.astype(np.int64) - graph.y
+        moved = np.flatnonzero(dx | dy)
+        for shard in shards:
+            shard.update_nodes(moved, new_x[moved], new_y[moved])
+        graph.x[:] = new_x
+        graph.y[:] = new_y
+        return {"round": n,
+                "moved": len(moved),
+                "displacement": float(np.hypot(dx, dy).sum()),
+                "energy": int(energy),
+                "seconds": timer() - start}
+
+    #
+    # rounds, tolerance, patience: see QFLayout.do_layout, the energy
+    # is the sum of the energies of the shards after their moves
+    #
+    def do_layout(self, rounds=1, node_size=40, tolerance=None, patience=3):
+        order = self.graph.get_sorted_indices()
+        self.round_stats = []
+        shards = self._start_shards()
+        try:
+            for n in range(0, rounds):
+                stats = self._layout_round(shards, order, n)
+                self.round_stats.append(stats)
+                self.rounds_done += 1
+                logger.debug(str(stats))
+                if tolerance is not None and converged(self.round_stats, tolerance, patience):
+                    logger.debug('converged after round ' + str(n))
+                    break
+        finally:
+            for shard in shards:
+                shard.stop()
+        if self.network is not self.graph:
+            for node, x, y in zip(self.network.node_dict.values(), self.graph.x.tolist(),
+                                  self.graph.y.tolist()):
+                node["x"] = x
+                node["y"] = y
+        return self.graph.get_cx_layout(node_size=node_size)
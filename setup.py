@@ -19,12 +19,21 @@ with open(os.path.join('cdqforcelayout', '__init__.py')) as ver_file:
             version = re.sub("'", "", line[line.index("'"):])
 
 requirements = [
-    'ndex2>=3.3.0,<4.0.0',
     'numpy',
+    'ijson',
 ]
 
+# NiceCXNetwork objects from ndex2 are accepted but not needed,
+# CX files are read without ndex2. Numba compiles the layout rounds
+# when it is installed
+extras_requirements = {
+    'ndex2': ['ndex2>=3.3.0,<4.0.0'],
+    'numba': ['numba']
+}
+
 test_requirements = [
-    'mock'
+    'mock',
+    'ndex2>=3.3.0,<4.0.0'
 ]
 
 setup(
@@ -42,6 +51,7 @@ setup(
                  'cdqforcelayout'},
     include_package_data=True,
     install_requires=requirements,
+    extras_require=extras_requirements,
     license="BSD license",
     zip_safe=False,
     keywords='Network Layout',
@@ -57,7 +67,8 @@ setup(
         'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
     ],
-    scripts=['cdqforcelayout/cdqforcelayoutcmd.py'],
+    scripts=['cdqforcelayout/cdqforcelayoutcmd.py',
+             'cdqforcelayout/cdqforcelayoutservice.py'],
     test_suite='tests',
     tests_require=test_requirements
 )
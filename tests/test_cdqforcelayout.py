@@ -12,6 +12,7 @@ import os
 import sys
 import unittest
 import io
+import gzip
 import tempfile
 import shutil
 import json
@@ -92,6 +93,176 @@ class TestCdqforceLayout(unittest.TestCase):
         finally:
             shutil.rmtree(temp_dir)
 
+    def test_runlayout_from_cartesian_layout(self):
+        nectin = os.path.join(os.path.dirname(__file__), 'data',
+                              'test_nectin_adhesion.cx')
+        args = cdqforcelayoutcmd._parse_arguments('desc',
+                                                  [nectin, '--rounds', '0',
+                                                   '--initialize_coordinates',
+                                                   'layout'])
+        o_stream = io.StringIO()
+        res = cdqforcelayoutcmd.run_layout(args, out_stream=o_stream,
+                                           err_stream=io.StringIO())
+        self.assertEqual(0, res)
+        with open(nectin) as f:
+            aspect = [aspect for aspect in json.load(f)
+                      if 'cartesianLayout' in aspect][0]['cartesianLayout']
+        # without rounds the layout of the input comes back
+        self.assertEqual(sorted((entry['node'], entry['x'], entry['y'])
+                                for entry in aspect),
+                         sorted((entry['node'], entry['x'], entry['y'])
+                                for entry in json.loads(o_stream.getvalue())))
+
+    def test_runlayout_on_gzipped_input(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            nectin = os.path.join(os.path.dirname(__file__), 'data',
+                                  'test_nectin_adhesion.cx')
+            gzipped = os.path.join(temp_dir, 'nectin.cx.gz')
+            with open(nectin, 'rb') as f, gzip.open(gzipped, 'wb') as g:
+                g.write(f.read())
+            args = cdqforcelayoutcmd._parse_arguments('desc', [gzipped])
+            o_stream = io.StringIO()
+            e_stream = io.StringIO()
+            res = cdqforcelayoutcmd.run_layout(args, out_stream=o_stream,
+                                               err_stream=e_stream)
+            self.assertEqual(0, res)
+            self.assertEqual(33, len(json.loads(o_stream.getvalue())))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_runlayout_on_edge_list(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            edge_list = os.path.join(temp_dir, 'edges.tsv')
+            with open(edge_list, 'w') as f:
+                f.write('1\t2\n2\t3\n3\t1\n')
+            args = cdqforcelayoutcmd._parse_arguments('desc', [edge_list])
+            o_stream = io.StringIO()
+            e_stream = io.StringIO()
+            res = cdqforcelayoutcmd.run_layout(args, out_stream=o_stream,
+                                               err_stream=e_stream)
+            self.assertEqual(0, res)
+            self.assertEqual([1, 2, 3], [entry['node'] for entry
+                                         in json.loads(o_stream.getvalue())])
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_runbatch_survives_a_bad_file(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            data_dir = os.path.join(os.path.dirname(__file__), 'data')
+            bad_file = os.path.join(temp_dir, 'bad.cx')
+            with open(bad_file, 'w') as f:
+                f.write('[{"edges": [{"@id": 0, "s": 1}]}]')
+            manifest = os.path.join(temp_dir, 'manifest.txt')
+            with open(manifest, 'w') as f:
+                f.write('# nectin and a file without edge targets\n')
+                f.write(os.path.join(data_dir, 'test_nectin_adhesion.cx') + '\n')
+                f.write('\nbad.cx\n')
+            output_dir = os.path.join(temp_dir, 'out')
+            args = cdqforcelayoutcmd._parse_arguments('desc',
+                                                      [manifest, '--batch',
+                                                       '--output_dir', output_dir,
+                                                       '--processes', '2',
+                                                       '--rounds', '2'])
+            o_stream = io.StringIO()
+            e_stream = io.StringIO()
+            res = cdqforcelayoutcmd.run_layout(args, out_stream=o_stream,
+                                               err_stream=e_stream)
+            self.assertEqual(5, res)
+            summary = json.loads(o_stream.getvalue())
+            self.assertEqual(2, summary['files'])
+            self.assertEqual(1, summary['failed'])
+            self.assertEqual(['ok', 'failed'],
+                             [result['status'] for result in summary['results']])
+            self.assertTrue('bad.cx failed' in e_stream.getvalue())
+            with open(os.path.join(output_dir, 'test_nectin_adhesion.json')) as f:
+                self.assertEqual(33, len(json.load(f)))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_runbatch_requires_output_dir(self):
+        args = cdqforcelayoutcmd._parse_arguments('desc', ['x', '--batch'])
+        e_stream = io.StringIO()
+        res = cdqforcelayoutcmd.run_layout(args, out_stream=io.StringIO(),
+                                           err_stream=e_stream)
+        self.assertEqual(3, res)
+
+    def test_runlayout_writes_round_stats(self):
+        nectin = os.path.join(os.path.dirname(__file__), 'data',
+                              'test_nectin_adhesion.cx')
+        args = cdqforcelayoutcmd._parse_arguments('desc',
+                                                  [nectin, '--rounds', '50',
+                                                   '--tolerance', '0.01',
+                                                   '--round_stats', '-'])
+        o_stream = io.StringIO()
+        e_stream = io.StringIO()
+        res = cdqforcelayoutcmd.run_layout(args, out_stream=o_stream,
+                                           err_stream=e_stream)
+        self.assertEqual(0, res)
+        round_stats = json.loads(e_stream.getvalue())
+        self.assertTrue(0 < len(round_stats) < 50)
+        self.assertEqual(['displacement', 'energy', 'moved', 'round',
+                          'seconds'],
+                         sorted(round_stats[0].keys()))
+        self.assertEqual(33, len(json.loads(o_stream.getvalue())))
+
+    def test_runlayout_resumes_from_checkpoint(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            nectin = os.path.join(os.path.dirname(__file__), 'data',
+                                  'test_nectin_adhesion.cx')
+            checkpoint = os.path.join(temp_dir, 'layout.npz')
+            outputs = []
+            for rounds in ['2', '5']:
+                args = cdqforcelayoutcmd._parse_arguments('desc',
+                                                          [nectin, '--rounds', rounds,
+                                                           '--checkpoint', checkpoint])
+                o_stream = io.StringIO()
+                res = cdqforcelayoutcmd.run_layout(args, out_stream=o_stream,
+                                                   err_stream=io.StringIO())
+                self.assertEqual(0, res)
+                outputs.append(json.loads(o_stream.getvalue()))
+
+            args = cdqforcelayoutcmd._parse_arguments('desc',
+                                                      [nectin, '--rounds', '5'])
+            o_stream = io.StringIO()
+            res = cdqforcelayoutcmd.run_layout(args, out_stream=o_stream,
+                                               err_stream=io.StringIO())
+            self.assertEqual(0, res)
+            self.assertEqual(json.loads(o_stream.getvalue()), outputs[1])
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_runlayout_with_radius_search(self):
+        nectin = os.path.join(os.path.dirname(__file__), 'data',
+                              'test_nectin_adhesion.cx')
+        args = cdqforcelayoutcmd._parse_arguments('desc',
+                                                  [nectin, '--search', 'radius',
+                                                   '--search_radius', '8',
+                                                   '--search_margin', '3'])
+        layout_kwargs = cdqforcelayoutcmd._get_layout_kwargs(args)
+        self.assertEqual(8, layout_kwargs['search_radius'])
+        self.assertEqual(3, layout_kwargs['search_margin'])
+        o_stream = io.StringIO()
+        res = cdqforcelayoutcmd.run_layout(args, out_stream=o_stream,
+                                           err_stream=io.StringIO())
+        self.assertEqual(0, res)
+        self.assertEqual(33, len(json.loads(o_stream.getvalue())))
+
+    def test_runlayout_with_shards(self):
+        nectin = os.path.join(os.path.dirname(__file__), 'data',
+                              'test_nectin_adhesion.cx')
+        args = cdqforcelayoutcmd._parse_arguments('desc',
+                                                  [nectin, '--shards', '2',
+                                                   '--search', 'neighbors'])
+        o_stream = io.StringIO()
+        res = cdqforcelayoutcmd.run_layout(args, out_stream=o_stream,
+                                           err_stream=io.StringIO())
+        self.assertEqual(0, res)
+        self.assertEqual(33, len(json.loads(o_stream.getvalue())))
+
 
 if __name__ == '__main__':
     sys.exit(unittest.main())
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_cdqforcelayoutservice
+----------------------------------
+
+Tests for `cdqforcelayoutservice` module.
+"""
+
+import os
+import sys
+import json
+import signal
+import threading
+import time
+import unittest
+import http.client
+from concurrent.futures import Future
+from unittest import mock
+import urllib.error
+import urllib.request
+
+from cdqforcelayout import cdqforcelayoutservice
+
+
+class TestCdqforceLayoutService(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.service = cdqforcelayoutservice.QFLayoutService(workers=1, max_queue=1,
+                                                            rounds=2)
+        cls.server = cdqforcelayoutservice.make_server(cls.service, port=0)
+        cls.url = 'http://127.0.0.1:' + str(cls.server.server_address[1])
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.thread.join()
+        cls.service.shutdown()
+
+    def _post(self, path, body, content_type='application/json'):
+        request = urllib.request.Request(self.url + path, data=body,
+                                         headers={'Content-Type': content_type})
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    def test_layout_of_cx(self):
+        nectin = os.path.join(os.path.dirname(__file__), 'data',
+                              'test_nectin_adhesion.cx')
+        with open(nectin, 'rb') as f:
+            payload = f.read()
+        for query in ('rounds=1&search=neighbors&search_margin=3',
+                      'rounds=1&search=radius&search_radius=8'):
+            status, cx_layout = self._post('/layout?' + query, payload)
+            self.assertEqual(200, status)
+            self.assertEqual(33, len(cx_layout))
+
+    def test_layout_of_edge_list(self):
+        status, cx_layout = self._post('/layout', b'# star\n0 1\n0 2\n0 3\n',
+                                       content_type='text/plain')
+        self.assertEqual(200, status)
+        self.assertEqual([0, 1, 2, 3], [entry['node'] for entry in cx_layout])
+
+    def test_bad_requests(self):
+        self.assertEqual(400, self._post('/layout?colour=red', b'0 1',
+                                         content_type='text/plain')[0])
+        self.assertEqual(400, self._post('/layout', b'not json')[0])
+        self.assertEqual(404, self._post('/elsewhere', b'')[0])
+        with urllib.request.urlopen(self.url + '/health') as response:
+            self.assertEqual({'status': 'ok'}, json.loads(response.read()))
+
+    def test_limits(self):
+        for query in ('rounds=100000000', 'a_radius=1000', 'r_radius=101'):
+            status, response = self._post('/layout?' + query, b'0 1', content_type='text/plain')
+            self.assertEqual(400, status)
+            self.assertIn('over the limit', response['error'])
+        self.assertEqual(200, self._post('/layout?rounds=1000&r_radius=100', b'0 1',
+                                         content_type='text/plain')[0])
+        # 4 nodes with sparsity 100 have a g_field of 41 x 41 cells
+        with mock.patch.object(self.service, 'max_field', 41 * 41 - 1):
+            status, response = self._post('/layout?sparsity=100', b'0 1\n0 2\n0 3\n',
+                                          content_type='text/plain')
+        self.assertEqual(400, status)
+        self.assertIn('g_field of 1681 cells', response['error'])
+
+    def test_full_queue_is_refused(self):
+        service = self.service
+        # both slots, one worker and one queued request, are taken
+        self.assertTrue(service._slots.acquire(blocking=False))
+        self.assertTrue(service._slots.acquire(blocking=False))
+        try:
+            self.assertEqual(503, service.layout(b'0 1', 'text/plain')[0])
+        finally:
+            service._slots.release()
+            service._slots.release()
+
+    def test_bad_content_length(self):
+        for length, status in (('ten', 400), ('-5', 400), (None, 411)):
+            connection = http.client.HTTPConnection('127.0.0.1', self.server.server_address[1])
+            try:
+                connection.putrequest('POST', '/layout')
+                if length is not None:
+                    connection.putheader('Content-Length', length)
+                connection.endheaders()
+                response = connection.getresponse()
+                self.assertEqual(status, response.status)
+                self.assertIn('error', json.loads(response.read()))
+            finally:
+                connection.close()
+
+    def test_server_failure_is_500(self):
+        service = self.service
+        failed = Future()
+        failed.set_exception(RuntimeError('worker died'))
+        with mock.patch.object(service._executor, 'submit', return_value=failed):
+            self.assertEqual(500, service.layout(b'0 1', 'text/plain')[0])
+        # the slot of the failed layout is free again
+        self.assertTrue(service._slots.acquire(blocking=False))
+        self.assertTrue(service._slots.acquire(blocking=False))
+        service._slots.release()
+        service._slots.release()
+
+    def test_timed_out_layout_keeps_its_slot(self):
+        service = cdqforcelayoutservice.QFLayoutService(workers=1, max_queue=0,
+                                                        timeout=0.01, rounds=2)
+        try:
+            edges = ''.join(str(node) + ' ' + str(node + 1) + '\n' for node in range(2000))
+            status = service.layout(edges.encode(), 'text/plain', 'rounds=50')[0]
+            self.assertEqual(504, status)
+            # the layout is still running in the worker
+            self.assertEqual(503, service.layout(b'0 1', 'text/plain')[0])
+            deadline = time.time() + 60
+            while not service._slots.acquire(blocking=False):
+                self.assertTrue(time.time() < deadline)
+                time.sleep(0.05)
+            service._slots.release()
+        finally:
+            service.shutdown()
+
+    def test_shutdown_cancels_waiting_layouts(self):
+        service = cdqforcelayoutservice.QFLayoutService(workers=1, max_queue=5, rounds=2)
+        edges = ''.join(str(node) + ' ' + str(node + 1) + '\n' for node in range(2000))
+        statuses = []
+        threads = [threading.Thread(target=lambda: service.layout(edges.encode(), 'text/plain',
+                                                                  'rounds=20'))]
+        threads += [threading.Thread(target=lambda: statuses.append(
+            service.layout(b'0 1', 'text/plain')[0])) for waiting in range(4)]
+        for count, thread in enumerate(threads, 1):
+            thread.start()
+            while len(service._pending) < count:
+                time.sleep(0.01)
+        service.shutdown()
+        for thread in threads:
+            thread.join()
+        # the pool takes a few layouts ahead of its workers,
+        # those behind them are cancelled
+        self.assertIn(503, statuses)
+        self.assertTrue(set(statuses) <= set([200, 503]))
+
+    def test_dead_worker_is_replaced(self):
+        service = cdqforcelayoutservice.QFLayoutService(workers=1, max_queue=1, rounds=1)
+        server = cdqforcelayoutservice.make_server(service, port=0)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        health = 'http://127.0.0.1:' + str(server.server_address[1]) + '/health'
+        try:
+            # the request that meets the dead worker fails, the next one
+            # gets a new pool
+            os.kill(service._executor.submit(os.getpid).result(), signal.SIGKILL)
+            self.assertIn(service.layout(b'0 1', 'text/plain')[0], (500, 503))
+            self.assertEqual(200, service.layout(b'0 1', 'text/plain')[0])
+
+            # /health reports the broken pool and replaces it
+            os.kill(service._executor.submit(os.getpid).result(), signal.SIGKILL)
+            deadline = time.time() + 30
+            while True:
+                try:
+                    with urllib.request.urlopen(health) as response:
+                        self.assertEqual({'status': 'ok'}, json.loads(response.read()))
+                except urllib.error.HTTPError as e:
+                    self.assertEqual(503, e.code)
+                    self.assertEqual({'status': 'broken'}, json.loads(e.read()))
+                    break
+                self.assertTrue(time.time() < deadline)
+                time.sleep(0.05)
+            status, cx_layout = service.layout(b'0 1', 'text/plain')
+            self.assertEqual(200, status)
+            self.assertEqual([0, 1], [entry['node'] for entry in cx_layout])
+            with urllib.request.urlopen(health) as response:
+                self.assertEqual({'status': 'ok'}, json.loads(response.read()))
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+            service.shutdown()
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_cxreader
+----------------------------------
+
+Tests for `cxreader` module.
+"""
+
+import gzip
+import io
+import json
+import os
+import sys
+import unittest
+
+import ndex2
+
+from cdqforcelayout.cxreader import read_cx_edges
+from cdqforcelayout.qfnetwork import QFCompactNetwork, nicecx_edge_array
+
+
+NECTIN = os.path.join(os.path.dirname(__file__), 'data', 'test_nectin_adhesion.cx')
+
+
+def _cx_bytes(nodes, edges):
+    # a minimal CX document with an aspect the reader has to skip
+    return json.dumps([{"numberVerification": [{"longNumber": 281474976710655}]},
+                       {"nodes": [{"@id": node, "n": str(node)} for node in nodes]},
+                       {"edges": [{"@id": i, "t": t, "s": s, "i": "x"}
+                                  for i, (s, t) in enumerate(edges)]},
+                       {"nodeAttributes": [{"po": 0, "n": "a", "v": [1, {"b": 2}]}]},
+                       {"status": [{"error": "", "success": True}]}]).encode()
+
+
+class TestCXReader(unittest.TestCase):
+
+    def test_edges_match_nicecx(self):
+        node_ids, edge_array = read_cx_edges(NECTIN)
+        nicecx = ndex2.create_nice_cx_from_file(NECTIN)
+        self.assertEqual(nicecx_edge_array(nicecx).tolist(), edge_array.tolist())
+        self.assertEqual(sorted(node_id for node_id, node in nicecx.get_nodes()),
+                         sorted(node_ids.tolist()))
+
+    def test_gzip_and_file_objects(self):
+        document = _cx_bytes([1, 2, 3], [(1, 2), (3, 2)])
+        for stream in (io.BytesIO(document), io.BytesIO(gzip.compress(document))):
+            node_ids, edge_array = read_cx_edges(stream)
+            self.assertEqual([1, 2, 3], node_ids.tolist())
+            self.assertEqual([[1, 2], [3, 2]], edge_array.tolist())
+
+    def test_edge_without_target(self):
+        document = json.dumps([{"edges": [{"@id": 0, "s": 1}]}]).encode()
+        with self.assertRaises(ValueError):
+            read_cx_edges(io.BytesIO(document))
+
+    def test_network_keeps_isolated_nodes(self):
+        network = QFCompactNetwork.from_cx(io.BytesIO(_cx_bytes([7, 1, 2, 3], [(1, 2), (2, 3)])))
+        self.assertEqual([1, 2, 3, 7], network.node_ids.tolist())
+        self.assertEqual([1, 2, 1, 0], network.degree.tolist())
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
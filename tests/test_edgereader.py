@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_edgereader
+----------------------------------
+
+Tests for `edgereader` module.
+"""
+
+import gzip
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from array import array
+
+import numpy as np
+
+from cdqforcelayout.edgereader import read_edge_list, read_npz_edges
+from cdqforcelayout.qfnetwork import QFCompactNetwork
+
+
+class _COOMatrix:
+    # stands in for a SciPy sparse matrix
+    def __init__(self, shape, row, col):
+        self.shape = shape
+        self.row = np.asarray(row)
+        self.col = np.asarray(col)
+
+    def tocoo(self):
+        return self
+
+
+class TestEdgeReader(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _path(self, name):
+        return os.path.join(self.temp_dir, name)
+
+    def test_edge_lists(self):
+        with open(self._path('names.tsv'), 'w') as f:
+            f.write('# a comment\nAKT1\tMTOR\t0.9\nMTOR\tRPTOR\t0.5\n')
+        self.assertEqual([['AKT1', 'MTOR'], ['MTOR', 'RPTOR']],
+                         read_edge_list(self._path('names.tsv')).tolist())
+        with gzip.open(self._path('ids.csv.gz'), 'wt') as f:
+            f.write('source,target\n3,4\n4,5\n')
+        edges = read_edge_list(self._path('ids.csv.gz'), skip_rows=1)
+        self.assertEqual(np.int64, edges.dtype)
+        self.assertEqual([[3, 4], [4, 5]], edges.tolist())
+
+    def test_header_row(self):
+        with open(self._path('headed.tsv'), 'w') as f:
+            f.write('# edges\nsource\ttarget\n0\t1\n1\t2\n')
+        edges = read_edge_list(self._path('headed.tsv'))
+        self.assertEqual(np.int64, edges.dtype)
+        self.assertEqual([[0, 1], [1, 2]], edges.tolist())
+        self.assertEqual([['source', 'target'], ['0', '1'], ['1', '2']],
+                         read_edge_list(self._path('headed.tsv'), header=False).tolist())
+        edges = read_edge_list(io.BytesIO(b'source target\n3 4\n'), delimiter=None)
+        self.assertEqual([[3, 4]], edges.tolist())
+
+        # a header over string ids is only skipped when asked for
+        with open(self._path('headed_names.tsv'), 'w') as f:
+            f.write('source\ttarget\nAKT1\tMTOR\n')
+        self.assertEqual([['source', 'target'], ['AKT1', 'MTOR']],
+                         read_edge_list(self._path('headed_names.tsv')).tolist())
+        self.assertEqual([['AKT1', 'MTOR']],
+                         read_edge_list(self._path('headed_names.tsv'), header=True).tolist())
+
+    def test_string_node_ids_in_layout(self):
+        with open(self._path('names.txt'), 'w') as f:
+            f.write('AKT1 MTOR\nMTOR RPTOR\n')
+        network = QFCompactNetwork.from_edge_list(self._path('names.txt'))
+        self.assertEqual(['AKT1', 'MTOR', 'RPTOR'],
+                         [entry['node'] for entry in network.get_cx_layout()])
+
+    def test_npz_is_memory_mapped(self):
+        edges = np.array([[1, 2], [2, 3], [3, 1]])
+        np.savez(self._path('edges.npz'), edges=edges, weights=np.ones(3))
+        read = read_npz_edges(self._path('edges.npz'))
+        self.assertIsInstance(read, np.memmap)
+        self.assertEqual(edges.tolist(), read.tolist())
+        np.savez_compressed(self._path('compressed.npz'), sources=edges[:, 0],
+                            targets=edges[:, 1])
+        self.assertEqual(edges.tolist(), read_npz_edges(self._path('compressed.npz')).tolist())
+        with self.assertRaises(ValueError):
+            np.savez(self._path('ambiguous.npz'), a=edges, b=edges)
+            read_npz_edges(self._path('ambiguous.npz'))
+
+    def test_sparse_matrix_npz(self):
+        # the layout of scipy.sparse.save_npz for a csr matrix
+        np.savez(self._path('sparse.npz'), format=np.array(b'csr'), shape=np.array([4, 4]),
+                 indptr=np.array([0, 2, 2, 3, 3]), indices=np.array([1, 2, 2]),
+                 data=np.ones(3))
+        network = QFCompactNetwork.from_npz(self._path('sparse.npz'), self_loops='drop')
+        self.assertEqual([0, 1, 2, 3], network.node_ids.tolist())
+        self.assertEqual([2, 1, 1, 0], network.degree.tolist())
+
+    def test_sparse_matrix_and_buffer(self):
+        network = QFCompactNetwork.from_sparse(_COOMatrix((3, 3), [0, 1, 2], [1, 2, 2]),
+                                               self_loops='flag')
+        self.assertEqual([False, False, True], network.self_loops.tolist())
+        with self.assertRaises(ValueError):
+            QFCompactNetwork.from_sparse(_COOMatrix((3, 2), [0], [1]))
+        # a flat buffer of source, target pairs
+        network = QFCompactNetwork.from_edge_array(memoryview(array('q', [5, 6, 6, 7])))
+        self.assertEqual([5, 6, 7], network.node_ids.tolist())
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_qfcomponents
+----------------------------------
+
+Tests for `qfcomponents` module.
+"""
+
+import sys
+import unittest
+
+import numpy as np
+
+from cdqforcelayout.qfnetwork import QFNetwork, QFCompactNetwork
+from cdqforcelayout.qfcomponents import QFComponentLayout, connected_components, \
+    split_components, pack_rectangles
+
+
+# a triangle, a chain of four and a single edge, interleaved
+EDGES = np.array([[1, 2], [10, 11], [2, 3], [20, 21], [11, 12], [3, 1], [12, 13]])
+
+
+class TestQFComponents(unittest.TestCase):
+
+    def test_connected_components(self):
+        network = QFCompactNetwork.from_edge_array(EDGES)
+        labels = connected_components(network)
+        by_id = dict(zip(network.node_ids.tolist(), labels.tolist()))
+        self.assertEqual([0, 0, 0], [by_id[1], by_id[2], by_id[3]])
+        self.assertEqual([1, 1, 1, 1], [by_id[10], by_id[11], by_id[12], by_id[13]])
+        self.assertEqual([2, 2], [by_id[20], by_id[21]])
+
+    def test_split_components_largest_first(self):
+        network = QFCompactNetwork.from_edge_array(EDGES)
+        components = split_components(network)
+        self.assertEqual([[10, 11, 12, 13], [1, 2, 3], [20, 21]],
+                         [node_ids.tolist() for indices, node_ids, sources, targets in components])
+        indices, node_ids, sources, targets = components[0]
+        self.assertEqual([(0, 1), (1, 2), (2, 3)], sorted(zip(sources.tolist(), targets.tolist())))
+
+    def test_pack_rectangles_do_not_overlap(self):
+        widths = [5, 3, 8, 2, 2, 6]
+        heights = [4, 7, 2, 2, 5, 3]
+        offset_x, offset_y = pack_rectangles(widths, heights, padding=1)
+        board = np.zeros((40, 40), dtype=int)
+        for index in range(len(widths)):
+            board[offset_x[index]:offset_x[index] + widths[index],
+                  offset_y[index]:offset_y[index] + heights[index]] += 1
+        self.assertEqual(1, board.max())
+
+    def test_component_layout(self):
+        network = QFNetwork(EDGES)
+        cx_layout = QFComponentLayout(network, processes=2).do_layout(rounds=2, node_size=1)
+        self.assertEqual(9, len(cx_layout))
+        self.assertEqual(9, len(set((entry["x"], entry["y"]) for entry in cx_layout)))
+        entry = [entry for entry in cx_layout if entry["node"] == 12][0]
+        self.assertEqual(entry["y"], network.node_dict[12]["x"])
+
+    def test_empty_network(self):
+        layout = QFComponentLayout(QFCompactNetwork.from_index_edges([], [], []), processes=1)
+        self.assertEqual([], layout.do_layout(rounds=2))
+        self.assertEqual([], layout.round_stats)
+        self.assertEqual([], QFComponentLayout(QFNetwork([])).do_layout())
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
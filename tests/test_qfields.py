@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_qfields
+----------------------------------
+
+Tests for `qfields` module.
+"""
+
+import sys
+import unittest
+from math import sqrt
+
+import numpy as np
+
+from cdqforcelayout import qfields
+
+
+def _loop_attraction_field(radius, scale, dtype):
+    # the original element by element construction
+    dimension = (2*radius)+1
+    ef = np.zeros((dimension, dimension), dtype=dtype)
+    energy = int(scale * radius)
+    slope = energy/radius
+    for x in range(0, dimension):
+        for y in range(0, dimension):
+            distance = sqrt((radius - x)**2 + (radius - y)**2)
+            ef[x, y] = -1 * energy if distance == 0 else min(0, int((slope * distance) - energy))
+    return ef
+
+
+def _loop_repulsion_field(radius, scale, dtype, center_spike=False):
+    dimension = (2*radius)+1
+    ef = np.zeros((dimension, dimension), dtype=dtype)
+    energy = int(scale * radius)
+    center_energy = 1000 if center_spike else energy
+    for x in range(0, dimension):
+        for y in range(0, dimension):
+            distance = sqrt((radius - x)**2 + (radius - y)**2)
+            ef[x, y] = center_energy if distance == 0 else int(energy / distance**2) + int(0.1 * (energy / distance))
+    return ef
+
+
+class TestQFields(unittest.TestCase):
+
+    def tearDown(self):
+        qfields.clear_kernel_cache()
+
+    def test_attraction_field_matches_loop(self):
+        for radius in (1, 3, 10, 40):
+            for scale in (0.02, 1, 5, 25, 50):
+                self.assertTrue(np.array_equal(_loop_attraction_field(radius, scale, np.int32),
+                                               qfields.attraction_field(radius, scale, np.int32)))
+
+    def test_repulsion_field_matches_loop(self):
+        for radius in (1, 3, 10, 25):
+            for scale in (1, 7, 10):
+                for spike in (True, False):
+                    self.assertTrue(np.array_equal(_loop_repulsion_field(radius, scale, np.int32, spike),
+                                                   qfields.repulsion_field(radius, scale, np.int32,
+                                                                           center_spike=spike)))
+
+    def test_bias_fields(self):
+        sb_field, tb_field = qfields.bias_fields((5, 4), np.int16, "top", 10)
+        self.assertEqual([10, 8, 6, 4, 2], list(sb_field[:, 0]))
+        self.assertEqual([0, 2, 4, 6, 8], list(tb_field[:, 3]))
+        sb_field, tb_field = qfields.bias_fields((5, 4), np.int16, "right", 10)
+        self.assertEqual([0, 2, 5, 7], list(sb_field[2]))
+        self.assertEqual([10, 7, 5, 2], list(tb_field[2]))
+        # one row is stored for the whole field
+        self.assertEqual(4 * 2, sb_field.base.nbytes)
+
+    def test_kernel_cache_reuses_kernels(self):
+        first = qfields.get_kernel("attraction", 10, 5, np.int16)
+        self.assertIs(first, qfields.get_kernel("attraction", 10, 5, np.int16))
+        self.assertIsNot(first, qfields.get_kernel("attraction", 10, 5, np.int32))
+        self.assertFalse(first.flags.writeable)
+        with self.assertRaises(ValueError):
+            qfields.get_kernel("gravity", 10, 5, np.int16)
+
+    def test_kernel_cache_evicts_least_recently_used(self):
+        first = qfields.get_kernel("repulsion", 1, 1, np.int16, spike=True)
+        for radius in range(2, qfields.KERNEL_CACHE_SIZE + 1):
+            qfields.get_kernel("repulsion", radius, 1, np.int16)
+        # touching the first kernel makes radius 2 the oldest entry
+        self.assertIs(first, qfields.get_kernel("repulsion", 1, 1, np.int16, spike=True))
+        qfields.get_kernel("repulsion", qfields.KERNEL_CACHE_SIZE + 1, 1, np.int16)
+        self.assertEqual(qfields.KERNEL_CACHE_SIZE, len(qfields._kernel_cache))
+        self.assertIs(first, qfields.get_kernel("repulsion", 1, 1, np.int16, spike=True))
+        self.assertNotIn(("repulsion", 2, 2, np.dtype(np.int16).str, False), qfields._kernel_cache)
+
+    def test_kernel_cache_shares_kernels_of_equal_energy(self):
+        first = qfields.get_kernel("attraction", 10, 5, np.int16)
+        # int(5.04 * 10) is 50 as well
+        self.assertIs(first, qfields.get_kernel("attraction", 10, 5.04, np.int16))
+        self.assertIs(first, qfields.get_attraction_kernel(10, 50, np.int16))
+        self.assertTrue(np.array_equal(qfields.attraction_field(10, 5.04, np.int16), first))
+
+    def test_kernel_cache_is_bounded_by_memory(self):
+        limit = qfields.KERNEL_CACHE_BYTES
+        try:
+            qfields.KERNEL_CACHE_BYTES = 3 * 21 * 21 * 8
+            for energy in range(1, 6):
+                qfields.get_attraction_kernel(10, energy, np.int64)
+            self.assertEqual((3, 3 * 21 * 21 * 8), qfields.kernel_cache_info())
+            self.assertNotIn(("attraction", 10, 2, np.dtype(np.int64).str, False), qfields._kernel_cache)
+            # a kernel over the cap is still returned and cached on its own
+            qfields.get_attraction_kernel(20, 1, np.int64)
+            self.assertEqual((1, 41 * 41 * 8), qfields.kernel_cache_info())
+        finally:
+            qfields.KERNEL_CACHE_BYTES = limit
+
+    def test_smooth_attraction_energies(self):
+        self.assertEqual([500, 353, 250, 50],
+                         qfields.attraction_energies([1, 2, 4, 100], 10, 5,
+                                                     qfields.inverse_sqrt_attraction).tolist())
+        self.assertEqual([250, 25],
+                         qfields.attraction_energies([1, 100], 10, 5, qfields.inverse_attraction,
+                                                     np.array([0.5, 5.0])).tolist())
+        self.assertIs(qfields.inverse_attraction, qfields.attraction_function("inverse"))
+        with self.assertRaises(ValueError):
+            qfields.attraction_function("gravity")
+
+    def test_scratchpad_only_touches_its_window(self):
+        a_field = qfields.attraction_field(2, 5, np.int32)
+        window = qfields.union_window(qfields.field_window(a_field, (20, 20), 3, 3),
+                                      qfields.field_window(a_field, (20, 20), 0, 8))
+        self.assertEqual((0, 6, 1, 11), window)
+        scratchpad = qfields.QFScratchpad(np.int32)
+        scratchpad.reset(window)
+        scratchpad.add_field(a_field, 3, 3)
+        scratchpad.add_field(a_field, 0, 8)
+        # a field outside of the window is skipped
+        scratchpad.add_field(a_field, 15, 15)
+
+        expected = np.zeros((20, 20), dtype=np.int32)
+        qfields.add_field(a_field, expected, 3, 3)
+        qfields.add_field(a_field, expected, 0, 8)
+        board = np.full((20, 20), 7, dtype=np.int32)
+        scratchpad.add_to(board)
+        self.assertTrue(np.array_equal(expected + 7, board))
+        scratchpad.subtract_from(board)
+        self.assertTrue(np.all(board == 7))
+
+        # the buffer is reused and zeroed for the next window
+        scratchpad.reset((10, 12, 10, 12))
+        self.assertTrue(np.all(scratchpad.field == 0))
+        self.assertEqual((2, 2), scratchpad.field.shape)
+
+    def test_tiled_attraction_matches_add_field(self):
+        for x, y, radius in [(5, 5, 5), (2, 7, 9), (11, 3, 20)]:
+            expected = np.zeros((12, 10), dtype=np.int16)
+            window = qfields.add_field(qfields.attraction_field(radius, 0.5, np.int16), expected, x, y)
+            field = np.zeros((12, 10), dtype=np.int16)
+            self.assertEqual(qfields.clip_window(window, field.shape),
+                             qfields.add_attraction_tiled(field, x, y, radius, 0.5, tile=3))
+            self.assertTrue(np.array_equal(expected, field))
+
+    def test_add_field_at_positions_matches_add_field(self):
+        rng = np.random.RandomState(5)
+        r_field = qfields.repulsion_field(6, 10, np.int16, center_spike=True)
+        x = rng.randint(0, 30, 60)
+        y = rng.randint(0, 25, 60)
+        expected = np.zeros((30, 25), dtype=np.int16)
+        for position_x, position_y in zip(x.tolist(), y.tolist()):
+            qfields.add_field(r_field, expected, position_x, position_y)
+        for tile in (qfields.FIELD_TILE, 7):
+            field = np.zeros((30, 25), dtype=np.int16)
+            qfields.add_field_at_positions(r_field, field, x, y, tile=tile)
+            self.assertTrue(np.array_equal(expected, field))
+        # positions off the field add the part of their field on it
+        field = np.zeros((20, 15), dtype=np.int16)
+        qfields.add_field_at_positions(r_field, field, x - 5, y - 5)
+        self.assertTrue(np.array_equal(expected[5:25, 5:20], field))
+
+    def test_field_pyramid_tracks_the_field(self):
+        field = np.random.RandomState(3).randint(-50, 50, (37, 29)).astype(np.int32)
+        pyramid = qfields.QFFieldPyramid(field)
+        self.assertEqual([(10, 8), (3, 2)], [level.shape for level in pyramid.levels])
+        self.assertEqual(field.min(), field[pyramid.argmin()])
+
+        r_field = qfields.repulsion_field(3, 10, np.int32)
+        a_field = qfields.attraction_field(3, 100, np.int32)
+        for x, y in ((0, 0), (36, 28), (17, 5), (20, 20)):
+            pyramid.update(qfields.add_field(a_field, field, x, y))
+            pyramid.update(qfields.subtract_field(r_field, field, x + 1, y - 1))
+            self.assertEqual(field.min(), field[pyramid.argmin()])
+            expected = qfields.QFFieldPyramid(field)
+            for level, expected_level in zip(pyramid.levels, expected.levels):
+                self.assertTrue(np.array_equal(expected_level, level))
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
@@ -0,0 +1,413 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_qflayout
+----------------------------------
+
+Tests for `qflayout` module.
+"""
+
+import os
+import sys
+import json
+import mmap
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pytest
+
+from cdqforcelayout.qfnetwork import QFNetwork, QFCompactNetwork
+from cdqforcelayout.qflayout import QFLayout
+from cdqforcelayout import qfnumba
+from cdqforcelayout.qfields import add_field
+
+
+def _star_and_chain_edges():
+    # a star of 8 leaves around node 0 and a chain 20 - 21 - ... - 29
+    edges = [(0, leaf) for leaf in range(1, 9)]
+    edges += [(node, node + 1) for node in range(20, 29)]
+    return np.array(edges)
+
+
+class TestQFLayout(unittest.TestCase):
+
+    def test_layout_places_every_node(self):
+        qfl = QFLayout(QFNetwork(_star_and_chain_edges()))
+        cx_layout = qfl.do_layout(rounds=2)
+        self.assertEqual(19, len(cx_layout))
+        positions = set((entry["x"], entry["y"]) for entry in cx_layout)
+        self.assertEqual(19, len(positions))
+
+    def test_unknown_search_mode(self):
+        with self.assertRaises(ValueError):
+            QFLayout(QFNetwork(_star_and_chain_edges()), search="everywhere")
+        with self.assertRaises(ValueError):
+            QFLayout(QFNetwork(_star_and_chain_edges()), search="radius")
+
+    def test_neighbors_search_stays_in_window(self):
+        qfl = QFLayout(QFNetwork(_star_and_chain_edges()), a_radius=3,
+                       search="neighbors", search_margin=1)
+        graph = qfl.graph
+        leaf = graph.node_index[5]
+        hub = graph.node_index[0]
+        hub_x, hub_y = int(graph.x[hub]), int(graph.y[hub])
+        window = qfl._search_window(graph.x[leaf], graph.y[leaf], graph.x[[hub]], graph.y[[hub]])
+        self.assertEqual((hub_x - 4, hub_x + 5, hub_y - 4, hub_y + 5), window)
+        qfl.layout_one_node(leaf)
+        self.assertTrue(abs(graph.x[leaf] - hub_x) <= 4)
+        self.assertTrue(abs(graph.y[leaf] - hub_y) <= 4)
+
+    def test_windowed_search_falls_back_to_global(self):
+        no_neighbors = np.zeros(0, dtype=np.int32)
+        qfl = QFLayout(QFNetwork(_star_and_chain_edges()), search="neighbors")
+        self.assertIsNone(qfl._search_window(10, 10, no_neighbors, no_neighbors))
+        qfl = QFLayout(QFNetwork(_star_and_chain_edges()), search="radius", search_radius=2)
+        self.assertEqual((8, 13, 9, 14), qfl._search_window(10, 11, no_neighbors, no_neighbors))
+        self.assertEqual(19, len(qfl.do_layout(rounds=2)))
+
+    def test_layout_of_qfnetwork_and_compact_network_agree(self):
+        network = QFNetwork(_star_and_chain_edges())
+        compact = QFNetwork(_star_and_chain_edges()).to_compact()
+        self.assertEqual(QFLayout(network).do_layout(rounds=3),
+                         QFLayout(compact).do_layout(rounds=3))
+        # the positions are copied back to the node dicts of the QFNetwork
+        self.assertEqual(compact.node_dict[3]["x"], network.node_dict[3]["x"])
+        self.assertEqual(compact.node_dict[3]["y"], network.node_dict[3]["y"])
+
+    def test_pyramid_search_finds_the_minimum_value(self):
+        qfl = QFLayout(QFNetwork(_star_and_chain_edges()), search="pyramid")
+        for index in range(qfl.graph.get_nodecount()):
+            self.assertEqual(qfl.gameboard.min(), qfl.gameboard[qfl._find_minimum()])
+            qfl.layout_one_node(index)
+        self.assertEqual(19, len(set(zip(qfl.graph.x.tolist(), qfl.graph.y.tolist()))))
+        with self.assertRaises(ValueError):
+            QFLayout(QFNetwork(_star_and_chain_edges()), search="pyramid", workers=2)
+
+    def test_layout_stops_when_energy_settles(self):
+        qfl = QFLayout(QFNetwork(_star_and_chain_edges()))
+        qfl.do_layout(rounds=4)
+        self.assertEqual([0, 1, 2, 3], [stats["round"] for stats in qfl.round_stats])
+        self.assertEqual(19, qfl.round_stats[0]["moved"])
+
+        qfl = QFLayout(QFNetwork(_star_and_chain_edges()))
+        qfl.do_layout(rounds=100, tolerance=0.01, patience=2)
+        self.assertTrue(len(qfl.round_stats) < 100)
+        # the last two rounds did not improve on the best energy before them
+        energies = [stats["energy"] for stats in qfl.round_stats]
+        self.assertTrue(min(energies[-2:]) >= min(energies[:-2]) - 0.01 * abs(min(energies[:-2]))
+                        or qfl.round_stats[-1]["moved"] == 0)
+
+    def test_parallel_layout_is_deterministic(self):
+        layouts = []
+        for workers in (2, 4):
+            qfl = QFLayout(QFNetwork(_star_and_chain_edges()).to_compact(), search="neighbors",
+                           initialize_coordinates="random", seed=7, workers=workers)
+            layouts.append(qfl.do_layout(rounds=3))
+        self.assertEqual(layouts[0], layouts[1])
+        self.assertEqual(19, len(set((entry["x"], entry["y"]) for entry in layouts[0])))
+        with self.assertRaises(ValueError):
+            QFLayout(QFNetwork(_star_and_chain_edges()), workers=2)
+
+    def test_parallel_layout_unordered(self):
+        qfl = QFLayout(QFNetwork(_star_and_chain_edges()), search="radius", search_radius=5,
+                       workers=3, deterministic=False)
+        self.assertEqual(19, len(qfl.do_layout(rounds=2)))
+
+    def test_spatial_batches_do_not_overlap(self):
+        qfl = QFLayout(QFNetwork(_star_and_chain_edges()).to_compact(), search="radius",
+                       search_radius=1, r_radius=2, sparsity=400)
+        indices = list(range(qfl.graph.get_nodecount()))
+        batches = qfl._spatial_batches(indices)
+        self.assertEqual(sorted(indices), sorted(index for batch in batches for index in batch))
+        for batch in batches:
+            board = np.zeros(qfl.gameboard.shape, dtype=int)
+            for index in batch:
+                top_x, bottom_x, top_y, bottom_y = qfl._touched_window(index)
+                board[top_x:bottom_x, top_y:bottom_y] += 1
+            self.assertTrue(board.max() <= 1)
+
+    def test_relayout_moves_only_the_neighborhood(self):
+        network = QFNetwork(_star_and_chain_edges())
+        qfl = QFLayout(network, search="neighbors")
+        qfl.do_layout(rounds=2)
+        qfl.add_node(40, near=[29])
+        qfl.add_edge(40, 29)
+        qfl.remove_edge(0, 8)
+        qfl.remove_node(21)
+        self.assertEqual(set([40, 29, 0, 8, 20, 22]), qfl.affected_nodes)
+        before = dict((entry["node"], entry) for entry in qfl.graph.get_cx_layout())
+        cx_layout = qfl.relayout(rounds=2, hops=1)
+        self.assertEqual(set(), qfl.affected_nodes)
+        self.assertEqual(19, len(cx_layout))
+        # the chain 24 - 27 is more than one hop away from every edit
+        for entry in cx_layout:
+            if 24 <= entry["node"] <= 27:
+                self.assertEqual(before[entry["node"]], entry)
+        # the g_field is the center attractor plus a repulsion per node
+        expected, center = qfl._make_gameboard(30, 0.01)
+        for x, y in zip(qfl.graph.x.tolist(), qfl.graph.y.tolist()):
+            add_field(qfl.r_field, expected, x, y)
+        self.assertTrue(np.array_equal(expected, qfl.gameboard))
+        # the QFNetwork given to the layout is edited as well
+        self.assertEqual(set([29]), network.node_dict[40]["adj"])
+        self.assertEqual(qfl.graph.node_dict[40]["x"], network.node_dict[40]["x"])
+        self.assertNotIn(21, network.node_dict)
+
+    def test_added_node_is_placed_with_the_search_window(self):
+        for search in ("neighbors", "radius"):
+            qfl = QFLayout(QFNetwork(_star_and_chain_edges()), search=search, search_radius=3)
+            qfl.do_layout(rounds=2)
+            graph = qfl.graph
+            near = [graph.node_index[node] for node in (24, 25)]
+            with mock.patch.object(qfl, "_find_minimum", wraps=qfl._find_minimum) as find_minimum:
+                qfl.add_node(40, near=[24, 25])
+                window = find_minimum.call_args[0][0]
+                self.assertIsNotNone(window)
+                qfl.add_node(41)
+                self.assertIsNotNone(find_minimum.call_args[0][0])
+            top_x, bottom_x, top_y, bottom_y = window
+            index = graph.node_index[40]
+            self.assertTrue(top_x <= graph.x[index] < bottom_x and top_y <= graph.y[index] < bottom_y)
+            if search == "radius":
+                # the window is centered on the mean position of the neighbors
+                self.assertEqual(int(np.rint(graph.x[near].mean())) - 3, window[0])
+
+    def test_initialize_from_cx_layout(self):
+        qfl = QFLayout(QFNetwork(_star_and_chain_edges()))
+        cx_layout = qfl.do_layout(rounds=2, node_size=20)
+        # the nodes without a position start near their neighbors
+        partial = [entry for entry in cx_layout if entry["node"] not in (5, 29)]
+        warm = QFLayout(QFNetwork(_star_and_chain_edges()), initialize_coordinates="layout",
+                        cx_layout=partial, cx_node_size=20)
+        graph = warm.graph
+        self.assertEqual(partial, [entry for entry in graph.get_cx_layout(node_size=20)
+                                   if entry["node"] not in (5, 29)])
+        hub = graph.node_index[0]
+        leaf = graph.node_index[5]
+        self.assertTrue(abs(int(graph.x[leaf]) - int(graph.x[hub])) <= 2)
+        self.assertTrue(abs(int(graph.y[leaf]) - int(graph.y[hub])) <= 2)
+        self.assertEqual(19, len(set(zip(graph.x.tolist(), graph.y.tolist()))))
+
+    def test_initialize_from_foreign_layout(self):
+        # e.g. Cytoscape coordinates, negative and far larger than the g_field
+        cx_layout = [{"node": node, "x": -5000.0 + 1000 * node, "y": 20000.0 - 700 * node}
+                     for node in range(30)]
+        qfl = QFLayout(QFNetwork(_star_and_chain_edges()), initialize_coordinates="layout",
+                       cx_layout=cx_layout)
+        graph = qfl.graph
+        dimension = qfl.gameboard.shape[0]
+        self.assertTrue(0 <= graph.x.min() and graph.x.max() < dimension)
+        # the order along each axis is kept
+        chain = [graph.node_index[node] for node in range(20, 30)]
+        self.assertEqual(sorted(graph.y[chain].tolist()), graph.y[chain].tolist())
+        with self.assertRaises(ValueError):
+            QFLayout(QFNetwork(_star_and_chain_edges()), initialize_coordinates="layout")
+
+    def test_save_and_load_resume_the_layout(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(temp_dir, 'layout.npz')
+            qfl = QFLayout(QFNetwork(_star_and_chain_edges()), search="neighbors")
+            qfl.do_layout(rounds=2, checkpoint=path)
+            qfl.add_node(40)
+            qfl.save(path)
+            expected = qfl.do_layout(rounds=3)
+
+            for mapped in (True, False):
+                resumed = QFLayout.load(path, mmap=mapped)
+                self.assertEqual(2, resumed.rounds_done)
+                self.assertEqual(set([40]), resumed.affected_nodes)
+                self.assertEqual(20, resumed.graph.get_nodecount())
+                self.assertEqual(expected, resumed.do_layout(rounds=3))
+                self.assertEqual(5, resumed.rounds_done)
+                self.assertTrue(np.array_equal(qfl.gameboard, resumed.gameboard))
+            # the layout changes its copy, not the file
+            self.assertEqual(2, QFLayout.load(path).rounds_done)
+            with self.assertRaises(ValueError):
+                QFLayout.load(path, r_radius=5)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_layout_with_g_field_on_disk(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            expected = QFLayout(QFNetwork(_star_and_chain_edges()), search="pyramid")
+            qfl = QFLayout(QFNetwork(_star_and_chain_edges()), search="pyramid",
+                           field_dir=temp_dir)
+            self.assertIsInstance(qfl.gameboard.base, mmap.mmap)
+            self.assertTrue(np.array_equal(expected.gameboard, qfl.gameboard))
+            self.assertEqual(expected.do_layout(rounds=3), qfl.do_layout(rounds=3))
+            # the files are removed with the layout
+            self.assertEqual([], os.listdir(temp_dir))
+            with self.assertRaises(ValueError):
+                QFLayout(QFNetwork(_star_and_chain_edges()), field_dir=temp_dir)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_precision_follows_the_degrees(self):
+        star = np.array([(0, leaf) for leaf in range(1, 401)])
+        network = QFCompactNetwork.from_index_edges(list(range(401)), star[:250, 0], star[:250, 1])
+        qfl = QFLayout(network, search="neighbors")
+        self.assertEqual(np.int16, qfl.gameboard.dtype)
+        self.assertEqual(np.int16, qfl.r_field.dtype)
+        self.assertTrue(qfl.precision["safe"])
+        before = qfl.gameboard.astype(np.int64)
+        # the hub's attraction outgrows int16, the g_field is widened
+        for source, target in star[250:].tolist():
+            qfl.add_edge(source, target)
+        self.assertEqual(np.int32, qfl.gameboard.dtype)
+        self.assertEqual(np.int32, qfl.scratchpad.dtype)
+        self.assertEqual(np.int16, qfl.r_field.dtype)
+        self.assertIn("degree 400", qfl.precision["reason"])
+        self.assertTrue(np.array_equal(before, qfl.gameboard))
+        qfl.relayout()
+        with self.assertLogs("cdqforcelayout.qflayout", level="WARNING"):
+            fixed = QFLayout(QFCompactNetwork.from_edge_array(np.array([(0, leaf) for leaf in range(1, 701)])),
+                             dtype=np.int16)
+        self.assertFalse(fixed.precision["safe"])
+        self.assertEqual("fixed", fixed.precision["mode"])
+
+    def test_attraction_by_degree_and_weight(self):
+        expected = QFLayout(QFNetwork(_star_and_chain_edges())).do_layout(rounds=2)
+        def steps(degree, weight):
+            return np.where(degree == 1, 10, np.where(degree < 5, 5, 1)) * weight
+        qfl = QFLayout(QFNetwork(_star_and_chain_edges()), attraction=steps)
+        self.assertEqual(expected, qfl.do_layout(rounds=2))
+
+        # weights of 2 are twice the a_scale
+        expected = QFLayout(QFNetwork(_star_and_chain_edges()), a_scale=10).do_layout(rounds=2)
+        network = QFNetwork(_star_and_chain_edges()).to_compact()
+        qfl = QFLayout(network, edge_weights=np.full(len(network.adj_indices), 2.0))
+        self.assertEqual(expected, qfl.do_layout(rounds=2))
+        with self.assertRaises(ValueError):
+            qfl.add_node(40)
+        with self.assertRaises(ValueError):
+            QFLayout(network, edge_weights=[1.0, 2.0])
+
+        temp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(temp_dir, 'layout.npz')
+            qfl = QFLayout(QFNetwork(_star_and_chain_edges()), attraction=steps)
+            qfl.save(path)
+            with self.assertRaises(ValueError):
+                QFLayout.load(path)
+            self.assertEqual(qfl.do_layout(rounds=2),
+                             QFLayout.load(path, attraction="steps").do_layout(rounds=2))
+        finally:
+            shutil.rmtree(temp_dir)
+
+        # a smooth attraction gives every degree its own kernel
+        qfl = QFLayout(QFNetwork(_star_and_chain_edges()), attraction="inverse_sqrt")
+        qfl.do_layout(rounds=1)
+        self.assertEqual(len(set(qfl.graph.degree.tolist())), len(qfl._a_fields))
+        # the layout holds on to a bounded number of kernels
+        expected = qfl.do_layout(rounds=1)
+        qfl = QFLayout(QFNetwork(_star_and_chain_edges()), attraction="inverse_sqrt")
+        qfl.do_layout(rounds=1)
+        with mock.patch("cdqforcelayout.qflayout.ATTRACTION_MEMO_SIZE", 2):
+            qfl._a_fields.clear()
+            self.assertEqual(expected, qfl.do_layout(rounds=1))
+        self.assertEqual(2, len(qfl._a_fields))
+
+    def test_rebuild_g_field(self):
+        network = QFNetwork(_star_and_chain_edges()).to_compact()
+        qfl = QFLayout(network, initialize_coordinates="center")
+        # the bulk initialization adds the stacked nodes one by one
+        expected, center = qfl._make_gameboard(30, 0.01)
+        for index in range(network.get_nodecount()):
+            add_field(qfl.r_field, expected, center, center)
+        self.assertTrue(np.array_equal(expected, qfl.gameboard))
+
+        expected = QFLayout(QFNetwork(_star_and_chain_edges()), search="pyramid").do_layout(rounds=3)
+        qfl = QFLayout(QFNetwork(_star_and_chain_edges()), search="pyramid")
+        self.assertEqual(expected, qfl.do_layout(rounds=3, rebuild_every=1))
+        self.assertEqual([0, 0, 0], [stats["rebuilt_cells"] for stats in qfl.round_stats])
+        before = qfl.gameboard.copy()
+        qfl.gameboard[3:5, 3:5] += 7
+        self.assertEqual(4, qfl.rebuild_g_field())
+        self.assertTrue(np.array_equal(before, qfl.gameboard))
+        self.assertEqual(qfl.gameboard.min(), qfl.gameboard[qfl._find_minimum()])
+
+    def test_compiled_rounds_match_numpy(self):
+        # without Numba the compiled rounds run as plain Python
+        for kwargs in (dict(), dict(search="neighbors", search_margin=2),
+                       dict(search="radius", search_radius=4), dict(attraction="inverse", dtype="int32"),
+                       dict(edge_weights=np.linspace(0.5, 3, 34))):
+            expected = QFLayout(QFNetwork(_star_and_chain_edges()).to_compact(), backend="numpy", **kwargs)
+            compiled = QFLayout(QFNetwork(_star_and_chain_edges()).to_compact(), backend="numpy", **kwargs)
+            node_list = compiled.graph.get_sorted_indices().tolist()
+            for n in range(3):
+                expected.do_layout()
+                compiled._layout_nodes_compiled(node_list)
+            self.assertTrue(np.array_equal(expected.graph.x, compiled.graph.x))
+            self.assertTrue(np.array_equal(expected.graph.y, compiled.graph.y))
+            self.assertTrue(np.array_equal(expected.gameboard, compiled.gameboard))
+
+    def test_backend(self):
+        with self.assertRaises(ValueError):
+            QFLayout(QFNetwork(_star_and_chain_edges()), backend="fortran")
+        with self.assertRaises(ValueError):
+            QFLayout(QFNetwork(_star_and_chain_edges()), search="pyramid", backend="numba")
+        self.assertEqual("numpy", QFLayout(QFNetwork(_star_and_chain_edges()), search="pyramid").backend)
+        expected = "numba" if qfnumba.NUMBA_AVAILABLE else "numpy"
+        self.assertEqual(expected, QFLayout(QFNetwork(_star_and_chain_edges())).backend)
+        if not qfnumba.NUMBA_AVAILABLE:
+            with self.assertLogs("cdqforcelayout.qflayout", level="WARNING"):
+                qfl = QFLayout(QFNetwork(_star_and_chain_edges()), backend="numba")
+            self.assertEqual("numpy", qfl.backend)
+        temp_dir = tempfile.mkdtemp()
+        try:
+            self.assertEqual("numpy", QFLayout(QFNetwork(_star_and_chain_edges()), search="neighbors",
+                                               field_dir=temp_dir).backend)
+            with self.assertRaises(ValueError):
+                QFLayout(QFNetwork(_star_and_chain_edges()), search="neighbors", field_dir=temp_dir,
+                         backend="numba")
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_numba_rounds_match_numpy(self):
+        pytest.importorskip("numba")
+        for kwargs in (dict(), dict(search="neighbors", search_margin=2),
+                       dict(search="radius", search_radius=4), dict(attraction="inverse", dtype="int32"),
+                       dict(edge_weights=np.linspace(0.5, 3, 34))):
+            expected = QFLayout(QFNetwork(_star_and_chain_edges()).to_compact(), backend="numpy", **kwargs)
+            compiled = QFLayout(QFNetwork(_star_and_chain_edges()).to_compact(), backend="numba", **kwargs)
+            self.assertEqual("numba", compiled.backend)
+            self.assertEqual(expected.do_layout(rounds=3), compiled.do_layout(rounds=3))
+            self.assertTrue(np.array_equal(expected.gameboard, compiled.gameboard))
+
+    def test_instrumentation(self):
+        self.assertIsNone(QFLayout(QFNetwork(_star_and_chain_edges())).instrumentation)
+        expected = QFLayout(QFNetwork(_star_and_chain_edges())).do_layout(rounds=2)
+        qfl = QFLayout(QFNetwork(_star_and_chain_edges()), instrument=True)
+        self.assertEqual(expected, qfl.do_layout(rounds=2))
+        report = qfl.instrumentation.report()
+        self.assertEqual(38, report["moves"])
+        for phase in ("subtract", "accumulate", "bias", "argmin", "add"):
+            self.assertEqual(38, report["phases"][phase]["calls"])
+        # an a_field per adjacency entry and round
+        self.assertEqual(2 * 34, report["phases"]["accumulate"]["fields"])
+        self.assertEqual(0, report["phases"]["bias"]["fields"])
+        self.assertIsNone(qfl.instrumentation.events)
+        json.dumps(report)
+
+        qfl = QFLayout(QFNetwork(_star_and_chain_edges()), directed_flow="top", instrument="trace")
+        qfl.do_layout(rounds=1)
+        # the hub 0 and node 20 are only sources, the leaves and node 29 only targets
+        self.assertEqual(11, qfl.instrumentation.report()["phases"]["bias"]["fields"])
+        event = qfl.instrumentation.events[-1]
+        self.assertEqual(qfl.graph.get_sorted_indices()[-1], event["node"])
+        self.assertEqual([int(qfl.graph.x[event["node"]]), int(qfl.graph.y[event["node"]])], event["to"])
+        json.dumps(qfl.instrumentation.events)
+        qfl.instrumentation.reset()
+        self.assertEqual([], qfl.instrumentation.events)
+        with self.assertRaises(ValueError):
+            QFLayout(QFNetwork(_star_and_chain_edges()), instrument="verbose")
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
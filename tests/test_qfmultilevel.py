@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_qfmultilevel
+----------------------------------
+
+Tests for `qfmultilevel` module.
+"""
+
+import sys
+import unittest
+
+import numpy as np
+
+from cdqforcelayout.qfnetwork import QFNetwork, QFCompactNetwork
+from cdqforcelayout.qfmultilevel import QFMultilevelLayout, coarsen
+
+
+def _grid_edges(n):
+    edges = [(i*n + j, i*n + j + 1) for i in range(n) for j in range(n - 1)]
+    edges += [(i*n + j, (i + 1)*n + j) for i in range(n - 1) for j in range(n)]
+    return np.array(edges)
+
+
+class TestQFMultilevel(unittest.TestCase):
+
+    def test_coarsen_merges_pairs_and_keeps_weights(self):
+        network = QFCompactNetwork.from_edge_array(_grid_edges(6))
+        coarse, weights, parent = coarsen(network)
+        self.assertTrue(coarse.get_nodecount() < network.get_nodecount())
+        self.assertTrue(np.bincount(parent).max() <= 2)
+        # every fine edge between two groups is counted once per direction
+        rows = np.repeat(np.arange(network.get_nodecount()), network.degree)
+        between = parent[rows] != parent[network.adj_indices]
+        self.assertEqual(int(between.sum()), int(weights.sum()))
+        self.assertEqual(len(coarse.adj_indices), len(weights))
+
+    def test_multilevel_layout(self):
+        network = QFCompactNetwork.from_edge_array(_grid_edges(12))
+        multilevel = QFMultilevelLayout(network, min_nodes=20, coarse_rounds=5, refine_rounds=1)
+        self.assertTrue(len(multilevel.levels) > 2)
+        self.assertTrue(multilevel.levels[-1].network.get_nodecount() <= 20)
+        cx_layout = multilevel.do_layout()
+        self.assertEqual(144, len(cx_layout))
+        self.assertEqual(144, len(set((entry["x"], entry["y"]) for entry in cx_layout)))
+
+    def test_multilevel_layout_of_qfnetwork(self):
+        network = QFNetwork(_grid_edges(8))
+        cx_layout = QFMultilevelLayout(network, min_nodes=10, coarse_rounds=2,
+                                       refine_rounds=1).do_layout(node_size=1)
+        entry = [entry for entry in cx_layout if entry["node"] == 9][0]
+        self.assertEqual(entry["y"], network.node_dict[9]["x"])
+        self.assertEqual(entry["x"], network.node_dict[9]["y"])
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_qfnetwork
+----------------------------------
+
+Tests for `qfnetwork` module.
+"""
+
+import sys
+import unittest
+
+import numpy as np
+
+from cdqforcelayout.qfnetwork import QFNetwork, QFCompactNetwork
+
+
+class TestQFNetwork(unittest.TestCase):
+
+    EDGES = np.array([[10, 11], [10, 12], [12, 10], [13, 12], [11, 10]])
+
+    def test_compact_network_matches_node_dict(self):
+        network = QFNetwork(self.EDGES)
+        compact = network.to_compact()
+        self.assertIsInstance(compact, QFCompactNetwork)
+        self.assertEqual([10, 11, 12, 13], compact.node_ids.tolist())
+        self.assertEqual(np.int32, compact.adj_indices.dtype)
+        self.assertEqual([0, 2, 3, 5, 6], compact.adj_indptr.tolist())
+        self.assertEqual([1, 2, 0, 0, 3, 2], compact.adj_indices.tolist())
+        for node_id, node in network.node_dict.items():
+            view = compact.node_dict[node_id]
+            for key in ("adj", "in", "out", "degree", "in_degree", "out_degree"):
+                self.assertEqual(node[key], view[key])
+
+    def test_node_dict_view_writes_positions(self):
+        compact = QFNetwork(self.EDGES).to_compact()
+        compact.node_dict[12]["x"] = 7
+        self.assertEqual(7, compact.x[2])
+        with self.assertRaises(KeyError):
+            compact.node_dict[12]["degree"] = 7
+        self.assertEqual([10, 11, 12, 13], list(compact.node_dict))
+        self.assertEqual(4, len(compact.node_dict.values()))
+
+    def test_sorted_nodes_and_spiral_match(self):
+        network = QFNetwork(self.EDGES)
+        compact = network.to_compact()
+        self.assertEqual([node["degree"] for node in network.get_sorted_nodes()],
+                         [node["degree"] for node in compact.get_sorted_nodes()])
+        network.place_nodes_in_a_spiral(20)
+        compact.place_nodes_in_a_spiral(20)
+        self.assertEqual(network.get_cx_layout(), compact.get_cx_layout())
+
+    def test_from_edge_array_matches_qfnetwork(self):
+        rng = np.random.default_rng(5)
+        edges = rng.integers(100, 160, size=(300, 2))
+        expected = QFNetwork(edges).to_compact()
+        compact = QFCompactNetwork.from_edge_array(edges)
+        self.assertEqual(expected.node_ids.tolist(), compact.node_ids.tolist())
+        for name in ("adj_indptr", "adj_indices", "in_indptr", "in_indices",
+                     "out_indptr", "out_indices", "degree", "in_degree", "out_degree"):
+            self.assertEqual(getattr(expected, name).tolist(), getattr(compact, name).tolist())
+
+    def test_from_edge_array_self_loops(self):
+        edges = np.array([[1, 1], [1, 2], [2, 2], [3, 3]])
+        kept = QFCompactNetwork.from_edge_array(edges)
+        self.assertEqual([2, 2, 1], kept.degree.tolist())
+        self.assertIsNone(kept.self_loops)
+        dropped = QFCompactNetwork.from_edge_array(edges, self_loops="drop")
+        self.assertEqual([1, 2, 3], dropped.node_ids.tolist())
+        self.assertEqual([1, 1, 0], dropped.degree.tolist())
+        flagged = QFCompactNetwork.from_edge_array(edges, self_loops="flag")
+        self.assertEqual([1, 1, 0], flagged.degree.tolist())
+        self.assertEqual([True, True, True], flagged.self_loops.tolist())
+        with self.assertRaises(ValueError):
+            QFCompactNetwork.from_edge_array(edges, self_loops="ignore")
+
+    def test_from_edge_array_empty(self):
+        compact = QFCompactNetwork.from_edge_array(np.zeros((0, 2), dtype=int))
+        self.assertEqual(0, compact.get_nodecount())
+        self.assertEqual([0], compact.adj_indptr.tolist())
+
+    def test_greedy_coloring(self):
+        compact = QFCompactNetwork.from_edge_array(np.array([[1, 2], [2, 3], [3, 1], [3, 4]]))
+        colors = compact.greedy_coloring()
+        for index in range(compact.get_nodecount()):
+            self.assertNotIn(colors[index], colors[compact.adjacent(index)].tolist())
+        self.assertEqual(3, len(set(colors.tolist())))
+
+    def test_edits_match_rebuilt_network(self):
+        network = QFNetwork(self.EDGES)
+        compact = QFCompactNetwork.from_edge_array(self.EDGES)
+        for edited in (network, compact):
+            edited.add_node(14)
+            self.assertTrue(edited.add_edge(14, 13))
+            self.assertFalse(edited.add_edge(14, 13))
+            self.assertTrue(edited.remove_edge(10, 12))
+            self.assertFalse(edited.remove_edge(10, 13))
+            edited.remove_node(11)
+            with self.assertRaises(ValueError):
+                edited.add_node(12)
+        # 12 -> 10 keeps 10 and 12 adjacent
+        expected = QFCompactNetwork.from_index_edges([10, 12, 13, 14], [1, 2, 3], [0, 1, 2])
+        for edited in (network.to_compact(), compact):
+            self.assertEqual([10, 12, 13, 14], edited.node_ids.tolist())
+            self.assertEqual(2, edited.node_index[13])
+            for name in ("adj_indptr", "adj_indices", "in_indptr", "in_indices",
+                         "out_indptr", "out_indices", "degree", "in_degree", "out_degree"):
+                self.assertEqual(getattr(expected, name).tolist(), getattr(edited, name).tolist())
+
+    def test_neighborhood(self):
+        chain = QFCompactNetwork.from_edge_array(np.array([[0, 1], [1, 2], [2, 3], [3, 4]]))
+        self.assertEqual([2], chain.neighborhood([2], hops=0).tolist())
+        self.assertEqual([0, 1, 2, 3], chain.neighborhood([0, 2], hops=1).tolist())
+        self.assertEqual([0, 1, 2, 3, 4], chain.neighborhood([4], hops=10).tolist())
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
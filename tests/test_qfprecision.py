@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_qfprecision
+----------------------------------
+
+Tests for `qfprecision` module.
+"""
+
+import sys
+import unittest
+
+import numpy as np
+
+from cdqforcelayout import qfprecision
+
+
+class TestQFPrecision(unittest.TestCase):
+
+    def test_narrowest_type(self):
+        self.assertEqual(np.int16, qfprecision.narrowest_type(-16000, 100))
+        self.assertEqual(np.int32, qfprecision.narrowest_type(-17000, 100))
+        self.assertEqual(np.int32, qfprecision.narrowest_type(0, 2**20))
+        self.assertEqual(np.int64, qfprecision.narrowest_type(0, 2**40))
+        self.assertEqual(np.int16, qfprecision.narrowest_type(-20000, 100, headroom=1))
+        with self.assertRaises(ValueError):
+            qfprecision.narrowest_type(0, 2**62)
+
+    def test_attraction_energies(self):
+        self.assertEqual([250, 500, 250, 250, 50],
+                         qfprecision.attraction_energies([0, 1, 2, 4, 5], 10, 5).tolist())
+
+    def test_choose_precision(self):
+        # a path: an end node or a middle node with both neighbors on one cell
+        report = qfprecision.choose_precision(np.array([1, 2, 2, 1]), 21)
+        self.assertEqual('int16', report['g_field'])
+        self.assertEqual([-500, 0], report['scratchpad_range'])
+        self.assertEqual(-500, report['kernel_range'][0])
+        self.assertIn('degree 1', report['reason'])
+        # a hub of degree 400 adds 400 attractions of 50
+        report = qfprecision.choose_precision(np.array([400] + [1] * 400), 221)
+        self.assertEqual('int32', report['g_field'])
+        self.assertEqual('int32', report['scratchpad'])
+        self.assertEqual('int16', report['kernels'])
+        self.assertEqual(-20000, report['scratchpad_range'][0])
+        # nodes that start on one cell add up their spikes
+        report = qfprecision.choose_precision(np.ones(40, dtype=int), 21, stacked=40)
+        self.assertEqual('int32', report['g_field'])
+        self.assertIn('40 nodes on one cell', report['reason'])
+        report = qfprecision.choose_precision(np.array([1, 1]), 21, directed_flow_bias=-20000.0)
+        self.assertEqual([-20500, 0], report['scratchpad_range'])
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
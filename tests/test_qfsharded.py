@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_qfsharded
+----------------------------------
+
+Tests for `qfsharded` module.
+"""
+
+import sys
+import unittest
+
+import numpy as np
+
+from cdqforcelayout.qfnetwork import QFCompactNetwork, QFNetwork
+from cdqforcelayout.qflayout import QFLayout
+from cdqforcelayout import qfsharded
+
+
+def _grid_edges(side):
+    # a side x side lattice
+    nodes = np.arange(side * side).reshape(side, side)
+    edges = [(a, b) for a, b in zip(nodes[:, :-1].ravel(), nodes[:, 1:].ravel())]
+    edges += [(a, b) for a, b in zip(nodes[:-1].ravel(), nodes[1:].ravel())]
+    return np.array(edges)
+
+
+class TestQFSharded(unittest.TestCase):
+
+    def test_shard_grid(self):
+        self.assertEqual((1, 1), qfsharded.shard_grid(1))
+        self.assertEqual((2, 2), qfsharded.shard_grid(4))
+        self.assertEqual((2, 3), qfsharded.shard_grid(6))
+        self.assertEqual((1, 7), qfsharded.shard_grid(7))
+
+    def test_windows_cover_the_tiles_and_halos(self):
+        sharded = qfsharded.QFShardedLayout(QFCompactNetwork.from_edge_array(_grid_edges(12)),
+                                            shards=4, r_radius=6, a_radius=8)
+        self.assertEqual(8, sharded.halo)
+        dimension = sharded.dimension
+        middle = -(-dimension // 2)
+        self.assertEqual([(0, middle + 8, 0, middle + 8), (0, middle + 8, middle - 8, dimension),
+                          (middle - 8, dimension, 0, middle + 8),
+                          (middle - 8, dimension, middle - 8, dimension)],
+                         sharded.shard_windows())
+        owners = sharded.owners()
+        for shard, (top_x, bottom_x, top_y, bottom_y) in enumerate(sharded.shard_windows()):
+            owned = owners == shard
+            self.assertTrue(owned.any())
+            self.assertTrue(((sharded.graph.x[owned] >= top_x) & (sharded.graph.x[owned] < bottom_x)).all())
+            self.assertTrue(((sharded.graph.y[owned] >= top_y) & (sharded.graph.y[owned] < bottom_y)).all())
+
+    def test_one_shard_is_a_qflayout(self):
+        edges = _grid_edges(10)
+        expected = QFLayout(QFCompactNetwork.from_edge_array(edges), search="neighbors")
+        sharded = qfsharded.QFShardedLayout(QFCompactNetwork.from_edge_array(edges), shards=1,
+                                            processes=False)
+        self.assertEqual(expected.do_layout(rounds=3), sharded.do_layout(rounds=3))
+
+    def test_processes_match_local_shards(self):
+        edges = _grid_edges(15)
+        local = qfsharded.QFShardedLayout(QFCompactNetwork.from_edge_array(edges), shards=4,
+                                          processes=False, search="pyramid")
+        sharded = qfsharded.QFShardedLayout(QFNetwork(edges), shards=4, search="pyramid")
+        cx_layout = sharded.do_layout(rounds=3, tolerance=0.0, patience=10)
+        self.assertEqual(local.do_layout(rounds=3), cx_layout)
+        self.assertEqual(3, len(sharded.round_stats))
+        self.assertEqual(225, len(cx_layout))
+        graph = sharded.graph
+        self.assertTrue(0 <= graph.x.min() and graph.x.max() < sharded.dimension)
+        self.assertTrue(0 <= graph.y.min() and graph.y.max() < sharded.dimension)
+        # the QFNetwork given to the layout gets the positions
+        self.assertEqual(int(graph.x[7]), sharded.network.node_dict[7]["x"])
+
+    def test_unsupported_parameters(self):
+        network = QFCompactNetwork.from_edge_array(_grid_edges(3))
+        with self.assertRaises(ValueError):
+            qfsharded.QFShardedLayout(network, search="global")
+        with self.assertRaises(ValueError):
+            qfsharded.QFShardedLayout(network, directed_flow="top")
+        with self.assertRaises(ValueError):
+            qfsharded.QFShardedLayout(network, initialize_coordinates="layout")
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())